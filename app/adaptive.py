@@ -0,0 +1,118 @@
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from .config import settings
+
+HEALTHY_STATUSES = ("ok",)
+
+
+@dataclass
+class _State:
+    interval: float
+    latency_ewma_ms: Optional[float] = None
+
+
+def interval_bounds(service) -> Tuple[float, float]:
+    """(min, max) probe interval of an adaptive service, with the defaults filled in."""
+    floor = settings.SCHEDULER_MIN_INTERVAL_SECONDS
+    nominal = max(floor, service.interval_seconds)
+    low = max(floor, service.min_interval_seconds or floor)
+    high = max(low, service.max_interval_seconds or nominal * settings.ADAPTIVE_MAX_INTERVAL_FACTOR)
+    return float(low), float(high)
+
+
+class IntervalController:
+    """Effective probe interval per service.
+
+    Fixed services keep ``interval_seconds``. For adaptive ones a warn,
+    error or down result, or an OK response slower than
+    ``latency_jump_factor`` times the service's latency EWMA, snaps the
+    interval to its minimum; every healthy result doubles it, up to the
+    maximum. Whether a service's last result was degraded is kept for all
+    services so the probe budget can serve those first.
+    """
+
+    def __init__(self, latency_jump_factor: float = None, ewma_alpha: float = 0.3):
+        self.latency_jump_factor = latency_jump_factor or settings.ADAPTIVE_LATENCY_JUMP_FACTOR
+        self.ewma_alpha = ewma_alpha
+        self._states: dict = {}  # service_id -> _State, adaptive services only
+        self._degraded: set = set()
+        self._lock = threading.Lock()
+
+    def _state(self, service) -> _State:
+        low, high = interval_bounds(service)
+        state = self._states.get(service.id)
+        if state is None:
+            # resume from the interval persisted by the last run
+            state = self._states[service.id] = _State(service.current_interval_seconds or service.interval_seconds)
+        # bounds may have changed since
+        state.interval = min(max(float(state.interval), low), high)
+        return state
+
+    def interval(self, service) -> float:
+        """Interval to schedule ``service`` at now."""
+        if not service.adaptive:
+            with self._lock:
+                self._states.pop(service.id, None)
+            return float(max(settings.SCHEDULER_MIN_INTERVAL_SECONDS, service.interval_seconds))
+        with self._lock:
+            return self._state(service).interval
+
+    def observe(self, service, status: str, response_time_ms: Optional[float]) -> Optional[float]:
+        """Fold in a probe result; returns the new interval if it changed."""
+        with self._lock:
+            degraded = status not in HEALTHY_STATUSES
+            if not service.adaptive:
+                (self._degraded.add if degraded else self._degraded.discard)(service.id)
+                return None
+            state = self._state(service)
+            if not degraded and response_time_ms is not None:
+                ewma = state.latency_ewma_ms
+                if ewma is not None and response_time_ms > self.latency_jump_factor * ewma:
+                    degraded = True
+                state.latency_ewma_ms = response_time_ms if ewma is None else (
+                    ewma + self.ewma_alpha * (response_time_ms - ewma)
+                )
+            (self._degraded.add if degraded else self._degraded.discard)(service.id)
+            low, high = interval_bounds(service)
+            interval = low if degraded else min(state.interval * 2, high)
+            if interval == state.interval:
+                return None
+            state.interval = interval
+            return interval
+
+    def degraded(self, service_id: int) -> bool:
+        return service_id in self._degraded
+
+    def remove(self, service_id: int):
+        with self._lock:
+            self._states.pop(service_id, None)
+            self._degraded.discard(service_id)
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """Adaptive intervals, latency EWMAs and degraded services, for ``app.snapshot``."""
+        with self._lock:
+            states = list(self._states.items())
+            degraded = sorted(self._degraded)
+        return {
+            "id": np.array([service_id for service_id, _ in states], dtype=np.int64),
+            "interval": np.array([state.interval for _, state in states], dtype=np.float64),
+            "ewma": np.array([np.nan if state.latency_ewma_ms is None else state.latency_ewma_ms
+                              for _, state in states], dtype=np.float64),
+            "degraded": np.array(degraded, dtype=np.int64),
+        }
+
+    def restore(self, arrays: Dict[str, np.ndarray], service_ids: Iterable[int]):
+        """Load the state of ``service_ids`` from ``snapshot()`` arrays."""
+        wanted = set(service_ids)
+        with self._lock:
+            for service_id, interval, ewma in zip(*(arrays[name].tolist() for name in ("id", "interval", "ewma"))):
+                if service_id in wanted:
+                    self._states[service_id] = _State(interval, None if ewma != ewma else ewma)
+            self._degraded.update(wanted.intersection(arrays["degraded"].tolist()))
+
+
+intervals = IntervalController()
@@ -0,0 +1,261 @@
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .logging_config import logger
+from .models import Check
+from .sketch import DDSketch
+
+# Apdex = (Satisfied + Tolerating/2) / Total
+# Satisfied = response_time <= T, Tolerating = T < response_time <= 4T
+APDEX_THRESHOLD_MS = 1000  # 1 second SLA
+
+FAILED_STATUSES = ("down", "error", "warn")
+# snapshots store a status as its index in here
+STATUSES = ("ok",) + FAILED_STATUSES
+_NO_SAMPLES = (np.empty(0), np.empty(0, dtype=np.uint8), np.empty(0))
+
+EMPTY_METRICS = {
+    "latency_p50_ms": None,
+    "latency_p95_ms": None,
+    "latency_p99_ms": None,
+    "request_rate_rpm": None,
+    "error_rate_percent": None,
+    "uptime_percent": None,
+    "throughput_rps": None,
+    "apdex_score": None,
+}
+
+
+def epoch_seconds(ts: datetime) -> float:
+    # naive timestamps (e.g. from SQLite) are stored as UTC
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class ServiceWindow:
+    """Running SRE counters for one service over a sliding time window.
+
+    Samples are kept in arrival order so expiry pops from the left; OK
+    latencies are also counted in a DDSketch, so adding or expiring one is
+    O(1) and percentiles are within ``SKETCH_RELATIVE_ACCURACY``.
+    """
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self.samples = deque()  # (ts, status, response_time_ms)
+        self.failed = 0
+        self.ok_latencies = DDSketch(relative_accuracy=settings.SKETCH_RELATIVE_ACCURACY)
+        self.satisfied = 0
+        self.tolerating = 0
+
+    def add(self, ts: float, status: str, response_time_ms: Optional[float]):
+        self.samples.append((ts, status, response_time_ms))
+        if status in FAILED_STATUSES:
+            self.failed += 1
+        if status == "ok" and response_time_ms is not None:
+            self.ok_latencies.add(response_time_ms)
+            if response_time_ms <= APDEX_THRESHOLD_MS:
+                self.satisfied += 1
+            elif response_time_ms <= 4 * APDEX_THRESHOLD_MS:
+                self.tolerating += 1
+
+    def expire(self, now: float):
+        cutoff = now - self.window_seconds
+        while self.samples and self.samples[0][0] < cutoff:
+            _, status, response_time_ms = self.samples.popleft()
+            if status in FAILED_STATUSES:
+                self.failed -= 1
+            if status == "ok" and response_time_ms is not None:
+                self.ok_latencies.remove(response_time_ms)
+                if response_time_ms <= APDEX_THRESHOLD_MS:
+                    self.satisfied -= 1
+                elif response_time_ms <= 4 * APDEX_THRESHOLD_MS:
+                    self.tolerating -= 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        return self.ok_latencies.quantile(p / 100)
+
+    def metrics(self) -> dict:
+        total_checks = len(self.samples)
+        if not total_checks:
+            return dict(EMPTY_METRICS)
+
+        window_minutes = self.window_seconds / 60
+        request_rate_rpm = total_checks / window_minutes
+        successful_checks = total_checks - self.failed
+        ok_count = self.ok_latencies.count
+        apdex_score = (self.satisfied + self.tolerating / 2) / ok_count if ok_count else 0
+        return {
+            "latency_p50_ms": self.percentile(50),
+            "latency_p95_ms": self.percentile(95),
+            "latency_p99_ms": self.percentile(99),
+            "request_rate_rpm": request_rate_rpm,
+            "error_rate_percent": self.failed / total_checks * 100,
+            "uptime_percent": successful_checks / total_checks * 100,
+            "throughput_rps": request_rate_rpm / 60,
+            "apdex_score": min(apdex_score, 1.0),
+        }
+
+
+def _encode(samples: list) -> tuple:
+    """(ts, status, response_time_ms) samples as arrays, statuses as indexes into STATUSES."""
+    ts, status, response_time_ms = zip(*samples)
+    return (
+        np.array(ts, dtype=np.float64),
+        np.array([STATUSES.index(x) for x in status], dtype=np.uint8),
+        np.array([np.nan if x is None else x for x in response_time_ms], dtype=np.float64),
+    )
+
+
+class WindowAggregator:
+    """Per-service sliding-window SRE metrics kept in process memory."""
+
+    def __init__(self, window_minutes: int = None):
+        self.window_seconds = (window_minutes or settings.SRE_WINDOW_MINUTES) * 60
+        self._windows: dict = {}
+        # service_id -> (ts, status, response_time_ms) arrays from a snapshot
+        # plus the samples recorded since, turned into a window the first
+        # time the service is read or observed
+        self._restored: dict = {}
+        self._lock = threading.Lock()
+
+    def _window(self, service_id: int) -> ServiceWindow:
+        w = self._windows.get(service_id)
+        if w is None:
+            w = self._windows[service_id] = ServiceWindow(self.window_seconds)
+            restored = self._restored.pop(service_id, None)
+            if restored is not None:
+                ts, status, response_time_ms, recent = restored
+                samples = zip(
+                    ts.tolist(), (STATUSES[x] for x in status.tolist()),
+                    (None if x != x else x for x in response_time_ms.tolist()),   # NaN: no response time
+                )
+                for sample in itertools.chain(samples, recent):
+                    w.add(*sample)
+        return w
+
+    def observe(self, service_id: int, status: str, response_time_ms: Optional[float], ts: float = None):
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            w = self._window(service_id)
+            w.add(ts, status, response_time_ms)
+            w.expire(ts)
+
+    def metrics(self, service_id: int, now: float = None) -> dict:
+        now = time.time() if now is None else now
+        with self._lock:
+            if service_id not in self._windows and service_id not in self._restored:
+                return dict(EMPTY_METRICS)
+            w = self._window(service_id)
+            w.expire(now)
+            return w.metrics()
+
+    def remove(self, service_id: int):
+        with self._lock:
+            self._windows.pop(service_id, None)
+            self._restored.pop(service_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._windows = {}
+            self._restored = {}
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """The samples of every window, as arrays for ``app.snapshot``."""
+        with self._lock:
+            samples = {sid: list(w.samples) for sid, w in self._windows.items()}
+            restored = dict(self._restored)
+        ids, counts, parts = [], [], []
+        for service_id, rows in samples.items():
+            if rows:
+                ids.append(service_id)
+                counts.append(len(rows))
+                parts.append(_encode(rows))
+        for service_id, (*arrays, recent) in restored.items():
+            ids.append(service_id)
+            counts.append(len(arrays[0]) + len(recent))
+            parts.append(arrays)
+            if recent:
+                parts.append(_encode(recent))
+        columns = [np.concatenate(column) for column in zip(*parts)] if parts else _NO_SAMPLES
+        return {
+            "window": np.array([self.window_seconds], dtype=np.int64),
+            "id": np.array(ids, dtype=np.int64),
+            "offset": np.cumsum([0] + counts, dtype=np.int64),
+            **dict(zip(("ts", "status", "rt"), columns)),
+        }
+
+    def restore(self, arrays: Dict[str, np.ndarray], service_ids: Iterable[int], recent: Dict[int, list] = None) -> set:
+        """Load the windows of ``service_ids`` from ``snapshot()`` arrays,
+        followed by their ``recent`` (ts, status, response_time_ms) samples.
+
+        Samples stay in the (memory-mapped) arrays until a service is first
+        read or observed. Returns the services restored: all of them (ones
+        missing from the snapshot had empty windows), or none when the
+        snapshot was taken with another window length.
+        """
+        if int(arrays["window"][0]) != self.window_seconds:
+            return set()
+        wanted = set(service_ids)
+        recent = recent or {}
+        offset = arrays["offset"].tolist()
+        restored = {service_id: (*_NO_SAMPLES, recent[service_id]) for service_id in wanted if service_id in recent}
+        for i, service_id in enumerate(arrays["id"].tolist()):
+            if service_id in wanted:
+                window = slice(offset[i], offset[i + 1])
+                restored[service_id] = (
+                    arrays["ts"][window], arrays["status"][window], arrays["rt"][window], recent.get(service_id, []),
+                )
+        with self._lock:
+            for service_id in wanted:
+                self._windows.pop(service_id, None)
+                self._restored.pop(service_id, None)
+            self._restored.update(restored)
+        return wanted
+
+    def rebuild(self, db: Session, service_ids: Optional[Iterable[int]] = None):
+        """Reload the current window from the checks table.
+
+        Reloads every service, or only ``service_ids`` when given (the other
+        windows are left as they are).
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=self.window_seconds)
+        rows = db.query(Check.service_id, Check.timestamp, Check.status, Check.response_time_ms).filter(
+            Check.timestamp >= cutoff
+        )
+        if service_ids is not None:
+            service_ids = set(service_ids)
+            if not service_ids:
+                return
+            rows = rows.filter(Check.service_id.in_(service_ids))
+        rows = rows.order_by(Check.timestamp).yield_per(5000)
+        windows = {}
+        count = 0
+        for service_id, ts, status, response_time_ms in rows:
+            w = windows.get(service_id)
+            if w is None:
+                w = windows[service_id] = ServiceWindow(self.window_seconds)
+            w.add(epoch_seconds(ts), status, response_time_ms)
+            count += 1
+        with self._lock:
+            if service_ids is None:
+                self._windows = windows
+                self._restored = {}
+            else:
+                for service_id in service_ids:
+                    self._windows.pop(service_id, None)
+                    self._restored.pop(service_id, None)
+                self._windows.update(windows)
+        logger.info("aggregator.rebuilt", services=len(windows), checks=count)
+
+
+aggregator = WindowAggregator()
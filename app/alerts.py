@@ -1,27 +1,261 @@
-import requests
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import httpx
+
 from .config import settings
 from .redis_client import get_redis
 from .logging_config import logger
+from .metrics import ALERTS_DROPPED, ALERT_MESSAGES
 
 
-def send_slack_alert(message: str, service_id: int):
-    """Send an alert to Slack if not recently sent (dedupe using Redis).
+@dataclass
+class Alert:
+    service_id: int
+    message: str
+    resolved: bool = False
+    # independent alerts about one service (check results, SLO burn rates)
+    # fire, dedupe and resolve separately
+    kind: str = "check"
+
+    @property
+    def key(self) -> tuple:
+        return self.service_id, self.kind
+
+    @property
+    def dedupe_key(self) -> str:
+        if self.kind == "check":
+            return f"alert_dedupe:{self.service_id}"
+        return f"alert_dedupe:{self.service_id}:{self.kind}"
+
+
+class TokenBucket:
+    """Token bucket: ``rate`` tokens per second, at most ``burst`` banked."""
+
+    def __init__(self, rate: float, burst: int, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available (0 if one is now)."""
+        self._refill()
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
 
-    Uses ALERT_DEDUPE_SECONDS from config to avoid spamming.
+    def take(self) -> bool:
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+
+def _retry_after(value: Optional[str]) -> float:
+    """Seconds to wait from a Retry-After header; 1s when it is missing or an HTTP date."""
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return 1.0
+    return seconds if seconds >= 0 else 1.0
+
+
+class AlertDispatcher:
+    """Delivers alerts off the probe path.
+
+    ``fire`` and ``resolve`` only enqueue. A background thread collects
+    whatever arrives within ``coalesce_seconds`` of the first alert,
+    deduplicates it, and posts it to the Slack webhook over one pooled
+    HTTP client. When more alerts arrive together than ``digest_threshold``
+    they go out as one digest message instead of one message each. Posts
+    are paced by a token bucket, and a 429 from the webhook is retried
+    after its Retry-After.
+
+    A service stays "firing" after its first alert. Repeats are suppressed
+    for ``ALERT_DEDUPE_SECONDS`` (shared across replicas through Redis), and
+    a resolve notification is sent once the service is healthy again. The
+    dedupe window outlives a resolve, so flapping does not re-alert.
     """
-    webhook = settings.ALERT_SLACK_WEBHOOK
-    if not webhook:
-        logger.info("alert.skipped.no_webhook", message=message, service_id=service_id)
-        return
-
-    r = get_redis()
-    key = f"alert_dedupe:{service_id}"
-    # set if not exists with ttl
-    if r.set(key, "1", nx=True, ex=settings.ALERT_DEDUPE_SECONDS):
+
+    def __init__(self, webhook: str = None, coalesce_seconds: float = None, digest_threshold: int = None,
+                 rate_per_second: float = None, burst: int = None, max_queue: int = None,
+                 transport: httpx.BaseTransport = None):
+        self.webhook = settings.ALERT_SLACK_WEBHOOK if webhook is None else webhook
+        self.coalesce_seconds = settings.ALERT_COALESCE_SECONDS if coalesce_seconds is None else coalesce_seconds
+        self.digest_threshold = digest_threshold or settings.ALERT_DIGEST_THRESHOLD
+        self.bucket = TokenBucket(rate_per_second or settings.ALERT_RATE_PER_SECOND, burst or settings.ALERT_BURST)
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue or settings.ALERT_QUEUE_MAX)
+        self._firing: dict = {}  # (service_id, kind) -> message
+        self._transport = transport
+        self._client: Optional[httpx.Client] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def _enqueue(self, alert: Alert):
+        if not self.webhook:
+            logger.info("alert.skipped.no_webhook", message=alert.message, service_id=alert.service_id)
+            return
+        self.start()
         try:
-            requests.post(webhook, json={"text": message}, timeout=5)
-            logger.info("alert.sent", message=message, service_id=service_id)
-        except Exception as e:
-            logger.error("alert.failed", exc=str(e), service_id=service_id, message=message)
-    else:
-        logger.info("alert.suppressed", message=message, service_id=service_id)
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            ALERTS_DROPPED.inc()
+            logger.error("alert.dropped.queue_full", service_id=alert.service_id, message=alert.message)
+
+    def fire(self, service_id: int, message: str, kind: str = "check"):
+        self._enqueue(Alert(service_id, message, kind=kind))
+
+    def resolve(self, service_id: int, message: str, kind: str = "check"):
+        """Report a healthy check; only notifies if the service was firing."""
+        if (service_id, kind) in self._firing:
+            self._enqueue(Alert(service_id, message, resolved=True, kind=kind))
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stopping.clear()
+                self._client = httpx.Client(
+                    timeout=settings.ALERT_HTTP_TIMEOUT_SECONDS,
+                    limits=httpx.Limits(max_connections=4, max_keepalive_connections=4),
+                    transport=self._transport,
+                )
+                self._thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Deliver what is queued, then stop."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stopping.set()
+        thread.join(timeout)
+        self._client.close()
+
+    def _collect(self) -> List[Alert]:
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.coalesce_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _admit(self, batch: List[Alert]) -> List[Alert]:
+        """Apply firing/resolved state and dedupe; last alert per service and kind wins.
+
+        The batch's dedupe keys are set in one Redis round-trip. A resolve
+        leaves its key to expire, so a flapping service alerts (and
+        recovers) at most once per ALERT_DEDUPE_SECONDS.
+        """
+        latest = {}
+        for alert in batch:
+            latest[alert.key] = alert
+        admitted, fired = [], []
+        for alert in latest.values():
+            if not alert.resolved:
+                fired.append(alert)
+            elif self._firing.pop(alert.key, None) is not None:
+                admitted.append(alert)
+        if not fired:
+            return admitted
+        pipe = get_redis().pipeline(transaction=False)
+        for alert in fired:
+            pipe.set(alert.dedupe_key, "1", nx=True, ex=settings.ALERT_DEDUPE_SECONDS)
+        try:
+            results = pipe.execute(raise_on_error=False)
+        except Exception as exc:
+            results = [exc] * len(fired)
+        for alert, result in zip(fired, results):
+            if isinstance(result, Exception):
+                logger.warning("alert.dedupe_failed", exc=str(result), service_id=alert.service_id)
+            # on a Redis error, better a duplicate alert than a lost one
+            if result:
+                self._firing[alert.key] = alert.message
+                admitted.append(alert)
+            else:
+                logger.info("alert.suppressed", message=alert.message, service_id=alert.service_id)
+        return admitted
+
+    def _messages(self, alerts: List[Alert]) -> List[str]:
+        firing = [a for a in alerts if not a.resolved]
+        resolved = [a for a in alerts if a.resolved]
+        messages = []
+        for group, title in ((firing, "alerts firing"), (resolved, "services recovered")):
+            if len(group) > self.digest_threshold:
+                lines = [f"• {a.message}" for a in group[:settings.ALERT_DIGEST_MAX_LINES]]
+                if len(group) > len(lines):
+                    lines.append(f"…and {len(group) - len(lines)} more")
+                messages.append(f"*{len(group)} {title}*\n" + "\n".join(lines))
+            else:
+                messages.extend(a.message for a in group)
+        return messages
+
+    def _post(self, text: str):
+        for _ in range(3):
+            while not self.bucket.take():
+                time.sleep(self.bucket.delay())
+            try:
+                resp = self._client.post(self.webhook, json={"text": text})
+            except Exception as exc:
+                ALERT_MESSAGES.labels(outcome="failed").inc()
+                logger.error("alert.failed", exc=str(exc), message=text)
+                return
+            if resp.status_code == 429:
+                retry_after = _retry_after(resp.headers.get("retry-after"))
+                logger.warning("alert.rate_limited", retry_after=retry_after)
+                time.sleep(min(retry_after, 60.0))
+                continue
+            if resp.status_code >= 400:
+                ALERT_MESSAGES.labels(outcome="failed").inc()
+                logger.error("alert.failed", status_code=resp.status_code, message=text)
+            else:
+                ALERT_MESSAGES.labels(outcome="sent").inc()
+                logger.info("alert.sent", message=text)
+            return
+        ALERT_MESSAGES.labels(outcome="failed").inc()
+        logger.error("alert.failed", exc="rate limited", message=text)
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if not batch:
+                continue
+            try:
+                for text in self._messages(self._admit(batch)):
+                    self._post(text)
+            except Exception:
+                logger.exception("alert.dispatch_failed", alerts=len(batch))
+
+
+alert_dispatcher = AlertDispatcher()
+
+
+def send_slack_alert(message: str, service_id: int):
+    """Queue an alert for the background dispatcher (never blocks on Slack).
+
+    Repeats for a service are suppressed for ALERT_DEDUPE_SECONDS.
+    """
+    alert_dispatcher.fire(service_id, message)
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from .config import settings
+from .logging_config import logger
+from .metrics import RESPONSE_CACHE_REQUESTS
+from .redis_client import get_redis
+
+GENERATION_KEY = "pulseatlas:cache:gen:{}"
+ENTRY_KEY = "pulseatlas:cache:entry:{}"
+
+
+def services_scope() -> str:
+    return "services"
+
+
+def service_scope(service_id: int) -> str:
+    return f"service:{service_id}"
+
+
+class ResponseCache:
+    """Read-through cache of serialized JSON responses.
+
+    Entries live in an in-process LRU with a TTL and, with
+    ``RESPONSE_CACHE_REDIS``, in Redis as a second tier shared by replicas.
+    Every entry belongs to a scope (the service list, or one service). Each
+    scope has a generation number that is part of the entry key, so
+    invalidating a scope is one increment and orphans its entries at once.
+    With Redis the generations live there, so a check written by any
+    process invalidates every replica. Concurrent misses for the same key
+    are coalesced on the event loop: one caller computes and the others
+    await its result.
+    """
+
+    def __init__(self, max_entries: int = None, ttl: float = None, use_redis: bool = None):
+        self.max_entries = max_entries or settings.RESPONSE_CACHE_MAX_ENTRIES
+        self.ttl = ttl or settings.RESPONSE_CACHE_TTL_SECONDS
+        self.use_redis = settings.RESPONSE_CACHE_REDIS if use_redis is None else use_redis
+        self._entries: OrderedDict = OrderedDict()  # key -> (expires_at, etag, body)
+        self._generations: dict = {}
+        self._inflight: dict = {}  # full key -> asyncio.Future of the compute in progress
+        self._lock = threading.Lock()
+
+    def _generation(self, scope: str) -> int:
+        if self.use_redis:
+            try:
+                return int(get_redis().get(GENERATION_KEY.format(scope)) or 0)
+            except Exception as exc:
+                logger.warning("cache.redis_failed", exc=str(exc))
+                # without a shared generation an entry could outlive an
+                # invalidation made elsewhere; bypass the cache instead
+                return -1
+        return self._generations.get(scope, 0)
+
+    def invalidate(self, scopes: Iterable[str]):
+        scopes = set(scopes)
+        if not scopes:
+            return
+        if self.use_redis:
+            try:
+                pipe = get_redis().pipeline(transaction=False)
+                for scope in scopes:
+                    pipe.incr(GENERATION_KEY.format(scope))
+                pipe.execute()
+            except Exception as exc:
+                logger.warning("cache.redis_invalidate_failed", exc=str(exc))
+        with self._lock:
+            for scope in scopes:
+                self._generations[scope] = self._generations.get(scope, 0) + 1
+
+    def invalidate_services(self, service_ids: Iterable[int], listing: bool = False):
+        scopes = {service_scope(sid) for sid in service_ids}
+        if listing:
+            scopes.add(services_scope())
+        self.invalidate(scopes)
+
+    def _local_get(self, key: str) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, etag, body = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return etag, body
+
+    def _local_put(self, key: str, etag: str, body: bytes):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _remote_get(self, key: str) -> Optional[Tuple[str, bytes]]:
+        try:
+            value = get_redis().get(ENTRY_KEY.format(key))
+        except Exception as exc:
+            logger.warning("cache.redis_failed", exc=str(exc))
+            return None
+        if value is None:
+            return None
+        etag, _, body = value.partition("\n")
+        return etag, body.encode("utf-8")
+
+    def _remote_put(self, key: str, etag: str, body: bytes):
+        try:
+            get_redis().set(ENTRY_KEY.format(key), f"{etag}\n{body.decode('utf-8')}", px=max(1, int(self.ttl * 1000)))
+        except Exception as exc:
+            logger.warning("cache.redis_failed", exc=str(exc))
+
+    @staticmethod
+    def _encode(value) -> Tuple[str, bytes]:
+        body = json.dumps(jsonable_encoder(value), separators=(",", ":")).encode("utf-8")
+        return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"', body
+
+    def _lookup(self, scope: str, key: str) -> Tuple[int, str, Optional[Tuple[str, bytes]]]:
+        """(generation, full key, cached entry or None); generation -1 means bypass."""
+        generation = self._generation(scope)
+        if generation < 0:
+            RESPONSE_CACHE_REQUESTS.labels(result="bypass").inc()
+            return generation, "", None
+        full_key = f"{scope}:{generation}:{key}"
+        cached = self._local_get(full_key)
+        if cached is None and self.use_redis:
+            cached = self._remote_get(full_key)
+            if cached is not None:
+                self._local_put(full_key, *cached)
+        if cached is not None:
+            RESPONSE_CACHE_REQUESTS.labels(result="hit").inc()
+        return generation, full_key, cached
+
+    def _store(self, scope: str, generation: int, full_key: str, result: Tuple[str, bytes]):
+        # an invalidation that raced the query makes the result stale
+        if self._generation(scope) == generation:
+            self._local_put(full_key, *result)
+            if self.use_redis:
+                self._remote_put(full_key, *result)
+
+    async def aget_or_compute(self, scope: str, key: str,
+                              compute: Callable[[], Awaitable[object]]) -> Tuple[str, bytes]:
+        """Return ``(etag, body)`` for ``key``, awaiting ``compute()`` at most once
+        per miss. Redis round trips run in a worker thread."""
+        if self.use_redis:
+            generation, full_key, cached = await asyncio.to_thread(self._lookup, scope, key)
+        else:
+            generation, full_key, cached = self._lookup(scope, key)
+        if generation < 0:
+            return self._encode(await compute())
+        if cached is not None:
+            return cached
+
+        pending = self._inflight.get(full_key)
+        if pending is not None:
+            RESPONSE_CACHE_REQUESTS.labels(result="coalesced").inc()
+            return await asyncio.shield(pending)
+        pending = self._inflight[full_key] = asyncio.get_running_loop().create_future()
+        RESPONSE_CACHE_REQUESTS.labels(result="miss").inc()
+        try:
+            result = self._encode(await compute())
+            if self.use_redis:
+                await asyncio.to_thread(self._store, scope, generation, full_key, result)
+            else:
+                self._store(scope, generation, full_key, result)
+            pending.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except BaseException as exc:
+            pending.set_exception(exc)
+            # retrieved here so a miss nobody else waited on does not log "never retrieved"
+            pending.exception()
+            raise
+        finally:
+            self._inflight.pop(full_key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,165 @@
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .cache import response_cache
+from .config import settings
+from .database import SessionLocal
+from .logging_config import logger
+from .metrics import (
+    CHECK_WRITE_BATCH_SIZE,
+    CHECK_WRITE_FLUSH_SECONDS,
+    CHECK_WRITE_QUEUE_DEPTH,
+    CHECK_WRITE_DROPPED,
+    observe_stage,
+)
+from .models import Check, Service
+from .rollups import rollups
+
+
+class CheckWriter:
+    """Write-behind buffer that persists Check rows in multi-row batches.
+
+    Producers ``submit`` plain row dicts; a background thread flushes them
+    with a single executemany INSERT (psycopg2 turns this into multi-row
+    ``INSERT ... VALUES`` pages) when ``batch_size`` rows are waiting or
+    ``flush_interval`` seconds have passed. The queue is bounded: when the
+    database falls behind, ``submit`` blocks for up to ``put_timeout``
+    seconds before the row is dropped and counted. Failed flushes are
+    retried with backoff, and ``stop`` drains everything still queued.
+    Written rows are folded into the 1m/1h rollups.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal, batch_size: int = None,
+                 flush_interval: float = None, max_queue: int = None, put_timeout: float = None):
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.CHECK_WRITE_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.CHECK_WRITE_FLUSH_SECONDS
+        self.put_timeout = settings.CHECK_WRITE_PUT_TIMEOUT_SECONDS if put_timeout is None else put_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue or settings.CHECK_WRITE_MAX_QUEUE)
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="check-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        """Flush everything queued and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stopping.set()
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.error("check_writer.stop_timeout", queued=self._queue.qsize())
+
+    def submit(self, row: dict) -> bool:
+        self.start()
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+        except queue.Full:
+            CHECK_WRITE_DROPPED.labels(reason="queue_full").inc()
+            logger.error("check_writer.queue_full", service_id=row.get("service_id"))
+            return False
+        CHECK_WRITE_QUEUE_DEPTH.set(self._queue.qsize())
+        return True
+
+    def _next_batch(self) -> list:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self._stopping.is_set() and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.5)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._flush_with_retry(batch)
+        logger.info("check_writer.stopped")
+
+    def _flush_with_retry(self, batch: list):
+        delay = 0.5
+        while True:
+            try:
+                try:
+                    self.flush(batch)
+                    break
+                except IntegrityError as exc:
+                    if "no partition of relation" in str(exc.orig):
+                        # checks_default is missing and no daily partition covers these rows
+                        logger.error("check_writer.no_partition", exc=str(exc.orig), rows=len(batch))
+                        CHECK_WRITE_DROPPED.labels(reason="no_partition").inc(len(batch))
+                        return
+                    # most likely rows for a service deleted while they were queued
+                    kept = self._drop_orphans(batch)
+                    if len(kept) == len(batch):
+                        logger.error("check_writer.batch_rejected", exc=str(exc), rows=len(batch))
+                        CHECK_WRITE_DROPPED.labels(reason="rejected").inc(len(batch))
+                        return
+                    batch = kept
+                    if not batch:
+                        return
+            except Exception as exc:
+                logger.error("check_writer.flush_failed", exc=str(exc), rows=len(batch), retry_in=delay)
+                if self._stopping.is_set() and delay > 8:
+                    logger.error("check_writer.batch_lost", rows=len(batch))
+                    CHECK_WRITE_DROPPED.labels(reason="lost").inc(len(batch))
+                    return
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+        # the rows are committed: a failure from here on must not retry the insert
+        try:
+            rollups.observe_rows(batch)
+            response_cache.invalidate_services({row["service_id"] for row in batch})
+        except Exception:
+            logger.exception("check_writer.post_write_failed", rows=len(batch))
+
+    def _drop_orphans(self, batch: list) -> list:
+        db = self.session_factory()
+        try:
+            ids = {row["service_id"] for row in batch}
+            live = {sid for (sid,) in db.query(Service.id).filter(Service.id.in_(ids))}
+        finally:
+            db.close()
+        kept = [row for row in batch if row["service_id"] in live]
+        if len(kept) != len(batch):
+            logger.info("check_writer.orphans_dropped", rows=len(batch) - len(kept))
+        return kept
+
+    def flush(self, batch: list):
+        start = time.perf_counter()
+        db = self.session_factory()
+        try:
+            db.execute(Check.__table__.insert(), batch)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        elapsed = time.perf_counter() - start
+        CHECK_WRITE_FLUSH_SECONDS.observe(elapsed)
+        observe_stage("db_commit", elapsed)
+        CHECK_WRITE_BATCH_SIZE.observe(len(batch))
+        CHECK_WRITE_QUEUE_DEPTH.set(self._queue.qsize())
+
+
+check_writer = CheckWriter()
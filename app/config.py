@@ -9,21 +9,147 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = "healthdb"
     POSTGRES_HOST: str = "localhost"
     POSTGRES_PORT: int = 5432
+    # Full SQLAlchemy URL; overrides the POSTGRES_* settings when set
+    DATABASE_URL: str = ""
+    # Read replica for the read-only API endpoints (default: the primary). Reads
+    # may lag writes by the replication delay, cached ones by up to the cache TTL.
+    DATABASE_READ_URL: str = ""
+    # Per engine (sync primary, async primary, async replica); ignored for SQLite
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    # asyncpg prepared statements kept per connection; 0 behind PgBouncer in transaction mode
+    DB_STATEMENT_CACHE_SIZE: int = 100
 
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
+    # Use the process-local in-memory store instead of a Redis server
+    REDIS_IN_MEMORY: bool = False
+    # Past this (estimated) size the in-memory store evicts least recently used keys
+    REDIS_IN_MEMORY_MAX_BYTES: int = 64 * 1024 * 1024
 
     KAFKA_BOOTSTRAP_SERVERS: str = "localhost:9092"
+    KAFKA_LINGER_MS: int = 50
+    KAFKA_BATCH_SIZE: int = 65536
+    KAFKA_COMPRESSION_TYPE: str = "gzip"
+    KAFKA_MAX_BLOCK_MS: int = 1000
+    KAFKA_FLUSH_INTERVAL_SECONDS: float = 5.0
+    # One spool per worker process: {shard} is WORKER_SHARD_INDEX
+    KAFKA_SPOOL_PATH: str = "spool/kafka-events-{shard}.jsonl"
+    KAFKA_SPOOL_MAX_BYTES: int = 64 * 1024 * 1024
+    # Spooled events are fsynced every flush interval, or after this many
+    KAFKA_SPOOL_SYNC_RECORDS: int = 1000
+
+    RESPONSE_CACHE_TTL_SECONDS: float = 60.0
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+    # Share cached responses and invalidations across replicas through Redis
+    RESPONSE_CACHE_REDIS: bool = False
+
+    EXPORT_CHUNK_ROWS: int = 5000
+    # Rows per statement and per transaction when bulk registration or a
+    # fleet sync applies creates, updates and deletes
+    FLEET_SYNC_BATCH_SIZE: int = 1000
+
+    LIVE_CLIENT_BUFFER: int = 256
+    LIVE_KEEPALIVE_SECONDS: float = 15.0
+    # Fan live check events out across replicas through Redis pub/sub
+    LIVE_REDIS_FANOUT: bool = False
+    LIVE_REDIS_CHANNEL: str = "pulseatlas:checks"
+
+    # GET /admin/profile samples thread stacks on demand; off unless enabled
+    PROFILER_ENABLED: bool = False
+    # When set, admin endpoints require it in the X-Admin-Token header
+    ADMIN_TOKEN: str = ""
 
     APP_HOST: str = "0.0.0.0"
     APP_PORT: int = 8000
 
     SCHEDULER_JOB_INTERVAL: int = 60
+    SCHEDULER_RECORD_WORKERS: int = 8
+    SCHEDULER_WHEEL_TICK_SECONDS: float = 0.5
+    SCHEDULER_DISPATCH_BATCH: int = 500
+    # Split services across scheduler nodes through Redis leases
+    SCHEDULER_SHARDING_ENABLED: bool = False
+    SCHEDULER_NODE_ID: str = ""
+    SCHEDULER_SHARDS: int = 256
+    SCHEDULER_HEARTBEAT_SECONDS: float = 5.0
+    SCHEDULER_NODE_TTL_SECONDS: float = 15.0
+    SCHEDULER_LEASE_TTL_SECONDS: int = 15
+    # How often the scheduler reloads services created or removed elsewhere
+    SCHEDULER_SYNC_SECONDS: float = 30.0
+    # No service is probed more often than this
+    SCHEDULER_MIN_INTERVAL_SECONDS: int = 5
+    # Adaptive services: max_interval_seconds defaults to this times interval_seconds,
+    # and an OK response this many times slower than the latency EWMA counts as degraded
+    ADAPTIVE_MAX_INTERVAL_FACTOR: int = 4
+    ADAPTIVE_LATENCY_JUMP_FACTOR: float = 2.0
+    # Global probe budget (probes/s, 0 = unlimited). Over budget, due probes are
+    # dispatched degraded-first then by priority, and the rest skip that run.
+    PROBE_BUDGET_PER_SECOND: float = 0.0
+
+    # Run probes inside the API process; turn off when app.worker runs them.
+    # Split deployments should also enable LIVE_REDIS_FANOUT and RESPONSE_CACHE_REDIS
+    # so live streams and cached reads see the workers' checks.
+    API_RUN_SCHEDULER: bool = True
+    # Static split of services between worker processes: a process probes the
+    # services with id % WORKER_SHARD_COUNT == WORKER_SHARD_INDEX
+    WORKER_PROCESSES: int = 1
+    WORKER_SHARD_INDEX: int = 0
+    WORKER_SHARD_COUNT: int = 1
+    WORKER_METRICS_PORT: int = 9100
+    # The scheduler saves its probe state (SRE windows, adaptive intervals, SLO
+    # counts) here periodically and at shutdown, so a restart resumes from it
+    # instead of reloading everything from the database. {shard} is
+    # WORKER_SHARD_INDEX; "" turns snapshots off. Not used with
+    # SCHEDULER_SHARDING_ENABLED, where shard leases move state between nodes.
+    SNAPSHOT_PATH: str = "spool/probe-state-{shard}.bin"
+    SNAPSHOT_INTERVAL_SECONDS: float = 60.0
+    # An older snapshot is ignored and the state reloaded from the database
+    SNAPSHOT_MAX_AGE_SECONDS: float = 900.0
+
+    SRE_WINDOW_MINUTES: int = 60
+
+    SKETCH_RELATIVE_ACCURACY: float = 0.01
+    ROLLUP_FLUSH_SECONDS: int = 30
+
+    CHECK_WRITE_BATCH_SIZE: int = 500
+    CHECK_WRITE_FLUSH_SECONDS: float = 1.0
+    CHECK_WRITE_MAX_QUEUE: int = 50000
+    CHECK_WRITE_PUT_TIMEOUT_SECONDS: float = 5.0
+
+    CHECKS_RETENTION_DAYS: int = 30
+    CHECKS_PARTITION_PREMAKE_DAYS: int = 3
+    ROLLUP_MINUTE_RETENTION_DAYS: int = 3
+    ROLLUP_HOUR_RETENTION_DAYS: int = 400
+    RETENTION_JOB_INTERVAL_SECONDS: int = 3600
+
+    PROBE_MAX_CONCURRENCY: int = 1000
+    # politeness limit: concurrent probes to one hostname, whatever the port or path
+    PROBE_MAX_PER_HOST: int = 10
+    PROBE_MAX_KEEPALIVE: int = 200
+    PROBE_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    # services with the same URL and timeout share one in-flight probe
+    PROBE_COALESCE: bool = True
+
+    # SLO burn-rate alerts, "long/short:factor": fire when the error budget
+    # burns faster than factor x sustainable over both windows
+    SLO_BURN_ALERTS: str = "1h/5m:14.4,6h/30m:6,3d/6h:1"
+    SLO_PERIOD_DAYS: int = 30
+    SLO_EVALUATION_SECONDS: float = 60.0
 
     ALERT_SLACK_WEBHOOK: str = ""
     ALERT_DEDUPE_SECONDS: int = 300
     ALERT_RESPONSE_TIME_THRESHOLD_MS: int = 2000
+    # Alerts raised within this window of each other are delivered together
+    ALERT_COALESCE_SECONDS: float = 2.0
+    ALERT_DIGEST_THRESHOLD: int = 3
+    ALERT_DIGEST_MAX_LINES: int = 50
+    ALERT_RATE_PER_SECOND: float = 1.0
+    ALERT_BURST: int = 5
+    ALERT_QUEUE_MAX: int = 10000
+    ALERT_HTTP_TIMEOUT_SECONDS: float = 5.0
 
 
 settings = Settings()
@@ -1,18 +1,86 @@
+from pathlib import Path
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from .config import settings
+from .observability import instrument_engine, timed_pool
 
-DB_URL = (
+DB_URL = settings.DATABASE_URL or (
     f"postgresql+psycopg2://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}"
     f"@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
 )
+READ_DB_URL = settings.DATABASE_READ_URL or DB_URL
 
-engine = create_engine(DB_URL, pool_pre_ping=True)
-SessionLocal = scoped_session(sessionmaker(bind=engine))
+_ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
 
-def get_db():
-    db = SessionLocal()
-    try:
+
+def async_url(url: str):
+    """``url`` with its driver swapped for the asyncio one (asyncpg / aiosqlite)."""
+    u = make_url(url)
+    driver = _ASYNC_DRIVERS.get(u.get_backend_name())
+    return u.set(drivername=f"{u.get_backend_name()}+{driver}") if driver else u
+
+
+def _engine_args(url: str, pool_base: type, name: str) -> dict:
+    if url.startswith("sqlite"):
+        # SQLite (local runs, benchmarks) is shared by the API, scheduler and writer threads
+        return {"connect_args": {"check_same_thread": False}} if pool_base is QueuePool else {}
+    args = dict(
+        poolclass=timed_pool(pool_base, name),
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    )
+    if pool_base is AsyncAdaptedQueuePool:
+        args["connect_args"] = {
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        }
+    return args
+
+
+def _async_engine(url: str, name: str):
+    engine = create_async_engine(async_url(url), pool_pre_ping=True, **_engine_args(url, AsyncAdaptedQueuePool, name))
+    instrument_engine(engine.sync_engine, name)
+    return engine
+
+
+# The probe pipeline (scheduler, check writer, rollups) writes through the
+# synchronous engine; API endpoints use the async ones.
+engine = create_engine(DB_URL, pool_pre_ping=True, **_engine_args(DB_URL, QueuePool, "primary"))
+instrument_engine(engine, "primary")
+SessionFactory = sessionmaker(bind=engine)
+SessionLocal = scoped_session(SessionFactory)
+
+async_engine = _async_engine(DB_URL, "async_primary")
+read_engine = _async_engine(READ_DB_URL, "async_read") if READ_DB_URL != DB_URL else async_engine
+AsyncSessionFactory = sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+ReadSessionFactory = sessionmaker(bind=read_engine, class_=AsyncSession)
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+
+async def get_async_db():
+    """Async session on the primary, for endpoints that write."""
+    async with AsyncSessionFactory() as db:
+        yield db
+
+
+async def get_read_db():
+    """Async session for read-only endpoints: the replica when DATABASE_READ_URL is set."""
+    async with ReadSessionFactory() as db:
         yield db
-    finally:
-        db.close()
+
+
+def run_migrations(revision: str = "head"):
+    """Upgrade the database schema with Alembic (see migrations/)."""
+    from alembic import command
+    from alembic.config import Config
+
+    cfg = Config(str(ALEMBIC_INI))
+    cfg.set_main_option("script_location", str(ALEMBIC_INI.parent / "migrations"))
+    cfg.attributes["configure_logger"] = False
+    command.upgrade(cfg, revision)
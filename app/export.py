@@ -0,0 +1,137 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy import DateTime, Float, Integer, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .models import Check
+from .phases import PHASE_COLUMNS, phase_values
+
+# the packed phase timings are exported as one float column per phase
+_TABLE_COLUMNS = [c for c in Check.__table__.columns if c.name != "phase_timings"]
+EXPORT_COLUMNS = [c.name for c in _TABLE_COLUMNS] + list(PHASE_COLUMNS)
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+async def _chunks(engine: AsyncEngine, service_id: int, since: Optional[datetime], until: Optional[datetime],
+                  chunk_size: int) -> AsyncIterator[List[tuple]]:
+    table = Check.__table__
+    stmt = select(*_TABLE_COLUMNS, table.c.phase_timings).where(table.c.service_id == service_id)
+    if since is not None:
+        stmt = stmt.where(table.c.timestamp >= since)
+    if until is not None:
+        stmt = stmt.where(table.c.timestamp < until)
+    stmt = stmt.order_by(table.c.timestamp, table.c.id)
+    # stream() reads through a server-side cursor where the driver has one,
+    # so only one chunk of rows is held in memory at a time
+    async with engine.connect() as conn:
+        result = await conn.stream(stmt.execution_options(max_row_buffer=chunk_size))
+        async for rows in result.partitions(chunk_size):
+            yield [tuple(row[:-1]) + phase_values(row[-1]) for row in rows]
+
+
+async def _ndjson(chunks) -> AsyncIterator[bytes]:
+    async for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=_isoformat) + "\n" for row in rows
+        ).encode("utf-8")
+
+
+async def _csv(chunks) -> AsyncIterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    async for rows in chunks:
+        writer.writerows(
+            [_isoformat(v) if isinstance(v, datetime) else v for v in row] for row in rows
+        )
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the caller."""
+
+    closed = False
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+async def _parquet(chunks) -> AsyncIterator[bytes]:
+    # one row group per chunk; imported here so the API runs without pyarrow
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    def arrow_type(column):
+        if isinstance(column.type, DateTime):
+            return pa.timestamp("us", tz="UTC")
+        if isinstance(column.type, Integer):
+            return pa.int64()
+        if isinstance(column.type, Float):
+            return pa.float64()
+        return pa.string()
+
+    schema = pa.schema(
+        [(c.name, arrow_type(c)) for c in _TABLE_COLUMNS] + [(name, pa.float64()) for name in PHASE_COLUMNS]
+    )
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        async for rows in chunks:
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema,
+            ))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _isoformat(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_checks(engine: AsyncEngine, service_id: int, fmt: str, since: Optional[datetime] = None,
+                  until: Optional[datetime] = None, chunk_size: int = 5000) -> AsyncIterator[bytes]:
+    """Stream a service's checks, oldest first, encoded as ``fmt`` in chunks."""
+    chunks = _chunks(engine, service_id, since, until, chunk_size)
+    return {"ndjson": _ndjson, "csv": _csv, "parquet": _parquet}[fmt](chunks)
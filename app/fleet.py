@@ -0,0 +1,105 @@
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .models import Service
+from .schemas import ServiceBulk, ServiceCreate
+
+# the columns a manifest declares; everything else on a service is runtime state
+FIELDS = tuple(ServiceCreate.model_fields)
+
+
+@dataclass
+class FleetPlan:
+    """What it takes to make the services table match a manifest."""
+    creates: List[dict] = field(default_factory=list)
+    updates: List[dict] = field(default_factory=list)   # with the row's "id"
+    deletes: List[int] = field(default_factory=list)
+    unchanged: int = 0
+
+
+def parse_manifest(data) -> List[ServiceCreate]:
+    """Validate a manifest: a list of services, or ``{"services": [...]}``."""
+    if isinstance(data, dict):
+        data = data.get("services") or []
+    return ServiceBulk.model_validate({"services": data}).services
+
+
+def load_manifest(path) -> List[ServiceCreate]:
+    """Read a YAML (.yaml/.yml) or JSON fleet manifest."""
+    path = Path(path)
+    text = path.read_text()
+    if path.suffix in (".yaml", ".yml"):
+        import yaml
+
+        return parse_manifest(yaml.safe_load(text))
+    return parse_manifest(json.loads(text))
+
+
+def _values(spec: ServiceCreate) -> dict:
+    return dict(spec.model_dump(exclude={"url"}), url=str(spec.url))
+
+
+def diff_fleet(db: Session, specs: List[ServiceCreate], prune: bool = False) -> FleetPlan:
+    """Diff ``specs`` against the services table, matching services by name.
+
+    With ``prune``, services missing from ``specs`` (and extra rows sharing a
+    name, beyond the oldest) are deleted.
+    """
+    existing, extra = {}, []
+    for row in db.query(Service.id, *(getattr(Service, name) for name in FIELDS)).order_by(Service.id):
+        if row.name in existing:
+            extra.append(row.id)
+        else:
+            existing[row.name] = row
+    result = FleetPlan()
+    for spec in specs:
+        values = _values(spec)
+        row = existing.pop(spec.name, None)
+        if row is None:
+            result.creates.append(values)
+        elif any(getattr(row, name) != value for name, value in values.items()):
+            result.updates.append(dict(values, id=row.id))
+        else:
+            result.unchanged += 1
+    if prune:
+        result.deletes = sorted([row.id for row in existing.values()] + extra)
+    return result
+
+
+def _batches(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def apply_fleet(db: Session, fleet: FleetPlan, batch_size: Optional[int] = None) -> List[Service]:
+    """Apply ``fleet`` one batch per statement and transaction.
+
+    An error leaves earlier batches committed; re-running the same sync
+    finishes the job. Returns the created and updated services.
+    """
+    batch_size = batch_size or settings.FLEET_SYNC_BATCH_SIZE
+    try:
+        for batch in _batches(fleet.deletes, batch_size):
+            db.query(Service).filter(Service.id.in_(batch)).delete(synchronize_session=False)
+            db.commit()
+        for batch in _batches(fleet.updates, batch_size):
+            db.bulk_update_mappings(Service, batch)
+            db.commit()
+        for batch in _batches(fleet.creates, batch_size):
+            db.bulk_insert_mappings(Service, batch)
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    # bulk inserts do not hand back ids, so read the changed rows back by name
+    names = [values["name"] for values in fleet.updates + fleet.creates]
+    changed = {}
+    for batch in _batches(names, batch_size):
+        for service in db.query(Service).filter(Service.name.in_(batch)).order_by(Service.id.desc()):
+            changed[service.name] = service   # the oldest row of a name wins, as in diff_fleet()
+    return list(changed.values())
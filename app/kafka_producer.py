@@ -1,36 +1,200 @@
 from kafka import KafkaProducer
+import glob
 import json
+import os
+import re
+import threading
+import time
+from typing import List, Optional
 from .config import settings
 from .logging_config import logger
+from .metrics import KAFKA_EVENTS
+from .spool import DiskSpool
 
 
 class SimpleKafkaProducer:
-    def __init__(self, bootstrap_servers=None):
+    """Fire-and-forget Kafka publisher with batching and an on-disk spool.
+
+    ``publish`` hands the event to the client's send buffer and returns at
+    once; batching and compression are left to kafka-python (``linger_ms``,
+    ``batch_size``, ``compression_type``). A background thread flushes on an
+    interval. While the broker is unreachable (or a send fails) events go to
+    a bounded append-only spool file. They are replayed in order once Kafka
+    is reachable again; until the spool is empty, new events are spooled
+    behind them so ordering holds. Each worker shard spools to its own file;
+    a shard also replays, once, the files left by shards that no longer
+    exist and map onto it (after a run with more worker processes).
+    """
+
+    def __init__(self, bootstrap_servers=None, spool_path: str = None, spool_max_bytes: int = None,
+                 flush_interval: float = None):
         self.bootstrap_servers = bootstrap_servers or settings.KAFKA_BOOTSTRAP_SERVERS
+        self.spool_path = spool_path or settings.KAFKA_SPOOL_PATH
+        self.spool_max_bytes = spool_max_bytes or settings.KAFKA_SPOOL_MAX_BYTES
+        self.flush_interval = flush_interval or settings.KAFKA_FLUSH_INTERVAL_SECONDS
         self._producer = None
+        self._spool: Optional[DiskSpool] = None
+        self._lock = threading.Lock()
+        self._next_connect_at = 0.0
+        self._connect_backoff = 1.0
+        self._stopping = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._orphans_replayed = False
+
+    def _spool_file(self, shard: int) -> str:
+        return self.spool_path.format(shard=shard)
+
+    @property
+    def spool(self) -> DiskSpool:
+        if self._spool is None:
+            with self._lock:
+                if self._spool is None:
+                    self._spool = DiskSpool(self._spool_file(settings.WORKER_SHARD_INDEX), self.spool_max_bytes,
+                                            sync_every=settings.KAFKA_SPOOL_SYNC_RECORDS)
+        return self._spool
 
     def connect(self):
-        if self._producer is None:
+        if self._producer is not None or time.monotonic() < self._next_connect_at:
+            return
+        # publishers spool rather than queue up behind a slow connect attempt
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if self._producer is not None or time.monotonic() < self._next_connect_at:
+                return
             try:
                 self._producer = KafkaProducer(
                     bootstrap_servers=self.bootstrap_servers.split(","),
                     value_serializer=lambda v: json.dumps(v).encode("utf-8"),
+                    linger_ms=settings.KAFKA_LINGER_MS,
+                    batch_size=settings.KAFKA_BATCH_SIZE,
+                    compression_type=settings.KAFKA_COMPRESSION_TYPE or None,
+                    max_block_ms=settings.KAFKA_MAX_BLOCK_MS,
                 )
+                self._connect_backoff = 1.0
+                logger.info("kafka.connected", bootstrap_servers=self.bootstrap_servers)
             except Exception as e:
-                logger.error("kafka.connect.failed", exc=str(e))
+                # don't hammer an unreachable broker on every publish
+                self._next_connect_at = time.monotonic() + self._connect_backoff
+                self._connect_backoff = min(self._connect_backoff * 2, 60.0)
+                logger.error("kafka.connect.failed", exc=str(e), retry_in=self._next_connect_at - time.monotonic())
+        finally:
+            self._lock.release()
+        self._start_flusher()
+
+    def _start_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="kafka-flusher", daemon=True)
+            self._flusher.start()
+
+    def _spool_event(self, topic: str, message: dict):
+        if self.spool.append({"topic": topic, "message": message}):
+            KAFKA_EVENTS.labels(outcome="spooled").inc()
+        else:
+            KAFKA_EVENTS.labels(outcome="dropped").inc()
+            logger.error("kafka.spool.full", topic=topic)
+
+    def _on_send_error(self, topic: str, message: dict, exc):
+        logger.warning("kafka.send.failed", exc=str(exc), topic=topic)
+        self._spool_event(topic, message)
 
     def publish(self, topic: str, message: dict):
+        KAFKA_EVENTS.labels(outcome="queued").inc()
         try:
             self.connect()
-            if not self._producer:
-                logger.warning("kafka.producer.not_ready", topic=topic)
+            if not self._producer or not self.spool.empty:
+                self._spool_event(topic, message)
                 return
-            self._producer.send(topic, message)
-            self._producer.flush()
-            logger.debug("kafka.published", topic=topic, message=message)
+            future = self._producer.send(topic, message)
+            future.add_callback(lambda _: KAFKA_EVENTS.labels(outcome="sent").inc())
+            future.add_errback(lambda exc: self._on_send_error(topic, message, exc))
         except Exception as exc:
-            # don't raise in production path - log and continue
+            # don't raise in production path - spool and continue
             logger.error("kafka.publish.failed", exc=str(exc), topic=topic)
+            self._spool_event(topic, message)
+
+    def _send_batch(self, records: List[dict]) -> int:
+        futures = [self._producer.send(r["topic"], r["message"]) for r in records]
+        self._producer.flush(timeout=settings.KAFKA_MAX_BLOCK_MS / 1000 * 10)
+        delivered = 0
+        for f in futures:
+            if not f.succeeded():
+                break
+            delivered += 1
+        KAFKA_EVENTS.labels(outcome="sent").inc(delivered)
+        return delivered
+
+    def replay_spool(self) -> int:
+        if self._producer is None or self.spool.empty:
+            return 0
+        try:
+            replayed = self.spool.replay(self._send_batch)
+        except Exception as exc:
+            logger.error("kafka.spool.replay_failed", exc=str(exc))
+            return 0
+        if replayed:
+            logger.info("kafka.spool.replayed", events=replayed)
+        return replayed
+
+    def _orphan_spools(self) -> List[str]:
+        if "{shard}" not in self.spool_path:
+            return []
+        pattern = re.compile(re.escape(self.spool_path).replace(re.escape("{shard}"), r"(\d+)") + "$")
+        paths = []
+        for path in sorted(glob.glob(self._spool_file("*"))):
+            match = pattern.match(path)
+            shard = int(match.group(1)) if match else None
+            if (shard is not None and shard != settings.WORKER_SHARD_INDEX
+                    and shard % settings.WORKER_SHARD_COUNT == settings.WORKER_SHARD_INDEX):
+                paths.append(path)
+        return paths
+
+    def replay_orphan_spools(self) -> bool:
+        """Replay and remove the spools of shards that no longer run; True once all are gone."""
+        for path in self._orphan_spools():
+            spool = DiskSpool(path, self.spool_max_bytes)
+            try:
+                replayed = spool.replay(self._send_batch)
+            except Exception as exc:
+                logger.error("kafka.spool.replay_failed", exc=str(exc), path=path)
+                return False
+            finally:
+                spool.close()
+            if not spool.empty:
+                return False
+            os.remove(path)
+            logger.info("kafka.spool.orphan_replayed", path=path, events=replayed)
+        return True
+
+    def _flush_loop(self):
+        while not self._stopping.wait(self.flush_interval):
+            try:
+                if self._spool is not None:
+                    self._spool.sync()
+                self.connect()
+                if self._producer is not None:
+                    self._producer.flush(timeout=self.flush_interval)
+                    self.replay_spool()
+                    if not self._orphans_replayed:
+                        self._orphans_replayed = self.replay_orphan_spools()
+            except Exception as exc:
+                logger.error("kafka.flush.failed", exc=str(exc))
+
+    def close(self, timeout: float = 10.0):
+        """Flush buffered events and close the client (call on shutdown)."""
+        self._stopping.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout)
+            self._flusher = None
+        if self._producer is not None:
+            try:
+                self._producer.flush(timeout=timeout)
+                self._producer.close(timeout=timeout)
+            except Exception as exc:
+                logger.error("kafka.close.failed", exc=str(exc))
+            self._producer = None
+        if self._spool is not None:
+            self._spool.close()
 
 
 producer = SimpleKafkaProducer()
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import threading
+import time
+from typing import Optional, Set
+
+from .config import settings
+from .logging_config import logger
+from .metrics import LIVE_SUBSCRIBERS, LIVE_SUBSCRIBERS_DROPPED
+from .redis_client import _InMemoryRedis, get_redis
+
+
+class Subscription:
+    """One streaming client: a bounded buffer of pre-serialized events.
+
+    Lives on the event loop that created it. A client whose buffer fills up
+    is dropped rather than slowing down the fanout or growing without bound;
+    it is expected to reconnect and reload.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_buffer: int, service_ids: Optional[Set[int]] = None):
+        self.loop = loop
+        self.service_ids = service_ids
+        self.dropped = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffer)
+
+    def _offer(self, service_id: int, payload: str) -> bool:
+        """Buffer a payload; returns False if this made the client be dropped."""
+        if self.dropped:
+            return True
+        if self.service_ids is not None and service_id not in self.service_ids:
+            return True
+        try:
+            self._queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            self.dropped = True
+            # free the buffer and wake the reader so it ends the stream now
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(None)
+            return False
+
+    async def get(self, timeout: float) -> Optional[str]:
+        """Next payload; "" on timeout, None once the client was dropped."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return ""
+
+
+class BroadcastHub:
+    """Fans check events out to every streaming client in this process.
+
+    ``publish`` may be called from any thread. Each event is serialized once
+    and handed to the subscribers' loops. With ``LIVE_REDIS_FANOUT`` the
+    event goes through a Redis channel instead; every replica with
+    subscribers listens on it, so a client sees checks probed anywhere.
+    The in-memory Redis stand-in has no pub/sub, so with it the fanout is
+    turned off and events stay in this process.
+    """
+
+    def __init__(self, max_buffer: int = None, redis_fanout: bool = None, channel: str = None):
+        self.max_buffer = max_buffer or settings.LIVE_CLIENT_BUFFER
+        self.redis_fanout = settings.LIVE_REDIS_FANOUT if redis_fanout is None else redis_fanout
+        self.channel = channel or settings.LIVE_REDIS_CHANNEL
+        self._subs: dict = {}  # loop -> set of Subscription
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+
+    def subscribe(self, service_ids: Optional[Set[int]] = None) -> Subscription:
+        """Register a client; must be called on the loop that will read it."""
+        loop = asyncio.get_running_loop()
+        sub = Subscription(loop, self.max_buffer, service_ids)
+        with self._lock:
+            self._subs.setdefault(loop, set()).add(sub)
+            LIVE_SUBSCRIBERS.inc()
+        if self._use_redis():
+            self._start_listener()
+        return sub
+
+    def _use_redis(self) -> bool:
+        if self.redis_fanout and isinstance(get_redis(), _InMemoryRedis):
+            with self._lock:
+                if self.redis_fanout:
+                    self.redis_fanout = False
+                    logger.warning("live.redis_fanout_disabled", reason="in-memory redis has no pub/sub")
+        return self.redis_fanout
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._subs.get(sub.loop)
+            if subs and sub in subs:
+                subs.discard(sub)
+                LIVE_SUBSCRIBERS.dec()
+                if not subs:
+                    del self._subs[sub.loop]
+
+    def _fanout(self, subs, service_id: int, payload: str):
+        for sub in subs:
+            if not sub._offer(service_id, payload):
+                LIVE_SUBSCRIBERS_DROPPED.inc()
+                logger.warning("live.subscriber.dropped", buffer=self.max_buffer)
+                self.unsubscribe(sub)
+
+    @property
+    def active(self) -> bool:
+        """Whether a published event could reach any client, here or on another replica."""
+        return self._use_redis() or bool(self._subs)
+
+    def publish_local(self, service_id: int, message: str):
+        """Deliver an already serialized event to this process's clients."""
+        with self._lock:
+            targets = [(loop, list(subs)) for loop, subs in self._subs.items()]
+        if not targets:
+            return
+        payload = f"event: check\ndata: {message}\n\n"
+        for loop, subs in targets:
+            try:
+                loop.call_soon_threadsafe(self._fanout, subs, service_id, payload)
+            except RuntimeError:
+                # loop closed underneath us
+                pass
+
+    def publish(self, service_id: int, event: dict):
+        if not self.active:
+            return
+        message = json.dumps({"service_id": service_id, **event}, default=str)
+        if self.redis_fanout:
+            try:
+                # prefixed with the service ID so listeners need not parse the event
+                get_redis().publish(self.channel, f"{service_id} {message}")
+                return
+            except Exception as exc:
+                logger.warning("live.redis_publish_failed", exc=str(exc))
+        self.publish_local(service_id, message)
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen, name="live-redis-listener", daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for msg in pubsub.listen():
+                    if msg.get("type") == "message":
+                        service_id, _, message = msg["data"].partition(" ")
+                        self.publish_local(int(service_id), message)
+            except Exception as exc:
+                logger.warning("live.redis_listen_failed", exc=str(exc))
+                time.sleep(1.0)
+
+
+live_hub = BroadcastHub()
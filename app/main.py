@@ -1,18 +1,35 @@
-from fastapi import FastAPI, Depends, HTTPException
-from fastapi.responses import PlainTextResponse
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from .database import get_db, engine
-from .models import Base, Service, Check
-from .schemas import ServiceCreate, ServiceRead, CheckRead, DetailedCheckRead, ServiceMetricsSummary
-from .scheduler import start_scheduler, add_service_job, remove_service_job
+from sqlalchemy import desc, func, or_, tuple_
+from .database import SessionFactory, get_async_db, get_read_db, read_engine, run_migrations
+from .models import Service, Check
+from .schemas import FleetSyncResult, ServiceBulk, ServiceCreate, ServiceRead, CheckRead, DetailedCheckRead, ServiceMetricsSummary, LatencyPercentiles, RollupPoint, ServiceSlo, ServiceSloPage, ServiceSummary, ServiceSummaryPage
+from .scheduler import start_scheduler, add_service_job, apply_service_jobs, remove_service_job
+from .aggregator import aggregator
+from .live import live_hub
+from .cache import response_cache, service_scope, services_scope
+from .export import MEDIA_TYPES, export_checks, parquet_available
+from .fleet import apply_fleet, diff_fleet
+from .rollups import rollups, RollupStats, MINUTE, HOUR
+from .slo import SloReport, slo_engine
 from .config import settings
+from .logging_config import logger
+from .metrics import metrics_registry
+from .observability import RequestTimingMiddleware, format_collapsed, sample_stacks
 from datetime import datetime, timedelta
+import asyncio
+import threading
+from typing import Callable, Optional
+from urllib.parse import urlencode
 
 app = FastAPI(title="pulseatlas")
 
+app.add_middleware(RequestTimingMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # In production, use specific origins like ["https://yourdomain.com"]
@@ -25,114 +42,440 @@ app.add_middleware(
 @app.on_event("startup")
 def on_startup():
     try:
-        Base.metadata.create_all(bind=engine)
+        run_migrations()
     except Exception as e:
-        from .logging_config import logger
         logger.warning("startup.db_init_failed", exc=str(e), msg="DB not available at startup; will try on first request")
     
     from .logging_config import configure_logging
 
     configure_logging()
 
+    if not settings.API_RUN_SCHEDULER:
+        threading.Thread(target=_slo_refresh_loop, name="slo-refresh", daemon=True).start()
+        return
     try:
         start_scheduler()
     except Exception as e:
-        from .logging_config import logger
         logger.warning("startup.scheduler_failed", exc=str(e), msg="Scheduler failed to start")
 
 
+@app.on_event("shutdown")
+def on_shutdown():
+    _slo_refresh_stop.set()
+
+
+async def _cached_response(request: Request, scope: str, db: AsyncSession,
+                           compute: Callable[[Session], object]) -> Response:
+    """Serve a JSON response through the response cache, with ETag / 304 support.
+
+    On a miss ``compute`` runs with a synchronous view of ``db``.
+    """
+    key = f"{request.url.path}?{urlencode(sorted(request.query_params.multi_items()))}"
+    etag, body = await response_cache.aget_or_compute(scope, key, lambda: db.run_sync(compute))
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.get("/metrics")
 def metrics():
-    data = generate_latest()
+    data = generate_latest(metrics_registry())
     return PlainTextResponse(content=data, media_type=CONTENT_TYPE_LATEST)
 
 
+@app.get("/admin/profile", response_class=PlainTextResponse)
+def admin_profile(
+    seconds: float = Query(10.0, gt=0, le=120),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    limit: Optional[int] = Query(None, ge=1),
+    x_admin_token: Optional[str] = Header(None),
+):
+    """Sample every thread's stack for ``seconds`` and return the hottest ones
+    as collapsed stacks (flamegraph.pl / speedscope input)."""
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="profiler disabled")
+    if settings.ADMIN_TOKEN and x_admin_token != settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="invalid admin token")
+    counts = sample_stacks(seconds, interval_ms / 1000.0)
+    if counts is None:
+        raise HTTPException(status_code=409, detail="a profile is already running")
+    return PlainTextResponse(format_collapsed(counts, limit))
+
+
 @app.post("/services", response_model=ServiceRead)
-def create_service(payload: ServiceCreate, db: Session = Depends(get_db)):
-    s = Service(name=payload.name, url=str(payload.url), interval_seconds=payload.interval_seconds, timeout_seconds=payload.timeout_seconds)
+async def create_service(payload: ServiceCreate, db: AsyncSession = Depends(get_async_db)):
+    s = Service(**payload.model_dump(exclude={"url"}), url=str(payload.url))
     db.add(s)
-    db.commit()
-    db.refresh(s)
-    # create a scheduler job for it
-    add_service_job(s)
+    await db.commit()
+    await db.refresh(s)
+    # create a scheduler job for it; app.worker picks it up on its next sync
+    if settings.API_RUN_SCHEDULER:
+        add_service_job(s)
+    response_cache.invalidate_services([s.id], listing=True)
     return s
 
 
+@app.post("/services/bulk", response_model=FleetSyncResult)
+async def bulk_services(payload: ServiceBulk, db: AsyncSession = Depends(get_async_db)):
+    """Create or update many services, matched by name, in batched transactions.
+
+    With ``prune`` the services not listed are deleted, so the request is a
+    full fleet sync; ``dry_run`` only reports what would change.
+    """
+    fleet = await db.run_sync(diff_fleet, payload.services, payload.prune)
+    if not payload.dry_run:
+        changed = await db.run_sync(apply_fleet, fleet)
+        if settings.API_RUN_SCHEDULER:
+            apply_service_jobs(changed, fleet.deletes)
+        for service_id in fleet.deletes:
+            aggregator.remove(service_id)
+            rollups.remove(service_id)
+        response_cache.invalidate_services([s.id for s in changed] + fleet.deletes, listing=True)
+    return FleetSyncResult(
+        created=len(fleet.creates), updated=len(fleet.updates), deleted=len(fleet.deletes),
+        unchanged=fleet.unchanged, dry_run=payload.dry_run,
+    )
+
+
+@app.get("/services/latency-percentiles", response_model=LatencyPercentiles)
+async def get_latency_percentiles(
+    service_id: list[int] = Query(...),
+    window_minutes: int = Query(60, ge=1, le=60 * 24 * 90),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Latency percentiles over any window for one service or a group of services,
+    merged from the rollup sketches"""
+    since = datetime.utcnow() - timedelta(minutes=window_minutes)
+    sketch = (await db.run_sync(rollups.query, service_id, since)).sketch
+    return LatencyPercentiles(
+        service_ids=service_id,
+        window_minutes=window_minutes,
+        count=sketch.count,
+        p50_ms=sketch.quantile(0.50),
+        p95_ms=sketch.quantile(0.95),
+        p99_ms=sketch.quantile(0.99),
+    )
+
+
+def _latest_check_column(db: Session, column):
+    # correlated per-service lookup, served by ix_checks_service_id_timestamp
+    return (
+        db.query(column)
+        .filter(Check.service_id == Service.id)
+        .order_by(Check.timestamp.desc())
+        .limit(1)
+        .correlate(Service)
+        .scalar_subquery()
+    )
+
+
+@app.get("/services/summary", response_model=ServiceSummaryPage)
+async def get_services_summary(
+    status: Optional[str] = Query(None, description="current status: ok, warn, error, down or unknown"),
+    name: Optional[str] = Query(None, description="case-insensitive substring of the service name"),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Metrics summaries (last 24h) for all services, or a filtered page of them.
+
+    A fixed number of queries per page: the page of services with their
+    latest check, then one rollup read for the whole page. Merging the
+    sketches and building the page runs in a worker thread, off the loop.
+    """
+    total, page, parts = await db.run_sync(_services_summary_rows, status, name, limit, offset)
+    return await asyncio.to_thread(_services_summary_page, total, page, parts, limit, offset)
+
+
+_SUMMARY_WINDOW_MINUTES = 24 * 60
+
+
+def _services_summary_rows(db: Session, status: Optional[str], name: Optional[str], limit: int,
+                           offset: int) -> tuple:
+    latest_status = func.coalesce(_latest_check_column(db, Check.status), "unknown")
+    q = db.query(Service, latest_status, _latest_check_column(db, Check.timestamp))
+    if status:
+        q = q.filter(latest_status == status)
+    if name:
+        q = q.filter(Service.name.ilike(f"%{name}%"))
+    total = q.order_by(None).count()
+    page = q.order_by(Service.id).limit(limit).offset(offset).all()
+    parts = rollups.fetch_by_service(
+        db, [service.id for service, _, _ in page], datetime.utcnow() - timedelta(minutes=_SUMMARY_WINDOW_MINUTES)
+    )
+    return total, page, parts
+
+
+def _services_summary_page(total: int, page: list, parts: list, limit: int, offset: int) -> ServiceSummaryPage:
+    stats_by_service = rollups.merge_by_service(parts)
+    items = []
+    for service, current_status, last_timestamp in page:
+        stats = stats_by_service.get(service.id)
+        items.append(ServiceSummary(
+            **ServiceRead.model_validate(service).model_dump(),
+            metrics=_metrics_summary(service, stats, current_status, last_timestamp,
+                                     _SUMMARY_WINDOW_MINUTES) if stats else None,
+        ))
+    return ServiceSummaryPage(total=total, limit=limit, offset=offset, items=items)
+
+
+_slo_refresh_lock = threading.Lock()
+_slo_refresh_stop = threading.Event()
+
+
+def _refresh_slo_report():
+    # probes run in app.worker: recount from the rollups it writes
+    if not _slo_refresh_lock.acquire(blocking=False):
+        return
+    try:
+        db = SessionFactory()
+        try:
+            services = db.query(Service).filter(
+                or_(Service.slo_availability_target.isnot(None), Service.slo_latency_target.isnot(None))
+            ).all()
+            slo_engine.remove(set(slo_engine.service_ids) - {s.id for s in services})
+            slo_engine.rebuild(db, services)
+        finally:
+            db.close()
+        slo_engine.evaluate()
+    except Exception:
+        logger.exception("slo.refresh_failed")
+    finally:
+        _slo_refresh_lock.release()
+
+
+def _slo_refresh_loop():
+    while not _slo_refresh_stop.is_set():
+        _refresh_slo_report()
+        _slo_refresh_stop.wait(settings.SLO_EVALUATION_SECONDS)
+
+
+def _slo_report() -> SloReport:
+    """The SLO engine's latest report.
+
+    The scheduler re-evaluates it every SLO_EVALUATION_SECONDS; without one
+    in this process a background thread rebuilds it from the rollups.
+    """
+    report = slo_engine.report
+    if report is None:
+        raise HTTPException(status_code=503, detail="SLO report not computed yet")
+    return report
+
+
+@app.get("/services/slo", response_model=ServiceSloPage)
+async def get_services_slo(
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    """Error budgets and burn rates of the services with an SLO, least budget left first"""
+    report = _slo_report()
+    order = report.worst_first()
+    return ServiceSloPage(total=len(order), items=[report.service(i) for i in order[offset:offset + limit]])
+
+
+@app.get("/services/{service_id}/slo", response_model=ServiceSlo)
+async def get_service_slo(service_id: int):
+    """Error budget left and burn rate per window for each of a service's SLOs"""
+    report = _slo_report()
+    i = report.position(service_id)
+    if i is None:
+        raise HTTPException(status_code=404, detail="service not found or has no SLO")
+    return report.service(i)
+
+
+@app.get("/services/stream")
+async def stream_checks(request: Request, service_id: Optional[list[int]] = Query(None)):
+    """Server-Sent Events stream of new checks, each with the service's
+    sliding-window metrics up to that check. Optionally limited to some services."""
+    sub = live_hub.subscribe(set(service_id) if service_id else None)
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                payload = await sub.get(settings.LIVE_KEEPALIVE_SECONDS)
+                if payload is None or await request.is_disconnected():
+                    break
+                yield payload or ": keepalive\n\n"
+        finally:
+            live_hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/services", response_model=list[ServiceRead])
-def list_services(db: Session = Depends(get_db)):
-    return db.query(Service).all()
+async def list_services(request: Request, db: AsyncSession = Depends(get_read_db)):
+    return await _cached_response(request, services_scope(), db, lambda s: [
+        ServiceRead.model_validate(service) for service in s.query(Service).all()
+    ])
+
+
+def _recent_checks(db: Session, service_id: int, limit: int, before_timestamp: Optional[datetime],
+                   before_id: Optional[int]):
+    """Newest-first page of checks; pass the last row's timestamp and id to get the next page."""
+    q = db.query(Check).filter(Check.service_id == service_id)
+    if before_timestamp is not None:
+        if before_id is not None:
+            q = q.filter(tuple_(Check.timestamp, Check.id) < tuple_(before_timestamp, before_id))
+        else:
+            q = q.filter(Check.timestamp < before_timestamp)
+    return q.order_by(Check.timestamp.desc(), Check.id.desc()).limit(limit)
 
 
 @app.get("/services/{service_id}/checks", response_model=list[CheckRead])
-def list_checks(service_id: int, limit: int = 50, db: Session = Depends(get_db)):
-    return db.query(Check).filter(Check.service_id == service_id).order_by(Check.timestamp.desc()).limit(limit).all()
+async def list_checks(
+    request: Request,
+    service_id: int,
+    limit: int = Query(50, ge=1, le=1000),
+    before_timestamp: Optional[datetime] = Query(None, description="keyset cursor: timestamp of the last row seen"),
+    before_id: Optional[int] = Query(None, description="keyset cursor: id of the last row seen"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    return await _cached_response(request, service_scope(service_id), db, lambda s: [
+        CheckRead.model_validate(c) for c in _recent_checks(s, service_id, limit, before_timestamp, before_id)
+    ])
 
 
 @app.get("/services/{service_id}/checks-detailed", response_model=list[DetailedCheckRead])
-def list_checks_detailed(service_id: int, limit: int = 10, db: Session = Depends(get_db)):
+async def list_checks_detailed(
+    request: Request,
+    service_id: int,
+    limit: int = Query(10, ge=1, le=1000),
+    before_timestamp: Optional[datetime] = Query(None, description="keyset cursor: timestamp of the last row seen"),
+    before_id: Optional[int] = Query(None, description="keyset cursor: id of the last row seen"),
+    db: AsyncSession = Depends(get_read_db),
+):
     """Get detailed SRE metrics for recent checks"""
-    return db.query(Check).filter(Check.service_id == service_id).order_by(Check.timestamp.desc()).limit(limit).all()
+    return await _cached_response(request, service_scope(service_id), db, lambda s: [
+        DetailedCheckRead.model_validate(c)
+        for c in _recent_checks(s, service_id, limit, before_timestamp, before_id)
+    ])
+
+
+@app.get("/services/{service_id}/checks/export")
+async def export_service_checks(
+    service_id: int,
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Stream a service's check history, oldest first, as NDJSON, CSV or Parquet.
+
+    Rows are read from a server-side cursor and encoded chunk by chunk, so
+    memory use does not depend on how many rows are exported.
+    """
+    if await db.get(Service, service_id) is None:
+        raise HTTPException(status_code=404, detail="service not found")
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="parquet export requires pyarrow")
+    # the stream outlives this request's session, so it takes its own connection
+    body = export_checks(read_engine, service_id, format, since, until, settings.EXPORT_CHUNK_ROWS)
+    return StreamingResponse(body, media_type=MEDIA_TYPES[format], headers={
+        "Content-Disposition": f'attachment; filename="service-{service_id}-checks.{format}"',
+    })
+
+
+def _metrics_summary(service: Service, stats: RollupStats, current_status: Optional[str],
+                     last_check_timestamp: Optional[datetime], window_minutes: int) -> ServiceMetricsSummary:
+    request_rate = stats.count / window_minutes
+    return ServiceMetricsSummary(
+        service_id=service.id,
+        service_name=service.name,
+        current_status=current_status or "unknown",
+        avg_response_time_ms=stats.avg_response_time_ms or 0.0,
+        p95_response_time_ms=stats.sketch.quantile(0.95) or 0.0,
+        p99_response_time_ms=stats.sketch.quantile(0.99) or 0.0,
+        error_rate_percent=stats.error_rate_percent or 0.0,
+        uptime_percent_24h=stats.uptime_percent or 0.0,
+        request_rate_rpm=request_rate,
+        throughput_rps=request_rate / 60,
+        apdex_score=stats.apdex_score or 0.0,
+        checks_count=stats.count,
+        last_check_timestamp=last_check_timestamp or datetime.utcnow(),
+        phase_avg_ms=stats.phase_totals.means_ms(),
+    )
 
 
 @app.get("/services/{service_id}/metrics-summary", response_model=ServiceMetricsSummary)
-def get_service_metrics_summary(service_id: int, db: Session = Depends(get_db)):
-    """Get aggregated SRE metrics for a service (last 24h)"""
+async def get_service_metrics_summary(request: Request, service_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Get aggregated SRE metrics for a service (last 24h), read from the rollups"""
+    return await _cached_response(request, service_scope(service_id), db, lambda s: _service_metrics_summary(s, service_id))
+
+
+def _service_metrics_summary(db: Session, service_id: int) -> ServiceMetricsSummary:
     service = db.query(Service).filter(Service.id == service_id).first()
     if not service:
         raise HTTPException(status_code=404, detail="service not found")
-    
-    cutoff_time = datetime.utcnow() - timedelta(hours=24)
-    checks = db.query(Check).filter(
-        Check.service_id == service_id,
-        Check.timestamp >= cutoff_time
-    ).all()
-    
-    if not checks:
+
+    window_minutes = 24 * 60
+    stats = rollups.query(db, [service_id], datetime.utcnow() - timedelta(minutes=window_minutes))
+    if not stats.count:
         raise HTTPException(status_code=404, detail="no check data available")
-    
-    # Use latest check for aggregated metrics
+
     latest_check = db.query(Check).filter(
         Check.service_id == service_id
     ).order_by(desc(Check.timestamp)).first()
-    
-    response_times = [c.response_time_ms for c in checks if c.response_time_ms is not None]
-    avg_response = sum(response_times) / len(response_times) if response_times else 0.0
-    
-    successful = sum(1 for c in checks if c.status == "ok")
-    total = len(checks)
-    
-    # Extract metric values with defaults
-    p95 = float(latest_check.latency_p95_ms) if latest_check and latest_check.latency_p95_ms else 0.0
-    p99 = float(latest_check.latency_p99_ms) if latest_check and latest_check.latency_p99_ms else 0.0
-    error_rate = float(latest_check.error_rate_percent) if latest_check and latest_check.error_rate_percent else 0.0
-    uptime = float(latest_check.uptime_percent) if latest_check and latest_check.uptime_percent else 0.0
-    req_rate = float(latest_check.request_rate_rpm) if latest_check and latest_check.request_rate_rpm else 0.0
-    tps = float(latest_check.throughput_rps) if latest_check and latest_check.throughput_rps else 0.0
-    apdex = float(latest_check.apdex_score) if latest_check and latest_check.apdex_score else 0.0
-    
-    return ServiceMetricsSummary(
-        service_id=service_id,
-        service_name=service.name,
-        current_status=latest_check.status if latest_check else "unknown",
-        avg_response_time_ms=float(avg_response),
-        p95_response_time_ms=p95,
-        p99_response_time_ms=p99,
-        error_rate_percent=error_rate,
-        uptime_percent_24h=uptime,
-        request_rate_rpm=req_rate,
-        throughput_rps=tps,
-        apdex_score=apdex,
-        checks_count=total,
-        last_check_timestamp=latest_check.timestamp if latest_check else datetime.utcnow(),
+    return _metrics_summary(
+        service, stats,
+        latest_check.status if latest_check else None,
+        latest_check.timestamp if latest_check else None,
+        window_minutes,
     )
 
 
+@app.get("/services/{service_id}/rollups", response_model=list[RollupPoint])
+async def get_service_rollups(
+    service_id: int,
+    window_minutes: int = Query(24 * 60, ge=1, le=60 * 24 * 400),
+    resolution: str = Query("auto", pattern="^(auto|1m|1h)$"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Per-minute or per-hour check statistics for a service over a window"""
+    if resolution == "auto":
+        resolution = "1m" if window_minutes <= 6 * 60 else "1h"
+    since = datetime.utcnow() - timedelta(minutes=window_minutes)
+    points = await db.run_sync(rollups.series, service_id, MINUTE if resolution == "1m" else HOUR, since)
+    return [
+        RollupPoint(
+            bucket_start=bucket_start,
+            resolution=resolution,
+            count=stats.count,
+            ok_count=stats.ok_count,
+            warn_count=stats.warn_count,
+            error_count=stats.error_count,
+            down_count=stats.down_count,
+            avg_response_time_ms=stats.avg_response_time_ms,
+            min_response_time_ms=stats.latency_min_ms,
+            max_response_time_ms=stats.latency_max_ms,
+            p50_response_time_ms=stats.sketch.quantile(0.50),
+            p95_response_time_ms=stats.sketch.quantile(0.95),
+            p99_response_time_ms=stats.sketch.quantile(0.99),
+            apdex_score=stats.apdex_score,
+            phase_avg_ms=stats.phase_totals.means_ms(),
+        )
+        for bucket_start, stats in points
+    ]
+
+
 @app.delete("/services/{service_id}")
-def delete_service(service_id: int, db: Session = Depends(get_db)):
-    s = db.query(Service).filter(Service.id == service_id).first()
+async def delete_service(service_id: int, db: AsyncSession = Depends(get_async_db)):
+    s = await db.get(Service, service_id)
     if not s:
         raise HTTPException(status_code=404, detail="service not found")
-    remove_service_job(service_id)
-    db.delete(s)
-    db.commit()
+    if settings.API_RUN_SCHEDULER:
+        remove_service_job(service_id)
+    await db.delete(s)
+    await db.commit()
+    aggregator.remove(service_id)
+    rollups.remove(service_id)
+    response_cache.invalidate_services([service_id], listing=True)
     return {"ok": True}
@@ -1,10 +1,119 @@
-from prometheus_client import Counter, Histogram
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess
 from typing import Optional
 
+# Gauges declare how to combine per-process values when several processes
+# (uvicorn workers, app.worker shards) share PROMETHEUS_MULTIPROC_DIR.
+
 CHECKS_TOTAL = Counter("health_checks_total", "Total health check attempts", ["service", "status"])
 CHECK_RESPONSE_TIME = Histogram("health_check_response_time_seconds", "Response time for health checks (s)", ["service"])
+CHECK_PHASE_TIME = Histogram(
+    "health_check_phase_seconds", "Time per probe phase (dns, connect, tls, ttfb, transfer) (s)", ["service", "phase"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+CHECK_WRITE_BATCH_SIZE = Histogram(
+    "pulseatlas_check_write_batch_size", "Rows per Check insert batch",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+CHECK_WRITE_FLUSH_SECONDS = Histogram("pulseatlas_check_write_flush_seconds", "Time to insert and commit one Check batch (s)")
+CHECK_WRITE_QUEUE_DEPTH = Gauge("pulseatlas_check_write_queue_depth", "Check rows waiting to be written", multiprocess_mode="livesum")
+CHECK_WRITE_DROPPED = Counter(
+    "pulseatlas_check_write_dropped_total", "Check rows never written, by reason (queue_full, no_partition, rejected, lost)",
+    ["reason"],
+)
+SCHEDULER_NODES = Gauge("pulseatlas_scheduler_nodes", "Live scheduler nodes seen by this node", multiprocess_mode="max")
+SCHEDULER_SHARDS_OWNED = Gauge("pulseatlas_scheduler_shards_owned", "Service shards this scheduler node holds a lease on", multiprocess_mode="livesum")
+SCHEDULER_LAG_SECONDS = Histogram(
+    "pulseatlas_scheduler_lag_seconds", "Delay between a probe's planned and actual dispatch time",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+SERVICE_PROBE_INTERVAL = Gauge(
+    "pulseatlas_service_probe_interval_seconds", "Probe interval currently in effect (adaptive or fixed)", ["service"],
+    multiprocess_mode="livemax",
+)
+PROBE_BUDGET_SKIPPED = Counter(
+    "pulseatlas_probe_budget_skipped_total", "Due probes skipped because the global probe budget was spent",
+)
+SLO_ERROR_BUDGET_REMAINING = Gauge(
+    "pulseatlas_slo_error_budget_remaining_ratio", "Fraction of the SLO period's error budget left (negative once overspent)",
+    ["service", "objective"], multiprocess_mode="livemax",
+)
+SLO_BURN_RATE = Gauge(
+    "pulseatlas_slo_burn_rate", "Error budget burn rate over a window, as a multiple of the sustainable rate",
+    ["service", "objective", "window"], multiprocess_mode="livemax",
+)
+SCHEDULER_WHEEL_ENTRIES = Gauge("pulseatlas_scheduler_wheel_entries", "Services registered in the probe timing wheel", multiprocess_mode="livesum")
+RESPONSE_CACHE_REQUESTS = Counter("pulseatlas_response_cache_requests_total", "Response cache lookups by result", ["result"])
+ALERT_MESSAGES = Counter("pulseatlas_alert_messages_total", "Alert webhook messages by outcome", ["outcome"])
+ALERTS_DROPPED = Counter("pulseatlas_alerts_dropped_total", "Alerts dropped because the dispatch queue was full")
+LIVE_SUBSCRIBERS = Gauge("pulseatlas_live_subscribers", "Connected live check stream clients", multiprocess_mode="livesum")
+LIVE_SUBSCRIBERS_DROPPED = Counter("pulseatlas_live_subscribers_dropped_total", "Live stream clients dropped for falling behind")
+KAFKA_EVENTS = Counter("pulseatlas_kafka_events_total", "Kafka events by outcome (queued, sent, spooled, dropped)", ["outcome"])
+
+# PulseAtlas's own pipeline, as opposed to the targets it probes
+PIPELINE_STAGE_SECONDS = Histogram(
+    "pulseatlas_pipeline_stage_seconds", "Time spent in each stage of the probe pipeline", ["stage"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+PROBES_COALESCED = Counter(
+    "pulseatlas_probes_coalesced_total", "Probe requests answered by an identical probe already in flight",
+)
+PROBES_PENDING = Gauge(
+    "pulseatlas_probes_pending", "Probes dispatched and not yet finished (waiting for a slot or in flight)",
+    multiprocess_mode="livesum",
+)
+RECORDS_PENDING = Gauge(
+    "pulseatlas_records_pending", "Finished probes waiting for or in the record step", multiprocess_mode="livesum",
+)
+SCHEDULER_MISFIRES = Counter(
+    "pulseatlas_scheduler_misfires_total", "Probe runs skipped because the scheduler fell a whole interval behind, "
+    "and maintenance jobs that missed their run time", ["source"],
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "pulseatlas_db_pool_checkout_seconds", "Wait to check a connection out of the DB pool", ["pool"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_POOL_IN_USE = Gauge("pulseatlas_db_pool_in_use", "DB connections checked out of the pool", ["pool"], multiprocess_mode="livesum")
+API_REQUEST_SECONDS = Histogram(
+    "pulseatlas_api_request_seconds", "API latency to the response start, by route template", ["method", "route", "status"],
+)
+
+_STAGES = {}
+
+
+def observe_stage(stage: str, seconds: float):
+    child = _STAGES.get(stage)
+    if child is None:
+        child = _STAGES[stage] = PIPELINE_STAGE_SECONDS.labels(stage=stage)
+    child.observe(seconds)
+
+
+@contextmanager
+def time_stage(stage: str):
+    """Observe the duration of the ``with`` block as pipeline ``stage``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def metrics_registry():
+    """Registry to expose: aggregated across processes in multiprocess mode."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
 
-def observe_check(service_name: str, status: str, response_time_s: Optional[float]):
+def observe_check(service_name: str, status: str, response_time_s: Optional[float], phases_ms: Optional[dict] = None):
     CHECKS_TOTAL.labels(service=service_name, status=status).inc()
     if response_time_s is not None:
         CHECK_RESPONSE_TIME.labels(service=service_name).observe(response_time_s)
+    for phase, ms in (phases_ms or {}).items():
+        if ms is not None:
+            CHECK_PHASE_TIME.labels(service=service_name, phase=phase).observe(ms / 1000.0)
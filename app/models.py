@@ -1,7 +1,10 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Boolean, Column, Integer, String, Text, DateTime, ForeignKey, Float, LargeBinary, Index, false
+from sqlalchemy.ext.declarative import declarative_base, declared_attr
 from sqlalchemy.sql import func
 
+from .config import settings
+from .phases import unpack_phases
+
 Base = declarative_base()
 
 
@@ -14,16 +17,37 @@ class Service(Base):
     interval_seconds = Column(Integer, nullable=False, default=60)
     timeout_seconds = Column(Integer, nullable=False, default=10)
 
+    # Adaptive probing: the interval moves between min and max with the results
+    adaptive = Column(Boolean, nullable=False, default=False, server_default=false())
+    min_interval_seconds = Column(Integer, nullable=True)
+    max_interval_seconds = Column(Integer, nullable=True)
+    priority = Column(Integer, nullable=False, default=0, server_default="0")   # higher wins under the probe budget
+    current_interval_seconds = Column(Float, nullable=True)   # adaptive interval in effect, kept by the scheduler
+
+    # SLOs, in percent of checks: not failed, and (latency) not failed nor slower than the threshold
+    slo_availability_target = Column(Float, nullable=True)
+    slo_latency_threshold_ms = Column(Float, nullable=True)
+    slo_latency_target = Column(Float, nullable=True)
+
+    @property
+    def effective_interval_seconds(self) -> float:
+        if self.adaptive and self.current_interval_seconds:
+            return self.current_interval_seconds
+        return float(max(settings.SCHEDULER_MIN_INTERVAL_SECONDS, self.interval_seconds or 0))
+
 
 class Check(Base):
+    # On Postgres this table is range-partitioned by day on timestamp with a
+    # (id, timestamp) primary key; see migrations/versions/0001_initial_schema.py.
     __tablename__ = "checks"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     service_id = Column(Integer, ForeignKey("services.id", ondelete="CASCADE"), nullable=False)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     status = Column(String(32), nullable=False)
     response_time_ms = Column(Float, nullable=True)
     error = Column(Text, nullable=True)
+    phase_timings = Column(LargeBinary, nullable=True)   # DNS/connect/TLS/TTFB/transfer, packed by app.phases
     
     # SRE Metrics
     latency_p50_ms = Column(Float, nullable=True)        # Median response time
@@ -34,3 +58,42 @@ class Check(Base):
     uptime_percent = Column(Float, nullable=True)        # Uptime % (rolling 24h)
     throughput_rps = Column(Float, nullable=True)        # Requests per second
     apdex_score = Column(Float, nullable=True)           # Application Performance Index (0-1)
+
+    @property
+    def phase_timings_ms(self):
+        return unpack_phases(self.phase_timings)
+
+
+# Every hot read filters on service_id and a timestamp range, newest first.
+Index("ix_checks_service_id_timestamp", Check.service_id, Check.timestamp.desc())
+
+
+class _CheckRollup:
+    """Per-service check counters and latency sketch for one time bucket."""
+
+    @declared_attr
+    def service_id(cls):
+        return Column(Integer, ForeignKey("services.id", ondelete="CASCADE"), primary_key=True)
+
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    ok_count = Column(Integer, nullable=False, default=0)
+    warn_count = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)
+    down_count = Column(Integer, nullable=False, default=0)
+    latency_count = Column(Integer, nullable=False, default=0)    # checks with a response time
+    latency_sum_ms = Column(Float, nullable=False, default=0.0)
+    latency_min_ms = Column(Float, nullable=True)
+    latency_max_ms = Column(Float, nullable=True)
+    apdex_satisfied = Column(Integer, nullable=False, default=0)
+    apdex_tolerating = Column(Integer, nullable=False, default=0)
+    sketch = Column(LargeBinary, nullable=True)                   # DDSketch of OK response times
+    phase_totals = Column(LargeBinary, nullable=True)             # per-phase timing sums/counts, see app.phases
+
+
+class CheckRollupMinute(_CheckRollup, Base):
+    __tablename__ = "check_rollups_1m"
+
+
+class CheckRollupHour(_CheckRollup, Base):
+    __tablename__ = "check_rollups_1h"
@@ -0,0 +1,119 @@
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metrics import API_REQUEST_SECONDS, DB_POOL_CHECKOUT_SECONDS, DB_POOL_IN_USE
+
+
+def timed_pool(base: type, name: str) -> type:
+    """Subclass of pool class ``base`` that records how long each checkout of
+    pool ``name`` waited (including connect)."""
+    observed = DB_POOL_CHECKOUT_SECONDS.labels(pool=name)
+
+    class TimedPool(base):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                observed.observe(time.perf_counter() - start)
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+def instrument_engine(engine: Engine, name: str):
+    """Track checked-out connections of pool ``name``, for any pool class."""
+    in_use = DB_POOL_IN_USE.labels(pool=name)
+    event.listen(engine, "checkout", lambda *_: in_use.inc())
+    event.listen(engine, "checkin", lambda *_: in_use.dec())
+
+
+class RequestTimingMiddleware:
+    """Observes API latency per route template, up to the start of the response.
+
+    Pure ASGI rather than BaseHTTPMiddleware so streaming responses (SSE,
+    exports) pass through untouched; for those the time to first byte is
+    what gets recorded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        observed = False
+
+        def observe(status: int):
+            nonlocal observed
+            observed = True
+            route = scope.get("route")
+            API_REQUEST_SECONDS.labels(
+                method=scope["method"],
+                # unmatched paths share one label so scans can't blow up cardinality
+                route=getattr(route, "path", "unmatched"),
+                status=str(status),
+            ).observe(time.perf_counter() - start)
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start" and not observed:
+                observe(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        except Exception:
+            if not observed:
+                observe(500)
+            raise
+
+
+_profile_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}.{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})"
+
+
+def sample_stacks(seconds: float, interval: float) -> Optional[Counter]:
+    """Sample every thread's stack for ``seconds``; None if a profile is already running.
+
+    Returns collapsed stacks ("thread;outer;...;inner") with the number of
+    samples each was seen in.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        me = threading.get_ident()
+        counts: Counter = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                counts[";".join(reversed(stack))] += 1
+            time.sleep(interval)
+        return counts
+    finally:
+        _profile_lock.release()
+
+
+def format_collapsed(counts: Counter, limit: int = None) -> str:
+    """Folded-stack text (flamegraph.pl / speedscope), most frequent first."""
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common(limit))
@@ -0,0 +1,94 @@
+"""Probe phase timings (DNS, connect, TLS, TTFB, transfer) and their compact encodings.
+
+A check stores its phases as one small binary value rather than a column
+per phase: a version byte followed by one little-endian uint32 of
+microseconds per phase, with 0xFFFFFFFF for a phase that did not happen
+(DNS, connect and TLS only happen when a probe opens a new connection).
+Rollups store per-phase sums and counts the same way, so means merge
+across buckets.
+"""
+import struct
+from typing import Optional
+
+PHASES = ("dns", "connect", "tls", "ttfb", "transfer")
+PHASE_COLUMNS = tuple(f"{phase}_ms" for phase in PHASES)
+
+_VERSION = 1
+_ABSENT = 0xFFFFFFFF
+_TIMINGS = struct.Struct(f"<B{len(PHASES)}I")
+_TOTALS = struct.Struct(f"<B{len(PHASES)}d{len(PHASES)}Q")
+
+
+def pack_phases(phases_ms: Optional[dict]) -> Optional[bytes]:
+    """Encode {phase: ms} (missing phases allowed) as 21 bytes; None stays None."""
+    if not phases_ms:
+        return None
+    values = []
+    for phase in PHASES:
+        ms = phases_ms.get(phase)
+        values.append(_ABSENT if ms is None else min(int(round(max(ms, 0.0) * 1000)), _ABSENT - 1))
+    return _TIMINGS.pack(_VERSION, *values)
+
+
+def phase_values(data: Optional[bytes]) -> tuple:
+    """Decode packed timings to ms per phase, in PHASES order (None if absent)."""
+    if not data:
+        return (None,) * len(PHASES)
+    version, *values = _TIMINGS.unpack(bytes(data))
+    if version != _VERSION:
+        raise ValueError(f"unsupported phase timings version {version}")
+    return tuple(None if v == _ABSENT else v / 1000.0 for v in values)
+
+
+def unpack_phases(data: Optional[bytes]) -> Optional[dict]:
+    """Decode packed timings to {phase: ms or None}; None if nothing was recorded."""
+    if not data:
+        return None
+    return dict(zip(PHASES, phase_values(data)))
+
+
+class PhaseTotals:
+    """Per-phase sum and count of timings, mergeable like the rest of a rollup."""
+
+    def __init__(self):
+        self.sums_ms = [0.0] * len(PHASES)
+        self.counts = [0] * len(PHASES)
+
+    def add(self, phases_ms: Optional[dict]):
+        if not phases_ms:
+            return
+        for i, phase in enumerate(PHASES):
+            ms = phases_ms.get(phase)
+            if ms is not None:
+                self.sums_ms[i] += ms
+                self.counts[i] += 1
+
+    def merge(self, other: "PhaseTotals"):
+        for i in range(len(PHASES)):
+            self.sums_ms[i] += other.sums_ms[i]
+            self.counts[i] += other.counts[i]
+
+    def means_ms(self) -> Optional[dict]:
+        """Mean ms per phase over the checks that had it; None if no check had any."""
+        if not any(self.counts):
+            return None
+        return {
+            phase: self.sums_ms[i] / self.counts[i] if self.counts[i] else None
+            for i, phase in enumerate(PHASES)
+        }
+
+    def to_bytes(self) -> Optional[bytes]:
+        if not any(self.counts):
+            return None
+        return _TOTALS.pack(_VERSION, *self.sums_ms, *self.counts)
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> "PhaseTotals":
+        totals = cls()
+        if data:
+            version, *values = _TOTALS.unpack(bytes(data))
+            if version != _VERSION:
+                raise ValueError(f"unsupported phase totals version {version}")
+            totals.sums_ms = list(values[:len(PHASES)])
+            totals.counts = list(values[len(PHASES):])
+        return totals
@@ -0,0 +1,317 @@
+import asyncio
+import socket
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlsplit
+
+import anyio
+import httpcore
+import httpx
+
+from .config import settings
+from .logging_config import logger
+from .metrics import PROBES_COALESCED, observe_stage
+
+
+@dataclass
+class ProbeResult:
+    status: str
+    response_time_ms: Optional[float]
+    error: Optional[str] = None
+    status_code: Optional[int] = None
+    phases: Optional[dict] = None  # ms per phase of app.phases.PHASES that happened
+
+
+def classify_status(status_code: int) -> str:
+    """Map an HTTP status code to a check status (ok/warn/error)."""
+    if status_code >= 500:
+        return "error"
+    if status_code >= 400:
+        return "warn"
+    return "ok"
+
+
+class _PhaseTimer:
+    """Collects one probe's phase timings in ms.
+
+    DNS and connect come from ``_TimedNetworkBackend``; TLS, time to first
+    byte (request sent to response headers) and transfer (response body)
+    from httpcore trace events. Across redirects the phases add up.
+    """
+
+    def __init__(self):
+        self.phases: dict = {}
+        self._started: dict = {}
+        self._request_sent: Optional[float] = None
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds * 1000.0
+
+    async def trace(self, event_name: str, info: dict):
+        now = time.perf_counter()
+        step, _, edge = event_name.rpartition(".")
+        step = step.rpartition(".")[2]  # drop the "connection." / "http11." / "http2." prefix
+        if edge == "started":
+            self._started[step] = now
+        elif edge != "complete":
+            return
+        elif step == "start_tls":
+            self.add("tls", now - self._started.pop(step, now))
+        elif step == "send_request_body":
+            self._request_sent = now
+        elif step == "receive_response_headers" and self._request_sent is not None:
+            self.add("ttfb", now - self._request_sent)
+            self._request_sent = None
+        elif step == "receive_response_body":
+            self.add("transfer", now - self._started.pop(step, now))
+
+
+_current_timer: ContextVar[Optional[_PhaseTimer]] = ContextVar("probe_phase_timer", default=None)
+
+
+class _TimedNetworkBackend(httpcore.AsyncNetworkBackend):
+    """Resolves the host, then connects to each address in turn, timing both steps."""
+
+    def __init__(self):
+        self._backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None,
+                          local_address: Optional[str] = None, socket_options=None):
+        start = time.perf_counter()
+        try:
+            with anyio.fail_after(timeout):
+                addresses = await anyio.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except TimeoutError as exc:
+            raise httpcore.ConnectTimeout(f"DNS lookup for {host} timed out") from exc
+        except OSError as exc:
+            raise httpcore.ConnectError(str(exc)) from exc
+        resolved = time.perf_counter()
+        last_exc: Exception = httpcore.ConnectError(f"no addresses for {host}")
+        for *_, sockaddr in addresses:
+            remaining = None if timeout is None else max(timeout - (time.perf_counter() - start), 0.0)
+            try:
+                stream = await self._backend.connect_tcp(sockaddr[0], port, remaining, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as exc:
+                last_exc = exc
+                continue
+            timer = _current_timer.get()
+            if timer is not None:
+                timer.add("dns", resolved - start)
+                timer.add("connect", time.perf_counter() - resolved)
+            return stream
+        raise last_exc
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+
+class _OriginPools(httpx.AsyncBaseTransport):
+    """Routes each request to a small connection pool of its own origin.
+
+    httpcore matches queued requests to connections by scanning every
+    request and connection in a pool, so one pool shared by all in-flight
+    probes slows down quadratically as concurrency grows. Per-origin pools
+    keep each scan within the per-host limit. A pool unused for
+    ``idle_expiry`` seconds with no connection in use is closed, so origins
+    that stopped being probed don't keep pools or sockets around.
+    """
+
+    def __init__(self, make_transport, idle_expiry: float, clock=time.monotonic):
+        self._make_transport = make_transport
+        self.idle_expiry = idle_expiry
+        self._clock = clock
+        self._pools: dict = {}      # origin -> transport
+        self._last_used: dict = {}  # origin -> clock time of its latest request
+        self._next_sweep = clock() + idle_expiry
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        now = self._clock()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.idle_expiry
+            await self._close_idle(now)
+        origin = (request.url.scheme, request.url.host, request.url.port)
+        pool = self._pools.get(origin)
+        if pool is None:
+            pool = self._pools[origin] = self._make_transport()
+        self._last_used[origin] = now
+        return await pool.handle_async_request(request)
+
+    async def _close_idle(self, now: float):
+        for origin, last_used in list(self._last_used.items()):
+            if now - last_used < self.idle_expiry:
+                continue
+            pool = self._pools[origin]._pool
+            if not pool._requests and all(c.is_idle() or c.is_closed() for c in pool.connections):
+                del self._last_used[origin]
+                await self._pools.pop(origin).aclose()
+
+    async def aclose(self):
+        pools, self._pools, self._last_used = self._pools, {}, {}
+        for pool in pools.values():
+            await pool.aclose()
+
+
+class ProbeEngine:
+    """Runs HTTP probes concurrently on a dedicated asyncio event loop.
+
+    A single ``httpx.AsyncClient`` keeps connections alive in one pool per
+    origin, a global semaphore caps in-flight probes and a per-host
+    semaphore (by hostname, across ports) keeps any one downstream from
+    getting more than ``max_per_host`` probes at once. Callers on other
+    threads use ``submit`` (non-blocking) or ``probe`` (blocking); with
+    ``coalesce``, a submit for a (URL, timeout) already being probed shares
+    that probe's result instead of starting another.
+
+    Each successful probe reports its DNS, connect, TLS, TTFB and transfer
+    times in ``ProbeResult.phases``.
+    """
+
+    def __init__(self, max_concurrency: int = None, max_per_host: int = None,
+                 max_keepalive: int = None, keepalive_expiry: float = None, coalesce: bool = None):
+        self.max_concurrency = max_concurrency or settings.PROBE_MAX_CONCURRENCY
+        self.max_per_host = max_per_host or settings.PROBE_MAX_PER_HOST
+        self.max_keepalive = max_keepalive or settings.PROBE_MAX_KEEPALIVE
+        self.keepalive_expiry = keepalive_expiry or settings.PROBE_KEEPALIVE_EXPIRY_SECONDS
+        self.coalesce = settings.PROBE_COALESCE if coalesce is None else coalesce
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._global_sem: Optional[asyncio.Semaphore] = None
+        # a host's semaphore lives only while probes hold or wait on it
+        self._host_sems = weakref.WeakValueDictionary()
+        self._inflight: dict = {}  # (url, timeout) -> Future of the probe being run
+        self._inflight_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    def start(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def _run():
+                asyncio.set_event_loop(loop)
+                self._global_sem = asyncio.Semaphore(self.max_concurrency)
+                pools = _OriginPools(self._transport, idle_expiry=2 * self.keepalive_expiry)
+                self._client = httpx.AsyncClient(follow_redirects=True, transport=pools)
+                ready.set()
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=_run, name="probe-engine", daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+            logger.info("probe_engine.started", max_concurrency=self.max_concurrency, max_per_host=self.max_per_host)
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            loop, self._loop = self._loop, None
+            if loop is None:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._close(), loop).result(timeout)
+            except Exception as exc:
+                logger.warning("probe_engine.close_failed", exc=str(exc))
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(timeout)
+            loop.close()
+            self._client = None
+            self._host_sems = weakref.WeakValueDictionary()
+            with self._inflight_lock:
+                self._inflight = {}
+            logger.info("probe_engine.stopped")
+
+    async def _close(self):
+        # probes still waiting for a slot are cancelled rather than left pending
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._client.aclose()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        transport = httpx.AsyncHTTPTransport()
+        # httpx has no option for the network backend, so swap in a pool
+        # configured like its own but with DNS and connect timed separately
+        transport._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=self.max_per_host,
+            max_keepalive_connections=min(self.max_keepalive, self.max_per_host),
+            keepalive_expiry=self.keepalive_expiry,
+            network_backend=_TimedNetworkBackend(),
+        )
+        return transport
+
+    def _host_semaphore(self, host: str) -> asyncio.Semaphore:
+        sem = self._host_sems.get(host)
+        if sem is None:
+            sem = self._host_sems[host] = asyncio.Semaphore(self.max_per_host)
+        return sem
+
+    async def probe_async(self, url: str, timeout: float) -> ProbeResult:
+        host = urlsplit(url).hostname or ""
+        queued = time.perf_counter()
+        async with self._global_sem:
+            async with self._host_semaphore(host):
+                # time only the request itself, not the wait for a slot
+                start = time.perf_counter()
+                observe_stage("probe_wait", start - queued)
+                timer = _PhaseTimer()
+                _current_timer.set(timer)
+                try:
+                    resp = await self._client.get(url, timeout=timeout, extensions={"trace": timer.trace})
+                except Exception as exc:
+                    observe_stage("probe", time.perf_counter() - start)
+                    return ProbeResult(status="down", response_time_ms=None, error=str(exc) or exc.__class__.__name__)
+                response_time_ms = (time.perf_counter() - start) * 1000.0
+                observe_stage("probe", response_time_ms / 1000.0)
+                return ProbeResult(
+                    status=classify_status(resp.status_code),
+                    response_time_ms=response_time_ms,
+                    status_code=resp.status_code,
+                    phases=timer.phases or None,
+                )
+
+    def submit(self, url: str, timeout: float) -> Future:
+        """Schedule a probe on the engine loop and return a concurrent Future.
+
+        Callers asking for a (URL, timeout) that is already in flight get
+        that probe's Future.
+        """
+        self.start()
+        if not self.coalesce:
+            return asyncio.run_coroutine_threadsafe(self.probe_async(url, timeout), self._loop)
+        key = (url, timeout)
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                PROBES_COALESCED.inc()
+                return future
+            future = self._inflight[key] = asyncio.run_coroutine_threadsafe(self.probe_async(url, timeout), self._loop)
+        future.add_done_callback(lambda f: self._probe_finished(key, f))
+        return future
+
+    def _probe_finished(self, key: tuple, future: Future):
+        with self._inflight_lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def probe(self, url: str, timeout: float) -> ProbeResult:
+        """Run a probe and block the calling thread until it completes."""
+        return self.submit(url, timeout).result()
+
+
+probe_engine = ProbeEngine()
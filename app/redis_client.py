@@ -1,4 +1,7 @@
 from .config import settings
+from collections import OrderedDict
+import heapq
+import threading
 import time
 
 
@@ -10,36 +13,242 @@ except Exception:
 
 _r = None
 
+# rough bookkeeping cost of a key, on top of its key and value lengths
+_KEY_OVERHEAD = 100
+
+
+def _size(key, value) -> int:
+    if isinstance(value, dict):   # sorted set
+        return _KEY_OVERHEAD + len(key) + sum(len(str(member)) + 24 for member in value)
+    return _KEY_OVERHEAD + len(key) + len(str(value))
+
 
 class _InMemoryRedis:
-    def __init__(self):
-        self._data = {}
+    """Process-local stand-in for the Redis commands this app uses.
 
-    def set(self, key, value, nx=False, ex=None):
-        if nx and key in self._data:
-            return False
-        self._data[key] = (value, time.time() + ex if ex else None)
-        return True
+    Keys with a TTL also go on an expiry heap that every command drains, so
+    expired keys are freed whether or not they are read again. Past
+    ``max_bytes`` (estimated) the least recently used keys are evicted, as
+    with Redis's ``allkeys-lru`` policy.
+    """
 
-    def get(self, key):
-        v = self._data.get(key)
-        if not v:
-            return None
-        val, expiry = v
-        if expiry and time.time() > expiry:
-            del self._data[key]
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = max_bytes or settings.REDIS_IN_MEMORY_MAX_BYTES
+        self._data = OrderedDict()  # key -> (value, expires_at or None), least recently used first
+        self._sizes = {}
+        self._used = 0
+        self._expiry = []  # (expires_at, key) heap; stale once the key is rewritten or deleted
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        with self._lock:
+            self._purge()
+            return len(self._data)
+
+    @property
+    def used_bytes(self) -> int:
+        return self._used
+
+    # -- bookkeeping, with the lock held
+
+    def _purge(self):
+        now = time.time()
+        heap = self._expiry
+        while heap and heap[0][0] < now:
+            expires_at, key = heapq.heappop(heap)
+            entry = self._data.get(key)
+            if entry is not None and entry[1] == expires_at:
+                self._drop(key)
+
+    def _drop(self, key):
+        del self._data[key]
+        self._used -= self._sizes.pop(key)
+
+    def _lookup(self, key):
+        entry = self._data.get(key)
+        if entry is None:
             return None
-        return val
+        self._data.move_to_end(key)
+        return entry[0]
+
+    def _store(self, key, value, expires_at=None):
+        previous = self._data.get(key)
+        if previous is not None:
+            self._drop(key)
+        self._data[key] = (value, expires_at)
+        self._resized(key)
+        if expires_at is not None and (previous is None or previous[1] != expires_at):
+            heapq.heappush(self._expiry, (expires_at, key))
+            if len(self._expiry) > 2 * len(self._data) + 64:
+                # mostly stale entries of rewritten keys
+                self._expiry = [(entry[1], k) for k, entry in self._data.items() if entry[1] is not None]
+                heapq.heapify(self._expiry)
+
+    def _resized(self, key):
+        size = _size(key, self._data[key][0])
+        self._used += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+        # evict least recently used keys, never the one just written
+        while self._used > self.max_bytes and len(self._data) > 1:
+            oldest = next(iter(self._data))
+            if oldest == key:
+                break
+            self._drop(oldest)
+
+    def _zset(self, key, create=False):
+        zset = self._lookup(key)
+        if zset is None and create:
+            zset = {}
+            self._store(key, zset)
+        return zset
+
+    # -- strings
+
+    def set(self, key, value, nx=False, ex=None, px=None):
+        with self._lock:
+            self._purge()
+            if nx and key in self._data:
+                return False
+            ttl = ex or (px / 1000 if px else None)
+            self._store(key, value, time.time() + ttl if ttl else None)
+            return True
+
+    def get(self, key):
+        with self._lock:
+            self._purge()
+            return self._lookup(key)
+
+    def mset(self, mapping):
+        with self._lock:
+            self._purge()
+            for key, value in mapping.items():
+                self._store(key, value)
+            return True
+
+    def mget(self, keys, *args):
+        keys = list(keys) if isinstance(keys, (list, tuple)) else [keys]
+        with self._lock:
+            self._purge()
+            return [self._lookup(key) for key in keys + list(args)]
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            self._purge()
+            value = int(self._lookup(key) or 0) + amount
+            entry = self._data.get(key)
+            self._store(key, str(value), entry[1] if entry else None)
+            return value
+
+    def delete(self, *keys):
+        with self._lock:
+            self._purge()
+            deleted = 0
+            for key in keys:
+                if key in self._data:
+                    self._drop(key)
+                    deleted += 1
+            return deleted
+
+    # -- sorted sets, stored as {member: score} under the key
+
+    def zadd(self, key, mapping):
+        with self._lock:
+            self._purge()
+            zset = self._zset(key, create=True)
+            added = sum(1 for m in mapping if m not in zset)
+            zset.update(mapping)
+            self._resized(key)
+            return added
+
+    def zrem(self, key, *members):
+        with self._lock:
+            self._purge()
+            zset = self._zset(key)
+            if zset is None:
+                return 0
+            removed = sum(1 for m in members if zset.pop(m, None) is not None)
+            if zset:
+                self._resized(key)
+            else:
+                self._drop(key)
+            return removed
+
+    def zrangebyscore(self, key, min, max):
+        with self._lock:
+            self._purge()
+            zset = self._zset(key) or {}
+            lo, hi = float(min), float(max)
+            return [m for m, score in sorted(zset.items(), key=lambda kv: (kv[1], kv[0])) if lo <= score <= hi]
+
+    def zremrangebyscore(self, key, min, max):
+        with self._lock:
+            self._purge()
+            zset = self._zset(key)
+            if zset is None:
+                return 0
+            lo, hi = float(min), float(max)
+            doomed = [m for m, score in zset.items() if lo <= score <= hi]
+            for m in doomed:
+                del zset[m]
+            if zset:
+                self._resized(key)
+            else:
+                self._drop(key)
+            return len(doomed)
+
+    def pipeline(self, transaction=True):
+        return _InMemoryPipeline(self)
+
+
+class _InMemoryPipeline:
+    """Queues commands and runs them back to back under the store's lock,
+    so a pipeline is atomic, as with MULTI/EXEC."""
+
+    def __init__(self, store: _InMemoryRedis):
+        self._store = store
+        self._commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self._store, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+
+        return queue
+
+    def __len__(self):
+        return len(self._commands)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.reset()
+
+    def reset(self):
+        self._commands = []
+
+    def execute(self, raise_on_error=True):
+        commands, self._commands = self._commands, []
+        results = []
+        with self._store._lock:
+            for method, args, kwargs in commands:
+                try:
+                    results.append(method(*args, **kwargs))
+                except Exception as exc:
+                    if raise_on_error:
+                        raise
+                    results.append(exc)
+        return results
 
 
 def get_redis():
     global _r
     if _r is None:
-        if _redis_lib:
+        if _redis_lib and not settings.REDIS_IN_MEMORY:
             _r = _redis_lib.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB, decode_responses=True)
         else:
             # fallback for test environments where redis isn't installed
-            import time
-
             _r = _InMemoryRedis()
     return _r
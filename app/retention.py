@@ -0,0 +1,166 @@
+import re
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from .config import settings
+from .logging_config import logger
+
+# checks is range-partitioned by day on Postgres; partitions are named
+# checks_pYYYYMMDD and cover [day, day + 1). checks_default catches rows no
+# daily partition covers (retention stalled, clock skew) so inserts never fail.
+PARTITION_PREFIX = "checks_p"
+DEFAULT_PARTITION = "checks_default"
+_PARTITION_RE = re.compile(r"^checks_p(\d{8})$")
+
+
+def partition_name(day: date) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = 'checks' AND c.relnamespace = 'public'::regnamespace"
+    )).scalar())
+
+
+def list_partitions(conn: Connection) -> dict:
+    """Map partition day -> partition table name for every daily partition of checks."""
+    rows = conn.execute(text(
+        "SELECT child.relname FROM pg_inherits i "
+        "JOIN pg_class parent ON parent.oid = i.inhparent "
+        "JOIN pg_class child ON child.oid = i.inhrelid "
+        "WHERE parent.relname = 'checks'"
+    ))
+    partitions = {}
+    for (name,) in rows:
+        m = _PARTITION_RE.match(name)
+        if m:
+            partitions[datetime.strptime(m.group(1), "%Y%m%d").date()] = name
+    return partitions
+
+
+def ensure_default_partition(conn: Connection) -> None:
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF checks DEFAULT"))
+
+
+def _create_partition(conn: Connection, day: date) -> str:
+    name = partition_name(day)
+    bounds = {"lo": datetime(day.year, day.month, day.day, tzinfo=timezone.utc)}
+    bounds["hi"] = bounds["lo"] + timedelta(days=1)
+    values = f"FOR VALUES FROM ('{bounds['lo'].isoformat()}') TO ('{bounds['hi'].isoformat()}')"
+    stranded = conn.execute(text(
+        f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE timestamp >= :lo AND timestamp < :hi LIMIT 1"
+    ), bounds).scalar()
+    if not stranded:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF checks {values}"))
+        return name
+    # Postgres refuses a partition whose range already has rows in the
+    # default partition, so build it detached, move the rows, then attach
+    conn.execute(text(f"CREATE TABLE {name} (LIKE checks INCLUDING DEFAULTS)"))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= :lo AND timestamp < :hi RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds)
+    conn.execute(text(f"ALTER TABLE checks ATTACH PARTITION {name} {values}"))
+    return name
+
+
+def ensure_partitions(conn: Connection, start: date, end: date) -> list:
+    """Create any missing daily partitions for days in [start, end].
+
+    Rows already sitting in the default partition for a new day are moved
+    into it.
+    """
+    ensure_default_partition(conn)
+    existing = list_partitions(conn)
+    created = []
+    day = start
+    while day <= end:
+        if day not in existing:
+            created.append(_create_partition(conn, day))
+        day += timedelta(days=1)
+    return created
+
+
+def rehome_default_rows(conn: Connection, retention_days: int, today: date = None) -> int:
+    """Move rows that landed in the default partition into daily partitions.
+
+    Rows already past the retention window are deleted instead. Returns how
+    many rows were found there; any at all means daily partitions were
+    missing when they were written.
+    """
+    cutoff = (today or datetime.utcnow().date()) - timedelta(days=retention_days)
+    cutoff_ts = datetime(cutoff.year, cutoff.month, cutoff.day, tzinfo=timezone.utc)
+    rows = conn.execute(text(f"SELECT count(*) FROM {DEFAULT_PARTITION}")).scalar()
+    if not rows:
+        return 0
+    expired = conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < :cutoff"), {"cutoff": cutoff_ts}).rowcount
+    days = [day for (day,) in conn.execute(text(
+        f"SELECT DISTINCT (timestamp AT TIME ZONE 'UTC')::date FROM {DEFAULT_PARTITION} ORDER BY 1"
+    ))]
+    for day in days:
+        ensure_partitions(conn, day, day)
+    logger.warning("retention.default_partition_rows", rows=rows, expired=expired, days=[d.isoformat() for d in days])
+    return rows
+
+
+def drop_expired_partitions(conn: Connection, retention_days: int, today: date = None) -> list:
+    """Drop whole partitions whose day is entirely older than the retention window."""
+    cutoff = (today or datetime.utcnow().date()) - timedelta(days=retention_days)
+    dropped = []
+    for day, name in sorted(list_partitions(conn).items()):
+        if day < cutoff:
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            dropped.append(name)
+    return dropped
+
+
+def _delete_in_batches(engine, table: str, column: str, cutoff: datetime, batch_size: int = 10000) -> int:
+    # fallback for unpartitioned tables: one short transaction per batch so
+    # no single statement holds long locks
+    row_ref = "rowid" if engine.dialect.name == "sqlite" else "ctid"
+    deleted = 0
+    while True:
+        with engine.begin() as conn:
+            result = conn.execute(text(
+                f"DELETE FROM {table} WHERE {row_ref} IN "
+                f"(SELECT {row_ref} FROM {table} WHERE {column} < :cutoff LIMIT :limit)"
+            ), {"cutoff": cutoff, "limit": batch_size})
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+
+
+def run_retention(engine) -> dict:
+    """Pre-create upcoming partitions and expire old check history.
+
+    On a partitioned Postgres ``checks`` table expiry drops whole daily
+    partitions, after moving any rows that fell into the default partition
+    to their day; elsewhere it falls back to batched DELETEs. The 1m and 1h
+    rollups have their own retention periods.
+    """
+    today = datetime.utcnow().date()
+    summary = {"created": [], "dropped": [], "default_rows": 0, "deleted_checks": 0, "deleted_rollups": 0}
+    with engine.begin() as conn:
+        partitioned = is_partitioned(conn)
+        if partitioned:
+            # start a day back so late writes just after midnight still have a home
+            summary["created"] = ensure_partitions(
+                conn, today - timedelta(days=1), today + timedelta(days=settings.CHECKS_PARTITION_PREMAKE_DAYS),
+            )
+            summary["default_rows"] = rehome_default_rows(conn, settings.CHECKS_RETENTION_DAYS, today)
+            summary["dropped"] = drop_expired_partitions(conn, settings.CHECKS_RETENTION_DAYS, today)
+    if not partitioned:
+        cutoff = datetime.utcnow() - timedelta(days=settings.CHECKS_RETENTION_DAYS)
+        summary["deleted_checks"] = _delete_in_batches(engine, "checks", "timestamp", cutoff)
+    for table, days in (("check_rollups_1m", settings.ROLLUP_MINUTE_RETENTION_DAYS),
+                        ("check_rollups_1h", settings.ROLLUP_HOUR_RETENTION_DAYS)):
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        summary["deleted_rollups"] += _delete_in_batches(engine, table, "bucket_start", cutoff)
+    logger.info("retention.completed", **{k: (len(v) if isinstance(v, list) else v) for k, v in summary.items()})
+    return summary
@@ -0,0 +1,298 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from .aggregator import APDEX_THRESHOLD_MS, FAILED_STATUSES, epoch_seconds
+from .config import settings
+from .logging_config import logger
+from .models import CheckRollupHour, CheckRollupMinute
+from .phases import PhaseTotals, unpack_phases
+from .sketch import DDSketch
+
+MINUTE = 60
+HOUR = 3600
+ROLLUP_MODELS = {MINUTE: CheckRollupMinute, HOUR: CheckRollupHour}
+
+_COUNTERS = (
+    "count", "ok_count", "warn_count", "error_count", "down_count",
+    "latency_count", "latency_sum_ms", "apdex_satisfied", "apdex_tolerating",
+)
+
+
+def _dt(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+class RollupStats:
+    """Additive check statistics for a bucket, or any merge of buckets."""
+
+    def __init__(self, relative_accuracy: float = None):
+        self.count = 0
+        self.ok_count = 0
+        self.warn_count = 0
+        self.error_count = 0
+        self.down_count = 0
+        self.latency_count = 0
+        self.latency_sum_ms = 0.0
+        self.latency_min_ms: Optional[float] = None
+        self.latency_max_ms: Optional[float] = None
+        self.apdex_satisfied = 0
+        self.apdex_tolerating = 0
+        self.sketch = DDSketch(relative_accuracy=relative_accuracy or settings.SKETCH_RELATIVE_ACCURACY)
+        self.phase_totals = PhaseTotals()
+
+    def add(self, status: str, response_time_ms: Optional[float], phases_ms: Optional[dict] = None):
+        self.count += 1
+        self.phase_totals.add(phases_ms)
+        if status in ("ok", "warn", "error", "down"):
+            setattr(self, f"{status}_count", getattr(self, f"{status}_count") + 1)
+        if response_time_ms is not None:
+            self.latency_count += 1
+            self.latency_sum_ms += response_time_ms
+            self.latency_min_ms = response_time_ms if self.latency_min_ms is None else min(self.latency_min_ms, response_time_ms)
+            self.latency_max_ms = response_time_ms if self.latency_max_ms is None else max(self.latency_max_ms, response_time_ms)
+            if status == "ok":
+                self.sketch.add(response_time_ms)
+                if response_time_ms <= APDEX_THRESHOLD_MS:
+                    self.apdex_satisfied += 1
+                elif response_time_ms <= 4 * APDEX_THRESHOLD_MS:
+                    self.apdex_tolerating += 1
+
+    def merge(self, other):
+        """Merge another RollupStats, or a rollup row."""
+        for name in _COUNTERS:
+            setattr(self, name, getattr(self, name) + (getattr(other, name) or 0))
+        for name, pick in (("latency_min_ms", min), ("latency_max_ms", max)):
+            theirs = getattr(other, name)
+            if theirs is not None:
+                mine = getattr(self, name)
+                setattr(self, name, theirs if mine is None else pick(mine, theirs))
+        sketch = other.sketch
+        if isinstance(sketch, bytes):
+            sketch = DDSketch.from_bytes(sketch)
+        if sketch is not None:
+            self.sketch.merge(sketch)
+        phase_totals = other.phase_totals
+        if phase_totals is None or isinstance(phase_totals, bytes):
+            phase_totals = PhaseTotals.from_bytes(phase_totals)
+        self.phase_totals.merge(phase_totals)
+
+    def row_values(self) -> dict:
+        values = {name: getattr(self, name) for name in _COUNTERS + ("latency_min_ms", "latency_max_ms")}
+        values["sketch"] = self.sketch.to_bytes()
+        values["phase_totals"] = self.phase_totals.to_bytes()
+        return values
+
+    def write_to(self, row):
+        for name, value in self.row_values().items():
+            setattr(row, name, value)
+
+    @property
+    def failed_count(self) -> int:
+        return sum(getattr(self, f"{s}_count") for s in FAILED_STATUSES)
+
+    @property
+    def avg_response_time_ms(self) -> Optional[float]:
+        return self.latency_sum_ms / self.latency_count if self.latency_count else None
+
+    @property
+    def error_rate_percent(self) -> Optional[float]:
+        return self.failed_count / self.count * 100 if self.count else None
+
+    @property
+    def uptime_percent(self) -> Optional[float]:
+        return (self.count - self.failed_count) / self.count * 100 if self.count else None
+
+    @property
+    def apdex_score(self) -> Optional[float]:
+        # Apdex is computed over OK checks with a response time, which is
+        # exactly the population of the sketch
+        if not self.sketch.count:
+            return None
+        return min((self.apdex_satisfied + self.apdex_tolerating / 2) / self.sketch.count, 1.0)
+
+
+class RollupStore:
+    """Maintains the 1-minute and 1-hour check rollups.
+
+    Written checks are folded into in-memory per-bucket deltas; ``flush``
+    merges the deltas into the rollup tables (one bulk locking read plus
+    the updates, per resolution). Queries read the coarsest rollup covering the
+    window: whole hours come from ``check_rollups_1h`` and the partial hours
+    at either end of the window from ``check_rollups_1m``. Unflushed deltas
+    are merged in, so cost depends on the window length, not on how many
+    checks it holds.
+    """
+
+    def __init__(self, relative_accuracy: float = None):
+        self.relative_accuracy = relative_accuracy or settings.SKETCH_RELATIVE_ACCURACY
+        self._pending: dict = {}  # (resolution, service_id, bucket_start epoch) -> RollupStats
+        self._lock = threading.Lock()
+
+    def new_stats(self) -> RollupStats:
+        return RollupStats(self.relative_accuracy)
+
+    def _observe_locked(self, service_id: int, status: str, response_time_ms: Optional[float], ts: float,
+                        phases_ms: Optional[dict]):
+        for resolution in ROLLUP_MODELS:
+            key = (resolution, service_id, ts - ts % resolution)
+            stats = self._pending.get(key)
+            if stats is None:
+                stats = self._pending[key] = self.new_stats()
+            stats.add(status, response_time_ms, phases_ms)
+
+    def observe(self, service_id: int, status: str, response_time_ms: Optional[float], ts: float = None,
+                phases_ms: Optional[dict] = None):
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            self._observe_locked(service_id, status, response_time_ms, ts, phases_ms)
+
+    def observe_rows(self, rows: Iterable[dict]):
+        """Fold a batch of written Check rows into the pending deltas."""
+        with self._lock:
+            for row in rows:
+                ts = row.get("timestamp")
+                self._observe_locked(
+                    row["service_id"], row["status"], row.get("response_time_ms"),
+                    epoch_seconds(ts) if ts is not None else time.time(),
+                    unpack_phases(row.get("phase_timings")),
+                )
+
+    def remove(self, service_id: int):
+        with self._lock:
+            self._pending = {k: v for k, v in self._pending.items() if k[1] != service_id}
+
+    def _restore(self, pending: dict):
+        with self._lock:
+            for key, stats in pending.items():
+                current = self._pending.get(key)
+                if current is None:
+                    self._pending[key] = stats
+                else:
+                    current.merge(stats)
+
+    def flush(self, db: Session) -> int:
+        """Merge pending deltas into the rollup tables; returns rows written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            for resolution, model in ROLLUP_MODELS.items():
+                deltas = {(sid, b): s for (res, sid, b), s in pending.items() if res == resolution}
+                if not deltas:
+                    continue
+                # row locks (a no-op on SQLite) serialize nodes flushing the same
+                # buckets across a shard lease handoff; in key order, so they cannot
+                # deadlock. Two first inserts collide on the primary key instead,
+                # and the loser's deltas are restored and merged on its next flush.
+                existing = {
+                    (row.service_id, epoch_seconds(row.bucket_start)): row
+                    for row in db.query(model).filter(
+                        model.service_id.in_({sid for sid, _ in deltas}),
+                        model.bucket_start.in_([_dt(b) for b in {b for _, b in deltas}]),
+                    ).order_by(model.service_id, model.bucket_start).with_for_update()
+                }
+                for (service_id, bucket), stats in deltas.items():
+                    row = existing.get((service_id, bucket))
+                    if row is None:
+                        row = model(service_id=service_id, bucket_start=_dt(bucket))
+                        stats.write_to(row)
+                        db.add(row)
+                    else:
+                        merged = self.new_stats()
+                        merged.merge(row)
+                        merged.merge(stats)
+                        merged.write_to(row)
+            db.commit()
+        except Exception:
+            db.rollback()
+            self._restore(pending)
+            raise
+        logger.debug("rollups.flushed", rows=len(pending))
+        return len(pending)
+
+    def _pending_stats(self, resolution: int, service_ids: set, start: float, end: Optional[float]) -> list:
+        with self._lock:
+            return [
+                (sid, b, stats) for (res, sid, b), stats in self._pending.items()
+                if res == resolution and sid in service_ids and b >= start and (end is None or b < end)
+            ]
+
+    def _rows(self, db: Session, resolution: int, service_ids: list, start: float, end: Optional[float]):
+        model = ROLLUP_MODELS[resolution]
+        q = db.query(model).filter(model.service_id.in_(service_ids), model.bucket_start >= _dt(start))
+        if end is not None:
+            q = q.filter(model.bucket_start < _dt(end))
+        return q
+
+    @staticmethod
+    def _spans(since: datetime, until: Optional[datetime]) -> list:
+        start = epoch_seconds(since)
+        start -= start % MINUTE
+        end = epoch_seconds(until) if until else None
+        hour_start = start if start % HOUR == 0 else start - start % HOUR + HOUR
+        if end is None:
+            return [(MINUTE, start, hour_start), (HOUR, hour_start, None)]
+        # a window ending mid-hour takes its tail from the minute table too
+        hour_start = min(hour_start, end)
+        tail = max(end - end % HOUR, hour_start)
+        return [(MINUTE, start, hour_start), (HOUR, hour_start, tail), (MINUTE, tail, end)]
+
+    def fetch_by_service(self, db: Session, service_ids: Iterable[int], since: datetime,
+                         until: Optional[datetime] = None) -> list:
+        """The rollup rows and pending deltas behind ``query_by_service``, unmerged,
+        as (service_id, row or RollupStats); ``merge_by_service`` folds them."""
+        service_ids = list(service_ids)
+        wanted = set(service_ids)
+        parts: list = []
+        if not service_ids:
+            return parts
+        for resolution, lo, hi in self._spans(since, until):
+            if hi is not None and lo >= hi:
+                continue
+            parts.extend((row.service_id, row) for row in self._rows(db, resolution, service_ids, lo, hi))
+            parts.extend((sid, stats) for sid, _, stats in self._pending_stats(resolution, wanted, lo, hi))
+        return parts
+
+    def merge_by_service(self, parts: Iterable) -> dict:
+        totals: dict = {}
+        for service_id, part in parts:
+            totals.setdefault(service_id, self.new_stats()).merge(part)
+        return totals
+
+    def query_by_service(self, db: Session, service_ids: Iterable[int], since: datetime,
+                         until: Optional[datetime] = None) -> dict:
+        """Per-service stats over ``[since, until)`` as {service_id: RollupStats}.
+
+        Services without any checks in the window are left out.
+        """
+        return self.merge_by_service(self.fetch_by_service(db, service_ids, since, until))
+
+    def query(self, db: Session, service_ids: Iterable[int], since: datetime,
+              until: Optional[datetime] = None) -> RollupStats:
+        """Merged stats for ``service_ids`` over ``[since, until)``, at minute granularity."""
+        total = self.new_stats()
+        for stats in self.query_by_service(db, service_ids, since, until).values():
+            total.merge(stats)
+        return total
+
+    def series(self, db: Session, service_id: int, resolution: int, since: datetime,
+               until: Optional[datetime] = None) -> list:
+        """Per-bucket stats for one service, oldest first, as (bucket_start, RollupStats)."""
+        start = epoch_seconds(since)
+        start -= start % resolution
+        end = epoch_seconds(until) if until else None
+        buckets: dict = {}
+        for row in self._rows(db, resolution, [service_id], start, end):
+            stats = buckets[epoch_seconds(row.bucket_start)] = self.new_stats()
+            stats.merge(row)
+        for _, b, stats in self._pending_stats(resolution, {service_id}, start, end):
+            buckets.setdefault(b, self.new_stats()).merge(stats)
+        return [(_dt(b), buckets[b]) for b in sorted(buckets)]
+
+
+rollups = RollupStore()
@@ -1,40 +1,397 @@
+from apscheduler.events import EVENT_JOB_MISSED
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from concurrent.futures import Future, ThreadPoolExecutor
 from sqlalchemy.orm import Session
-from .database import SessionLocal
-from .models import Service
-from .healthchecker import check_service
+from .database import SessionLocal, engine
+from .models import Check, Service
+from .healthchecker import record_check
+from .check_writer import check_writer
+from .kafka_producer import producer
+from .alerts import alert_dispatcher
+from .probe_engine import probe_engine
+from .adaptive import intervals
+from .alerts import TokenBucket
+from .cache import response_cache
+from .aggregator import aggregator, epoch_seconds
+from .rollups import rollups
+from .slo import slo_engine
+from .snapshot import fingerprint, read_snapshot, write_snapshot
+from .retention import run_retention
+from .redis_client import get_redis
+from .sharding import ShardCoordinator
+from .timing_wheel import TimingWheel
+from .metrics import (
+    PROBE_BUDGET_SKIPPED, PROBES_PENDING, RECORDS_PENDING, SCHEDULER_MISFIRES, SERVICE_PROBE_INTERVAL, time_stage,
+)
 from .config import settings
+from .logging_config import logger
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
 import atexit
+import threading
+import time
+import numpy as np
 
+# APScheduler runs the maintenance jobs; service probes are driven by the
+# timing wheel below.
 scheduler = BackgroundScheduler()
 
+# Probes run on the probe engine's event loop; only the metrics, publish and
+# alert step that follows each probe needs a thread.
+_record_executor = ThreadPoolExecutor(max_workers=settings.SCHEDULER_RECORD_WORKERS, thread_name_prefix="check-record")
 
-def _job_for_service(service_id: int):
-    def _job():
-        db: Session = SessionLocal()
-        try:
-            service = db.query(Service).filter(Service.id == service_id).first()
-            if service:
-                check_service(db, service)
-        finally:
-            db.close()
+# Set when SCHEDULER_SHARDING_ENABLED; every node keeps every service in its
+# wheel but only probes the services whose shard it holds the lease for.
+coordinator: Optional[ShardCoordinator] = None
+
+# Set when PROBE_BUDGET_PER_SECOND > 0
+budget: Optional[TokenBucket] = None
+
+_interval_labels: dict = {}  # service_id -> service name on SERVICE_PROBE_INTERVAL
+_fingerprints: dict = {}  # service_id -> snapshot.fingerprint() of the settings it is scheduled with
+
+
+def _record_result(service: Service, future: Future):
+    try:
+        result = future.result()
+        with time_stage("record"):
+            record_check(service, result)
+        _adapt_interval(service, result)
+    except Exception:
+        logger.exception("scheduler.record_failed", service_id=service.id)
+    finally:
+        RECORDS_PENDING.dec()
+
+
+def _adapt_interval(service: Service, result):
+    interval = intervals.observe(service, result.status, result.response_time_ms)
+    # a service deleted while its probe ran stays deleted
+    if interval is None or service.id not in wheel:
+        return
+    _schedule(service)
+    db: Session = SessionLocal()
+    try:
+        db.query(Service).filter(Service.id == service.id).update(
+            {Service.current_interval_seconds: interval}, synchronize_session=False,
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("scheduler.interval_persist_failed", service_id=service.id)
+    finally:
+        db.close()
+    response_cache.invalidate_services([service.id], listing=True)
+    logger.info("scheduler.interval_changed", service_id=service.id, interval_seconds=interval, status=result.status)
+
+
+def _owned_locally(service_id: int) -> bool:
+    """Whether this process's static worker shard includes ``service_id``."""
+    return service_id % settings.WORKER_SHARD_COUNT == settings.WORKER_SHARD_INDEX
+
+
+def _on_probe_done(service: Service, future: Future):
+    PROBES_PENDING.dec()
+    if future.cancelled():
+        return
+    RECORDS_PENDING.inc()
+    try:
+        _record_executor.submit(_record_result, service, future)
+    except RuntimeError:
+        # probes still finishing after shutdown began are dropped
+        RECORDS_PENDING.dec()
+
+
+def _dispatch_services(service_ids: list):
+    """Submit probes for a batch of due services (called by the timing wheel)."""
+    if coordinator is not None:
+        service_ids = [sid for sid in service_ids if coordinator.owns(sid)]
+        if not service_ids:
+            return
+    db: Session = SessionLocal()
+    try:
+        services = db.query(Service).filter(Service.id.in_(service_ids)).all()
+    finally:
+        db.close()
+    if budget is not None:
+        services = _within_budget(services)
+    for service in services:
+        PROBES_PENDING.inc()
+        future = probe_engine.submit(service.url, service.timeout_seconds)
+        future.add_done_callback(lambda f, service=service: _on_probe_done(service, f))
+
+
+def _within_budget(services: list) -> list:
+    """The due services the probe budget admits: degraded first, then by priority.
+
+    Services sharing a target with one already admitted ride along for free,
+    since the probe engine coalesces them.
+    """
+    services = sorted(services, key=lambda s: (not intervals.degraded(s.id), -(s.priority or 0)))
+    admitted, targets = [], set()
+    for service in services:
+        target = (service.url, service.timeout_seconds)
+        if target in targets or budget.take():
+            targets.add(target)
+            admitted.append(service)
+    skipped = len(services) - len(admitted)
+    if skipped:
+        PROBE_BUDGET_SKIPPED.inc(skipped)
+    return admitted
+
+
+def _phase_key(url: str, timeout_seconds: int) -> Optional[str]:
+    # services probing the same target fire on the same ticks, so the probe
+    # engine can coalesce them into one request
+    return f"{timeout_seconds}:{url}" if settings.PROBE_COALESCE else None
+
+
+def _schedule(service: Service):
+    _schedule_many([service])
+
+
+def _schedule_many(services: Iterable[Service]):
+    services = list(services)
+    entries = []
+    for service in services:
+        interval = intervals.interval(service)
+        entries.append((service.id, interval, _phase_key(service.url, service.timeout_seconds)))
+        _interval_labels[service.id] = service.name
+        _fingerprints[service.id] = fingerprint(service)
+        SERVICE_PROBE_INTERVAL.labels(service=service.name).set(interval)
+    wheel.schedule_many(entries)
+    slo_engine.track(services)
+
+
+def _unschedule(service_id: int):
+    _unschedule_many([service_id])
+
+
+def _unschedule_many(service_ids: Iterable[int]):
+    service_ids = list(service_ids)
+    wheel.remove_many(service_ids)
+    slo_engine.remove(service_ids)
+    for service_id in service_ids:
+        intervals.remove(service_id)
+        _fingerprints.pop(service_id, None)
+        name = _interval_labels.pop(service_id, None)
+        if name is not None:
+            try:
+                SERVICE_PROBE_INTERVAL.remove(name)
+            except KeyError:
+                pass
+
+
+wheel = TimingWheel(
+    _dispatch_services,
+    tick=settings.SCHEDULER_WHEEL_TICK_SECONDS,
+    batch_size=settings.SCHEDULER_DISPATCH_BATCH,
+)
+
+
+def _flush_rollups():
+    db: Session = SessionLocal()
+    try:
+        rollups.flush(db)
+    except Exception:
+        logger.exception("scheduler.rollup_flush_failed")
+    finally:
+        db.close()
+
+
+def _on_shards_acquired(shards: set):
+    # windows for services that were probed elsewhere until now are stale
+    db: Session = SessionLocal()
+    try:
+        services = db.query(Service).filter((Service.id % coordinator.shards).in_(shards)).all()
+        aggregator.rebuild(db, service_ids=[s.id for s in services])
+        slo_engine.rebuild(db, services)
+    except Exception:
+        logger.exception("scheduler.shard_rebuild_failed")
+    finally:
+        db.close()
 
-    return _job
+
+def _sync_services():
+    """Reconcile the wheel with the services table.
+
+    Picks up services created, changed or deleted through another process
+    (the API when probes run in app.worker, or another replica).
+    """
+    db: Session = SessionLocal()
+    try:
+        wanted = {service.id: service for service in db.query(Service) if _owned_locally(service.id)}
+    except Exception:
+        logger.exception("scheduler.service_sync_failed")
+        return
+    finally:
+        db.close()
+    gone = set(wheel.keys()) - set(wanted)
+    _unschedule_many(gone)
+    for service_id in gone:
+        aggregator.remove(service_id)
+    _schedule_many(wanted.values())
+
+
+def _evaluate_slos():
+    try:
+        with time_stage("slo"):
+            report = slo_engine.evaluate()
+            slo_engine.publish(report)
+            slo_engine.alert(report, alert_dispatcher)
+    except Exception:
+        logger.exception("scheduler.slo_evaluation_failed")
+
+
+def _snapshot_path() -> Optional[str]:
+    if not settings.SNAPSHOT_PATH or settings.SCHEDULER_SHARDING_ENABLED:
+        return None
+    return settings.SNAPSHOT_PATH.format(shard=settings.WORKER_SHARD_INDEX)
+
+
+def _save_snapshot():
+    path = _snapshot_path()
+    if path is None:
+        return
+    try:
+        with time_stage("snapshot"):
+            created_at = time.time()
+            fingerprints = dict(_fingerprints)
+            arrays = {
+                "services.id": np.array(list(fingerprints), dtype=np.int64),
+                "services.fingerprint": np.array(list(fingerprints.values()), dtype=np.uint32),
+            }
+            for prefix, component in (("agg", aggregator), ("adaptive", intervals), ("slo", slo_engine)):
+                arrays.update((f"{prefix}.{name}", a) for name, a in component.snapshot().items())
+            write_snapshot(path, arrays, created_at)
+        logger.debug("scheduler.snapshot_saved", path=path, services=len(fingerprints))
+    except Exception:
+        logger.exception("scheduler.snapshot_failed", path=path)
+
+
+def _restore_snapshot(db: Session, services: list) -> Tuple[set, set]:
+    """Resume the probe state of ``services`` from the last snapshot.
+
+    Only services whose settings are unchanged since the snapshot are
+    restored, then topped up with the checks recorded after it. Returns the
+    ids whose SRE windows and whose SLO counts were restored; the caller
+    reloads the rest from the database.
+    """
+    path = _snapshot_path()
+    snapshot = read_snapshot(path) if path else None
+    if snapshot is None:
+        return set(), set()
+    age = time.time() - snapshot.created_at
+    if not 0 <= age <= settings.SNAPSHOT_MAX_AGE_SECONDS:
+        logger.info("scheduler.snapshot_stale", path=path, age_seconds=round(age))
+        return set(), set()
+    saved = dict(zip(snapshot["services.id"].tolist(), snapshot["services.fingerprint"].tolist()))
+    valid = {service.id for service in services if saved.get(service.id) == fingerprint(service)}
+    recent: dict = {}
+    if valid:
+        since = datetime.utcfromtimestamp(snapshot.created_at)
+        rows = db.query(Check.service_id, Check.timestamp, Check.status, Check.response_time_ms).filter(
+            Check.timestamp > since
+        ).order_by(Check.timestamp).yield_per(5000)
+        for service_id, ts, status, response_time_ms in rows:
+            if service_id in valid:
+                recent.setdefault(service_id, []).append((epoch_seconds(ts), status, response_time_ms))
+    windows = aggregator.restore(snapshot.section("agg"), valid, recent)
+    intervals.restore(snapshot.section("adaptive"), valid)
+    slo_engine.track(service for service in services if service.id in valid)
+    slos = slo_engine.restore(snapshot.section("slo"), valid)
+    for service_id in slos:
+        for ts, status, response_time_ms in recent.get(service_id, ()):
+            slo_engine.observe(service_id, status, response_time_ms, ts=ts)
+    logger.info(
+        "scheduler.snapshot_restored", path=path, age_seconds=round(age), services=len(services),
+        windows=len(windows), slos=len(slos), checks=sum(map(len, recent.values())),
+    )
+    return windows, slos
+
+
+def _shard_heartbeat():
+    try:
+        coordinator.tick()
+    except Exception:
+        logger.exception("scheduler.shard_heartbeat_failed")
+
+
+def _run_retention():
+    # one node is enough for fleet-wide maintenance
+    if coordinator is not None and not coordinator.owns_shard(0):
+        return
+    try:
+        run_retention(engine)
+    except Exception:
+        logger.exception("scheduler.retention_failed")
+
+
+def _on_job_missed(event):
+    SCHEDULER_MISFIRES.labels(source="job").inc()
+    logger.warning("scheduler.job_missed", job_id=event.job_id, scheduled_run_time=str(event.scheduled_run_time))
+
+
+_shutdown_lock = threading.Lock()
+_stopped = True   # until start_scheduler
+
+
+def _shutdown():
+    # run by app.worker on SIGTERM and again by atexit: only the first call counts
+    global _stopped
+    with _shutdown_lock:
+        if _stopped:
+            return
+        _stopped = True
+    wheel.stop()
+    scheduler.shutdown(wait=False)
+    if coordinator is not None:
+        try:
+            coordinator.leave()
+        except Exception:
+            logger.exception("scheduler.shard_leave_failed")
+    probe_engine.stop()
+    _record_executor.shutdown(wait=True)
+    check_writer.stop()
+    _flush_rollups()
+    _save_snapshot()
+    alert_dispatcher.stop()
+    producer.close()
 
 
 def start_scheduler():
-    # load all services and create jobs
+    global budget, coordinator, _stopped
+    _stopped = False
+    probe_engine.start()
+    check_writer.start()
+
+    if settings.SCHEDULER_SHARDING_ENABLED:
+        coordinator = ShardCoordinator(get_redis(), on_acquire=_on_shards_acquired)
+        # the first tick rebuilds the windows of the shards it acquires
+        _shard_heartbeat()
+        scheduler.add_job(
+            _shard_heartbeat,
+            trigger=IntervalTrigger(seconds=settings.SCHEDULER_HEARTBEAT_SECONDS),
+            id="shard_heartbeat",
+            replace_existing=True,
+        )
+
+    if settings.PROBE_BUDGET_PER_SECOND > 0:
+        rate = settings.PROBE_BUDGET_PER_SECOND
+        budget = TokenBucket(rate, max(1, int(rate)))
+
+    # load this process's services into the wheel
     db: Session = SessionLocal()
     try:
-        services = db.query(Service).all()
-        for s in services:
-            scheduler.add_job(
-                _job_for_service(s.id),
-                trigger=IntervalTrigger(seconds=max(5, s.interval_seconds)),
-                id=f"service_{s.id}",
-                replace_existing=True,
-            )
+        services = [service for service in db.query(Service) if _owned_locally(service.id)]
+        if coordinator is None:
+            windows, slos = _restore_snapshot(db, services)
+            if settings.WORKER_SHARD_COUNT == 1 and not windows:
+                aggregator.rebuild(db)
+            else:
+                aggregator.rebuild(db, service_ids=[service.id for service in services if service.id not in windows])
+            slo_engine.rebuild(db, [service for service in services if service.id not in slos])
+        _schedule_many(services)
     except Exception as e:
         # If DB is not available, start scheduler without jobs
         # Jobs will be added when services are created via API
@@ -42,20 +399,57 @@ def start_scheduler():
     finally:
         db.close()
 
+    scheduler.add_job(
+        _flush_rollups,
+        trigger=IntervalTrigger(seconds=settings.ROLLUP_FLUSH_SECONDS),
+        id="rollup_flush",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        _sync_services,
+        trigger=IntervalTrigger(seconds=settings.SCHEDULER_SYNC_SECONDS),
+        id="service_sync",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        _evaluate_slos,
+        trigger=IntervalTrigger(seconds=settings.SLO_EVALUATION_SECONDS),
+        id="slo_evaluation",
+        replace_existing=True,
+    )
+    if _snapshot_path() is not None:
+        scheduler.add_job(
+            _save_snapshot,
+            trigger=IntervalTrigger(seconds=settings.SNAPSHOT_INTERVAL_SECONDS),
+            id="probe_state_snapshot",
+            replace_existing=True,
+        )
+    scheduler.add_job(
+        _run_retention,
+        trigger=IntervalTrigger(seconds=settings.RETENTION_JOB_INTERVAL_SECONDS),
+        id="checks_retention",
+        replace_existing=True,
+        next_run_time=datetime.now(),
+    )
+    scheduler.add_listener(_on_job_missed, EVENT_JOB_MISSED)
     scheduler.start()
-    atexit.register(lambda: scheduler.shutdown(wait=False))
+    wheel.start()
+    atexit.register(_shutdown)
 
 
 def add_service_job(service):
-    scheduler.add_job(
-        _job_for_service(service.id),
-        trigger=IntervalTrigger(seconds=max(5, service.interval_seconds)),
-        id=f"service_{service.id}",
-        replace_existing=True,
-    )
+    """Schedule ``service``, or pick up a changed interval or target."""
+    if not _owned_locally(service.id):
+        return
+    _schedule(service)
 
 
 def remove_service_job(service_id: int):
-    job_id = f"service_{service_id}"
-    if scheduler.get_job(job_id):
-        scheduler.remove_job(job_id)
+    _unschedule(service_id)
+
+
+def apply_service_jobs(services: Iterable[Service], removed_ids: Iterable[int] = ()):
+    """Schedule or reschedule ``services`` and drop ``removed_ids``, in one
+    pass over the wheel (bulk registration and fleet sync)."""
+    _unschedule_many(removed_ids)
+    _schedule_many(service for service in services if _owned_locally(service.id))
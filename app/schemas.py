@@ -1,5 +1,5 @@
-from pydantic import BaseModel, HttpUrl
-from typing import Optional
+from pydantic import BaseModel, Field, HttpUrl, model_validator
+from typing import Dict, Optional, List
 from datetime import datetime
 
 
@@ -8,15 +8,68 @@ class ServiceCreate(BaseModel):
     url: HttpUrl
     interval_seconds: int = 60
     timeout_seconds: int = 10
+    # adaptive: probe down to min_interval_seconds while degraded, back off up
+    # to max_interval_seconds while healthy (defaults: 5s and 4x interval_seconds)
+    adaptive: bool = False
+    min_interval_seconds: Optional[int] = Field(None, ge=1)
+    max_interval_seconds: Optional[int] = Field(None, ge=1)
+    priority: int = 0
+    # SLOs in percent of checks, e.g. 99.9: availability counts warn, error and
+    # down checks as bad; latency also counts OK checks slower than the threshold
+    slo_availability_target: Optional[float] = Field(None, gt=0, lt=100)
+    slo_latency_threshold_ms: Optional[float] = Field(None, gt=0)
+    slo_latency_target: Optional[float] = Field(None, gt=0, lt=100)
+
+    @model_validator(mode="after")
+    def _check_bounds(self):
+        if self.min_interval_seconds and self.max_interval_seconds and self.min_interval_seconds > self.max_interval_seconds:
+            raise ValueError("min_interval_seconds must not exceed max_interval_seconds")
+        if (self.slo_latency_threshold_ms is None) != (self.slo_latency_target is None):
+            raise ValueError("slo_latency_threshold_ms and slo_latency_target go together")
+        return self
+
+
+class ServiceBulk(BaseModel):
+    services: List[ServiceCreate]
+    # delete the services not listed, making this a full fleet sync
+    prune: bool = False
+    dry_run: bool = False
+
+    @model_validator(mode="after")
+    def _check_unique_names(self):
+        seen, duplicates = set(), set()
+        for service in self.services:
+            (duplicates if service.name in seen else seen).add(service.name)
+        if duplicates:
+            raise ValueError(f"duplicate service names: {', '.join(sorted(duplicates))}")
+        return self
+
+
+class FleetSyncResult(BaseModel):
+    created: int
+    updated: int
+    deleted: int
+    unchanged: int
+    dry_run: bool
 
 
 class ServiceRead(ServiceCreate):
     id: int
+    effective_interval_seconds: float
 
     class Config:
         from_attributes = True
 
 
+class PhaseTimings(BaseModel):
+    """Probe time per phase in ms; dns/connect/tls are absent when a kept-alive connection was reused"""
+    dns: Optional[float] = None
+    connect: Optional[float] = None
+    tls: Optional[float] = None
+    ttfb: Optional[float] = None
+    transfer: Optional[float] = None
+
+
 class CheckRead(BaseModel):
     id: int
     service_id: int
@@ -40,6 +93,7 @@ class DetailedCheckRead(CheckRead):
     uptime_percent: Optional[float]
     throughput_rps: Optional[float]
     apdex_score: Optional[float]
+    phase_timings_ms: Optional[PhaseTimings] = None
 
     class Config:
         from_attributes = True
@@ -60,3 +114,67 @@ class ServiceMetricsSummary(BaseModel):
     apdex_score: float
     checks_count: int
     last_check_timestamp: datetime
+    phase_avg_ms: Optional[PhaseTimings] = None  # mean per phase over the checks that had it
+
+
+class LatencyPercentiles(BaseModel):
+    """Latency percentiles merged from rollup sketches"""
+    service_ids: List[int]
+    window_minutes: int
+    count: int
+    p50_ms: Optional[float]
+    p95_ms: Optional[float]
+    p99_ms: Optional[float]
+
+
+class RollupPoint(BaseModel):
+    """Check statistics for one rollup bucket"""
+    bucket_start: datetime
+    resolution: str
+    count: int
+    ok_count: int
+    warn_count: int
+    error_count: int
+    down_count: int
+    avg_response_time_ms: Optional[float]
+    min_response_time_ms: Optional[float]
+    max_response_time_ms: Optional[float]
+    p50_response_time_ms: Optional[float]
+    p95_response_time_ms: Optional[float]
+    p99_response_time_ms: Optional[float]
+    apdex_score: Optional[float]
+    phase_avg_ms: Optional[PhaseTimings] = None
+
+
+class ServiceSummary(ServiceRead):
+    """A service with its aggregated metrics (None until its first check)"""
+    metrics: Optional[ServiceMetricsSummary]
+
+
+class ServiceSummaryPage(BaseModel):
+    """One page of fleet-wide service summaries"""
+    total: int
+    limit: int
+    offset: int
+    items: List[ServiceSummary]
+
+
+class SloObjectiveStatus(BaseModel):
+    objective: str                              # availability or latency
+    target_percent: float
+    threshold_ms: Optional[float] = None        # latency objectives only
+    budget_remaining: Optional[float] = None    # fraction of the period's error budget left, negative once overspent
+    burn_rates: Dict[str, Optional[float]]      # window ("5m", "1h", ...) -> multiple of the sustainable burn rate
+    alerting: Optional[str] = None              # burn-rate rule ("1h/5m") breached, if any
+
+
+class ServiceSlo(BaseModel):
+    service_id: int
+    period_days: float
+    evaluated_at: datetime
+    objectives: List[SloObjectiveStatus]
+
+
+class ServiceSloPage(BaseModel):
+    total: int
+    items: List[ServiceSlo]
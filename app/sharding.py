@@ -0,0 +1,170 @@
+import bisect
+import hashlib
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Iterable, Optional, Set
+
+from .config import settings
+from .logging_config import logger
+from .metrics import SCHEDULER_NODES, SCHEDULER_SHARDS_OWNED
+
+NODES_KEY = "pulseatlas:scheduler:nodes"
+LEASE_KEY = "pulseatlas:scheduler:shard:{}"
+
+# renew / release a lease only while this node still holds it
+_RENEW_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[2])
+end
+return false
+"""
+_RELEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+def default_node_id() -> str:
+    return settings.SCHEDULER_NODE_ID or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def shard_for(service_id: int, shards: int = None) -> int:
+    return service_id % (shards or settings.SCHEDULER_SHARDS)
+
+
+class HashRing:
+    """Consistent-hash ring of node IDs with virtual nodes.
+
+    Adding or removing a node only moves the keys that node owned (or now
+    owns); everything else keeps its owner.
+    """
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = 64):
+        self.nodes = sorted(set(nodes))
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key) -> Optional[str]:
+        if not self._hashes:
+            return None
+        i = bisect.bisect(self._hashes, _hash(str(key))) % len(self._hashes)
+        return self._owners[i]
+
+
+class ShardCoordinator:
+    """Splits probing across scheduler nodes through Redis.
+
+    Service IDs map to a fixed number of shards; shards are assigned to the
+    live nodes by a consistent-hash ring. Every ``tick`` a node refreshes
+    its heartbeat in a sorted set, recomputes the ring from the nodes seen
+    within ``node_ttl``, releases shards that moved away and acquires or
+    renews a lease (``SET NX EX``) on each shard assigned to it, pipelining
+    the commands so a tick costs two round trips however many shards. A node
+    only probes services whose shard lease it holds, so a shard changes
+    hands only once the previous owner released it or its lease expired.
+    If Redis becomes unreachable, ownership lapses with the leases.
+    """
+
+    def __init__(self, redis, node_id: str = None, shards: int = None, node_ttl: float = None,
+                 lease_ttl: int = None, on_acquire: Callable[[Set[int]], None] = None):
+        self.redis = redis
+        self.node_id = node_id or default_node_id()
+        self.shards = shards or settings.SCHEDULER_SHARDS
+        self.node_ttl = node_ttl or settings.SCHEDULER_NODE_TTL_SECONDS
+        self.lease_ttl = lease_ttl or settings.SCHEDULER_LEASE_TTL_SECONDS
+        self.on_acquire = on_acquire
+        self.ring = HashRing([])
+        self._owned: frozenset = frozenset()
+        self._lease_deadline = 0.0
+        self._lock = threading.Lock()
+        register = getattr(redis, "register_script", None)
+        self._renew_script = register(_RENEW_LUA) if register else None
+        self._release_script = register(_RELEASE_LUA) if register else None
+
+    def _leases(self, release: list, renew: list, acquire: list) -> Set[int]:
+        """Release, renew and acquire shard leases in one pipelined round trip.
+
+        Returns the shards of ``renew`` and ``acquire`` now held.
+        """
+        r = self.redis
+        scripted = self._renew_script is not None
+        if not scripted and (release or renew):
+            # no scripting (the in-memory store): check ownership first
+            shards = release + renew
+            values = r.mget([LEASE_KEY.format(shard) for shard in shards])
+            mine = {shard for shard, value in zip(shards, values) if value == self.node_id}
+            release = [shard for shard in release if shard in mine]
+            renew = [shard for shard in renew if shard in mine]
+        with r.pipeline(transaction=False) as pipe:
+            for shard in release:
+                key = LEASE_KEY.format(shard)
+                if scripted:
+                    self._release_script(keys=[key], args=[self.node_id], client=pipe)
+                else:
+                    pipe.delete(key)
+            for shard in renew:
+                key = LEASE_KEY.format(shard)
+                if scripted:
+                    self._renew_script(keys=[key], args=[self.node_id, self.lease_ttl], client=pipe)
+                else:
+                    pipe.set(key, self.node_id, ex=self.lease_ttl)
+            for shard in acquire:
+                pipe.set(LEASE_KEY.format(shard), self.node_id, nx=True, ex=self.lease_ttl)
+            results = pipe.execute()
+        return {shard for shard, held in zip(renew + acquire, results[len(release):]) if held}
+
+    def tick(self, now: float = None) -> Set[int]:
+        """Heartbeat, rebalance and renew leases; returns newly acquired shards."""
+        started = time.monotonic()
+        now = time.time() if now is None else now
+        with self._lock:
+            with self.redis.pipeline(transaction=False) as pipe:
+                pipe.zadd(NODES_KEY, {self.node_id: now})
+                pipe.zremrangebyscore(NODES_KEY, "-inf", now - self.node_ttl)
+                pipe.zrangebyscore(NODES_KEY, now - self.node_ttl, "+inf")
+                nodes = pipe.execute()[-1]
+            if sorted(nodes) != self.ring.nodes:
+                self.ring = HashRing(nodes)
+                logger.info("scheduler.shards.rebalance", node_id=self.node_id, nodes=len(self.ring.nodes))
+            SCHEDULER_NODES.set(len(self.ring.nodes))
+
+            wanted = {s for s in range(self.shards) if self.ring.owner(s) == self.node_id}
+            owned = self._leases(
+                release=sorted(self._owned - wanted),
+                renew=sorted(wanted & self._owned),
+                acquire=sorted(wanted - self._owned),
+            )
+            acquired = owned - self._owned
+            self._owned = frozenset(owned)
+            # leases were (re)written no earlier than ``started``
+            self._lease_deadline = started + self.lease_ttl
+            SCHEDULER_SHARDS_OWNED.set(len(owned))
+        if acquired:
+            logger.info("scheduler.shards.acquired", node_id=self.node_id, shards=len(acquired), owned=len(owned))
+            if self.on_acquire:
+                self.on_acquire(acquired)
+        return acquired
+
+    def owns_shard(self, shard: int) -> bool:
+        return shard in self._owned and time.monotonic() < self._lease_deadline
+
+    def owns(self, service_id: int) -> bool:
+        return self.owns_shard(shard_for(service_id, self.shards))
+
+    def leave(self):
+        """Release every lease and drop out of the membership set."""
+        with self._lock:
+            self._leases(release=sorted(self._owned), renew=[], acquire=[])
+            self._owned = frozenset()
+            self.redis.zrem(NODES_KEY, self.node_id)
+        SCHEDULER_SHARDS_OWNED.set(0)
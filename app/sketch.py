@@ -0,0 +1,151 @@
+import math
+import struct
+from typing import Optional
+
+_HEADER = struct.Struct("<BdIQQddd")
+_BIN = struct.Struct("<iI")
+_FORMAT_VERSION = 1
+
+
+class DDSketch:
+    """Mergeable quantile sketch with bounded relative error (DDSketch).
+
+    Positive values are counted in logarithmically sized bins, so any
+    quantile is returned within ``relative_accuracy`` of the true value.
+    Two sketches with the same accuracy merge by adding bin counts, which is
+    what lets per-bucket sketches be combined into any window or service
+    group. When more than ``max_bins`` bins are in use, the lowest bins are
+    collapsed together, which only degrades accuracy for the smallest values.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.bins: dict = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        # midpoint of the bin (gamma^(i-1), gamma^i] in relative terms
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def add(self, value: float, count: int = 1):
+        if value < 0:
+            raise ValueError("DDSketch only accepts non-negative values")
+        if value == 0:
+            self.zero_count += count
+        else:
+            i = self._index(value)
+            self.bins[i] = self.bins.get(i, 0) + count
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def remove(self, value: float, count: int = 1):
+        """Take back ``value`` previously added, for sliding windows.
+
+        ``min`` and ``max`` only reset once the sketch is empty; until then
+        they remain bounds on the remaining values rather than exact.
+        """
+        if value == 0:
+            self.zero_count -= count
+        else:
+            i = self._index(value)
+            if i not in self.bins:
+                # collapsed into the lowest bin
+                i = min(self.bins)
+            self.bins[i] -= count
+            if self.bins[i] <= 0:
+                del self.bins[i]
+        self.count -= count
+        self.sum -= value * count
+        if not self.count:
+            self.sum = 0.0
+            self.min = math.inf
+            self.max = -math.inf
+
+    def _collapse(self):
+        keys = sorted(self.bins)
+        excess = len(keys) - self.max_bins
+        target = keys[excess]
+        self.bins[target] += sum(self.bins.pop(k) for k in keys[:excess])
+
+    def merge(self, other: "DDSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("cannot merge sketches with different relative accuracy")
+        for i, c in other.bins.items():
+            self.bins[i] = self.bins.get(i, 0) + c
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile ``q`` (0..1), using the nearest-rank convention
+        of the old sorted-list percentile helper."""
+        if not self.count:
+            return None
+        rank = min(int(self.count * q), self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for i in sorted(self.bins):
+            seen += self.bins[i]
+            if rank < seen:
+                return min(max(self._value(i), self.min), self.max)
+        return self.max
+
+    def count_at_most(self, value: float) -> int:
+        """Values ``<= value``, to within the bin containing ``value``."""
+        if value < 0:
+            return 0
+        if value == 0:
+            return self.zero_count
+        top = self._index(value)
+        return self.zero_count + sum(c for i, c in self.bins.items() if i <= top)
+
+    @property
+    def avg(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def to_bytes(self) -> bytes:
+        header = _HEADER.pack(
+            _FORMAT_VERSION, self.relative_accuracy, len(self.bins),
+            self.zero_count, self.count, self.sum,
+            self.min if self.count else 0.0, self.max if self.count else 0.0,
+        )
+        return header + b"".join(_BIN.pack(i, c) for i, c in self.bins.items())
+
+    @classmethod
+    def from_bytes(cls, data: bytes, max_bins: int = 2048) -> "DDSketch":
+        version, accuracy, n_bins, zero_count, count, total, lo, hi = _HEADER.unpack_from(data)
+        if version != _FORMAT_VERSION:
+            raise ValueError(f"unsupported sketch format version {version}")
+        sketch = cls(relative_accuracy=accuracy, max_bins=max_bins)
+        offset = _HEADER.size
+        for _ in range(n_bins):
+            i, c = _BIN.unpack_from(data, offset)
+            sketch.bins[i] = c
+            offset += _BIN.size
+        sketch.zero_count = zero_count
+        sketch.count = count
+        sketch.sum = total
+        if count:
+            sketch.min, sketch.max = lo, hi
+        return sketch
@@ -0,0 +1,487 @@
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .aggregator import FAILED_STATUSES, epoch_seconds
+from .config import settings
+from .logging_config import logger
+from .metrics import SLO_BURN_RATE, SLO_ERROR_BUDGET_REMAINING
+from .models import CheckRollupHour, CheckRollupMinute
+from .sketch import DDSketch
+
+OBJECTIVES = ("availability", "latency")
+# (longest window, bucket seconds): windows are summed from the coarsest
+# buckets that still keep them accurate to a few percent
+RESOLUTIONS = ((3600, 60), (12 * 3600, 600), (7 * 86400, 3600), (None, 86400))
+
+_TOTAL, _FAILED, _SLOW = range(3)
+_BAD = {"availability": _FAILED, "latency": _SLOW}
+_UNITS = {"m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(text: str) -> int:
+    """Seconds in a duration like ``5m``, ``6h`` or ``3d``."""
+    match = re.fullmatch(r"(\d+)([mhd])", text.strip())
+    if not match:
+        raise ValueError(f"invalid duration {text!r}: expected e.g. 5m, 6h or 3d")
+    return int(match.group(1)) * _UNITS[match.group(2)]
+
+
+def format_duration(seconds: int) -> str:
+    for unit in ("d", "h", "m"):
+        if seconds % _UNITS[unit] == 0:
+            return f"{seconds // _UNITS[unit]}{unit}"
+    return f"{seconds}s"
+
+
+@dataclass(frozen=True)
+class BurnRule:
+    """Fire when the budget burns at ``factor`` x the sustainable rate over both windows."""
+    long: int
+    short: int
+    factor: float
+
+    @property
+    def name(self) -> str:
+        return f"{format_duration(self.long)}/{format_duration(self.short)}"
+
+
+def parse_burn_rules(spec: str) -> List[BurnRule]:
+    """Rules from ``"1h/5m:14.4,6h/30m:6"``."""
+    rules = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        windows, _, factor = part.partition(":")
+        long, _, short = windows.partition("/")
+        if not factor or not short:
+            raise ValueError(f"invalid burn-rate rule {part!r}: expected long/short:factor")
+        rules.append(BurnRule(parse_duration(long), parse_duration(short), float(factor)))
+    return rules
+
+
+def _resolution(window: int) -> int:
+    for longest, resolution in RESOLUTIONS:
+        if longest is None or window <= longest:
+            return resolution
+
+
+class _Ring:
+    """Per-service (total, failed, slow) check counts in ``slots`` buckets of
+    ``resolution`` seconds, one column per service."""
+
+    def __init__(self, resolution: int, slots: int, capacity: int):
+        self.resolution = resolution
+        self.slots = slots
+        # 32 bits: a daily bucket overflows 16 at probe intervals under ~1.3s
+        self.counts = np.zeros((slots, capacity, 3), dtype=np.uint32)
+        self.buckets = np.full(slots, -1, dtype=np.int64)   # bucket number each slot holds
+
+    @property
+    def span(self) -> int:
+        return self.resolution * self.slots
+
+    def grow(self, capacity: int):
+        counts = np.zeros((self.slots, capacity, 3), dtype=self.counts.dtype)
+        counts[:, :self.counts.shape[1]] = self.counts
+        self.counts = counts
+
+    def clear(self, columns):
+        self.counts[:, columns] = 0
+
+    def add(self, ts: np.ndarray, columns: np.ndarray, values: np.ndarray):
+        buckets = (ts // self.resolution).astype(np.int64)
+        slots = buckets % self.slots
+        for bucket in np.unique(buckets):
+            slot = bucket % self.slots
+            if self.buckets[slot] < bucket:
+                self.counts[slot] = 0
+                self.buckets[slot] = bucket
+        # events older than the ring holds are dropped
+        keep = self.buckets[slots] == buckets
+        np.add.at(self.counts, (slots[keep], columns[keep]), values[keep].astype(self.counts.dtype))
+
+    def window(self, seconds: int, now: float) -> np.ndarray:
+        """Counts over the last ``seconds``, current bucket included, as (columns, 3)."""
+        current = int(now // self.resolution)
+        n = max(1, seconds // self.resolution)
+        held = (self.buckets > current - n) & (self.buckets <= current)
+        return self.counts[held].sum(axis=0, dtype=np.int64)
+
+
+@dataclass
+class SloReport:
+    """Error budgets and burn rates of every tracked service at one instant.
+
+    Arrays are aligned with ``service_ids``. Budgets are the fraction of the
+    SLO period's error budget left (negative once overspent) and burn rates
+    are multiples of the sustainable rate; both are NaN where a service has
+    no such objective or no checks.
+    """
+    evaluated_at: float
+    period_seconds: int
+    rules: List[BurnRule]
+    service_ids: np.ndarray
+    targets: Dict[str, np.ndarray]
+    thresholds_ms: np.ndarray
+    budget_remaining: Dict[str, np.ndarray]
+    burn_rates: Dict[str, Dict[int, np.ndarray]]
+    fired: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def firing(self, objective: str) -> np.ndarray:
+        """Index of the first rule each service breaches, -1 for none."""
+        fired = self.fired.get(objective)
+        if fired is None:
+            fired = self.fired[objective] = np.full(len(self.service_ids), -1)
+            burn = self.burn_rates[objective]
+            for i, rule in reversed(list(enumerate(self.rules))):
+                breached = (burn[rule.long] >= rule.factor) & (burn[rule.short] >= rule.factor)
+                fired[breached] = i
+        return fired
+
+    def position(self, service_id: int) -> Optional[int]:
+        found = np.flatnonzero(self.service_ids == service_id)
+        return int(found[0]) if len(found) else None
+
+    def worst_first(self) -> np.ndarray:
+        """Positions ordered by the smallest budget left over both objectives, services without checks last."""
+        budgets = np.fmin(*(self.budget_remaining[objective] for objective in OBJECTIVES))
+        return np.argsort(np.where(np.isnan(budgets), np.inf, budgets), kind="stable")
+
+    def service(self, i: int) -> dict:
+        """One service's SLO status, for the API."""
+        objectives = []
+        for objective in OBJECTIVES:
+            target = self.targets[objective][i]
+            if np.isnan(target):
+                continue
+            fired = self.firing(objective)[i]
+            objectives.append({
+                "objective": objective,
+                "target_percent": float(target),
+                "threshold_ms": float(self.thresholds_ms[i]) if objective == "latency" else None,
+                "budget_remaining": _finite(self.budget_remaining[objective][i]),
+                "burn_rates": {
+                    format_duration(window): _finite(values[i]) for window, values in self.burn_rates[objective].items()
+                },
+                "alerting": self.rules[fired].name if fired >= 0 else None,
+            })
+        return {
+            "service_id": int(self.service_ids[i]),
+            "period_days": self.period_seconds / 86400,
+            "evaluated_at": datetime.fromtimestamp(self.evaluated_at, tz=timezone.utc),
+            "objectives": objectives,
+        }
+
+
+def _finite(value) -> Optional[float]:
+    return float(value) if np.isfinite(value) else None
+
+
+class SloEngine:
+    """Fleet-wide SLO error budgets and multi-window burn rates.
+
+    Checks of services with an SLO are counted per service into rings of
+    per-minute, 10-minute, hourly and daily buckets, each only as long as
+    the windows (and the SLO period) it serves. ``evaluate`` folds in the
+    checks seen since the last call, then sums each window's slots for all
+    services at once and derives budgets and burn rates with array
+    arithmetic, with no per-service loop.
+    """
+
+    def __init__(self, rules: List[BurnRule] = None, period_days: int = None, capacity: int = 256):
+        self.rules = parse_burn_rules(settings.SLO_BURN_ALERTS) if rules is None else rules
+        self.period_seconds = (period_days or settings.SLO_PERIOD_DAYS) * 86400
+        self.windows = sorted({w for rule in self.rules for w in (rule.long, rule.short)})
+        if self.windows and self.windows[-1] > self.period_seconds:
+            raise ValueError("burn-rate windows cannot be longer than the SLO period")
+        self._rings: Dict[int, _Ring] = {}   # bucket seconds -> ring
+        for window in self.windows + [self.period_seconds]:
+            resolution = _resolution(window)
+            slots = -(-window // resolution)
+            ring = self._rings.get(resolution)
+            if ring is None or ring.slots < slots:
+                self._rings[resolution] = _Ring(resolution, slots, capacity)
+        self._columns: dict = {}   # service_id -> column
+        self._names: dict = {}     # service_id -> name, for metrics and alerts
+        self._free = list(range(capacity - 1, -1, -1))
+        self._ids = np.full(capacity, -1, dtype=np.int64)
+        self._targets = {objective: np.full(capacity, np.nan) for objective in OBJECTIVES}
+        self._thresholds = np.full(capacity, np.inf)
+        self._pending: list = []   # (ts, column, failed, response_time_ms)
+        self._firing: dict = {objective: set() for objective in OBJECTIVES}
+        self._exported: set = set()   # label tuples set on the SLO gauges
+        self.report: Optional[SloReport] = None
+        self._lock = threading.Lock()
+
+    @property
+    def service_ids(self) -> List[int]:
+        """Services being counted."""
+        return list(self._columns)
+
+    def _ring(self, window: int) -> _Ring:
+        return self._rings[_resolution(window)]
+
+    # -- services
+
+    def _column(self, service_id: int) -> int:
+        column = self._columns.get(service_id)
+        if column is not None:
+            return column
+        if not self._free:
+            capacity = len(self._ids)
+            self._free = list(range(capacity * 2 - 1, capacity - 1, -1))
+            self._ids = np.concatenate([self._ids, np.full(capacity, -1, dtype=np.int64)])
+            for objective in OBJECTIVES:
+                self._targets[objective] = np.concatenate([self._targets[objective], np.full(capacity, np.nan)])
+            self._thresholds = np.concatenate([self._thresholds, np.full(capacity, np.inf)])
+            for ring in self._rings.values():
+                ring.grow(capacity * 2)
+        column = self._columns[service_id] = self._free.pop()
+        self._ids[column] = service_id
+        return column
+
+    def track(self, services: Iterable):
+        """Pick up the objectives of ``services``; ones without any stop being counted."""
+        removed = []
+        with self._lock:
+            for service in services:
+                availability = service.slo_availability_target
+                latency = service.slo_latency_target
+                if availability is None and latency is None:
+                    removed.append(service.id)
+                    continue
+                column = self._column(service.id)
+                self._names[service.id] = service.name
+                self._targets["availability"][column] = np.nan if availability is None else availability
+                self._targets["latency"][column] = np.nan if latency is None else latency
+                self._thresholds[column] = service.slo_latency_threshold_ms or np.inf
+        if removed:
+            self.remove(removed)
+
+    def remove(self, service_ids: Iterable[int]):
+        with self._lock:
+            self._fold_locked()
+            for service_id in service_ids:
+                column = self._columns.pop(service_id, None)
+                if column is None:
+                    continue
+                self._names.pop(service_id, None)
+                self._ids[column] = -1
+                for objective in OBJECTIVES:
+                    self._targets[objective][column] = np.nan
+                    self._firing[objective].discard(service_id)
+                self._thresholds[column] = np.inf
+                for ring in self._rings.values():
+                    ring.clear(column)
+                self._free.append(column)
+
+    # -- checks
+
+    def observe(self, service_id: int, status: str, response_time_ms: Optional[float], ts: float = None):
+        column = self._columns.get(service_id)
+        if column is None:
+            return
+        ts = time.time() if ts is None else ts
+        failed = status in FAILED_STATUSES
+        with self._lock:
+            self._pending.append((ts, column, failed, np.nan if response_time_ms is None else response_time_ms))
+
+    def _add(self, ts: np.ndarray, columns: np.ndarray, values: np.ndarray):
+        for ring in self._rings.values():
+            ring.add(ts, columns, values)
+
+    def _fold_locked(self):
+        if not self._pending:
+            return
+        events = np.array(self._pending, dtype=np.float64)
+        self._pending = []
+        ts, columns, failed, response_time_ms = events.T
+        columns = columns.astype(np.intp)
+        failed = failed > 0
+        # NaN (no response time) never compares greater
+        slow = failed | (response_time_ms > self._thresholds[columns])
+        self._add(ts, columns, np.stack([np.ones_like(failed), failed, slow], axis=1))
+
+    def rebuild(self, db: Session, services: Iterable):
+        """Track ``services`` and reload their counts from the check rollups.
+
+        Slow OK checks are estimated from the rollup latency sketches, to
+        within the sketch's relative accuracy around the threshold.
+        """
+        services = list(services)
+        self.track(services)
+        with self._lock:
+            self._fold_locked()
+            columns = {s.id: self._columns[s.id] for s in services if s.id in self._columns}
+            thresholds = {sid: float(self._thresholds[col]) for sid, col in columns.items()}
+            for ring in self._rings.values():
+                ring.clear(list(columns.values()))
+        if not columns:
+            return
+        now = time.time()
+        rows = 0
+        for ring in self._rings.values():
+            model = CheckRollupMinute if ring.resolution < 3600 else CheckRollupHour
+            since = datetime.fromtimestamp(now - ring.span, tz=timezone.utc)
+            events = []
+            ids = list(columns)
+            for start in range(0, len(ids), 1000):
+                q = db.query(
+                    model.service_id, model.bucket_start, model.count,
+                    model.warn_count + model.error_count + model.down_count, model.sketch,
+                ).filter(model.service_id.in_(ids[start:start + 1000]), model.bucket_start >= since)
+                for service_id, bucket_start, count, failed, sketch in q.yield_per(5000):
+                    slow = failed
+                    threshold = thresholds[service_id]
+                    if sketch and threshold != np.inf:
+                        sketch = DDSketch.from_bytes(sketch)
+                        slow += sketch.count - sketch.count_at_most(threshold)
+                    events.append((epoch_seconds(bucket_start), columns[service_id], count, failed, slow))
+            if events:
+                events = np.array(events, dtype=np.float64)
+                with self._lock:
+                    ring.add(events[:, 0], events[:, 1].astype(np.intp), events[:, 2:])
+                rows += len(events)
+        logger.info("slo.rebuilt", services=len(columns), rollups=rows)
+
+    # -- snapshots
+
+    def _layout(self) -> np.ndarray:
+        return np.array([(ring.resolution, ring.slots) for ring in self._rings.values()], dtype=np.int64)
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """Ring counts of every tracked service and the firing alerts, for ``app.snapshot``."""
+        with self._lock:
+            self._fold_locked()
+            columns = np.array(list(self._columns.values()), dtype=np.intp)
+            arrays = {"id": np.array(list(self._columns), dtype=np.int64), "layout": self._layout()}
+            for ring in self._rings.values():
+                arrays[f"counts{ring.resolution}"] = ring.counts[:, columns]
+                arrays[f"buckets{ring.resolution}"] = ring.buckets.copy()
+            for objective in OBJECTIVES:
+                arrays[f"firing_{objective}"] = np.array(sorted(self._firing[objective]), dtype=np.int64)
+        return arrays
+
+    def restore(self, arrays: Dict[str, np.ndarray], service_ids: Iterable[int]) -> set:
+        """Load the counts of ``service_ids`` (already tracked) from ``snapshot()`` arrays.
+
+        Returns the services restored; none when the snapshot's rings were
+        laid out for other burn-rate windows or another SLO period.
+        """
+        layout = self._layout()
+        if arrays["layout"].shape != layout.shape or (arrays["layout"] != layout).any():
+            return set()
+        wanted = set(service_ids)
+        with self._lock:
+            self._fold_locked()
+            positions, columns = [], []
+            for i, service_id in enumerate(arrays["id"].tolist()):
+                column = self._columns.get(service_id)
+                if service_id in wanted and column is not None:
+                    positions.append(i)
+                    columns.append(column)
+            if not columns:
+                return set()
+            for ring in self._rings.values():
+                buckets = arrays[f"buckets{ring.resolution}"]
+                newer = buckets > ring.buckets
+                ring.counts[newer] = 0
+                ring.buckets[newer] = buckets[newer]
+                # slots the snapshot holds an older bucket for stay empty
+                held = np.flatnonzero(buckets == ring.buckets)
+                ring.clear(columns)
+                ring.counts[held[:, None], columns] = arrays[f"counts{ring.resolution}"][held][:, positions]
+            restored = {int(arrays["id"][i]) for i in positions}
+            for objective in OBJECTIVES:
+                self._firing[objective] |= restored.intersection(arrays[f"firing_{objective}"].tolist())
+        return restored
+
+    # -- evaluation
+
+    def evaluate(self, now: float = None) -> SloReport:
+        now = time.time() if now is None else now
+        with self._lock:
+            self._fold_locked()
+            in_use = self._ids >= 0
+            counts = {w: self._ring(w).window(w, now)[in_use] for w in self.windows}
+            period = self._ring(self.period_seconds).window(self.period_seconds, now)[in_use]
+            report = SloReport(
+                evaluated_at=now,
+                period_seconds=self.period_seconds,
+                rules=self.rules,
+                service_ids=self._ids[in_use],
+                targets={objective: self._targets[objective][in_use] for objective in OBJECTIVES},
+                thresholds_ms=self._thresholds[in_use],
+                budget_remaining={},
+                burn_rates={},
+            )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for objective in OBJECTIVES:
+                allowed = 1 - report.targets[objective] / 100
+                bad = _BAD[objective]
+
+                def burn(c):
+                    return c[:, bad] / c[:, _TOTAL] / allowed
+
+                report.budget_remaining[objective] = 1 - burn(period)
+                report.burn_rates[objective] = {w: burn(counts[w]) for w in self.windows}
+                report.firing(objective)
+        self.report = report
+        return report
+
+    def publish(self, report: SloReport):
+        """Set the SLO gauges; services that lost a value lose their series."""
+        exported = set()
+
+        def export(gauge, values: np.ndarray, labels: dict):
+            for i in np.flatnonzero(np.isfinite(values)):
+                name = self._names.get(int(report.service_ids[i]))
+                if name is not None:
+                    key = (gauge, name, *labels.values())
+                    gauge.labels(service=name, **labels).set(float(values[i]))
+                    exported.add(key)
+
+        for objective in OBJECTIVES:
+            export(SLO_ERROR_BUDGET_REMAINING, report.budget_remaining[objective], {"objective": objective})
+            for window, values in report.burn_rates[objective].items():
+                export(SLO_BURN_RATE, values, {"objective": objective, "window": format_duration(window)})
+        for gauge, *labels in self._exported - exported:
+            try:
+                gauge.remove(*labels)
+            except KeyError:
+                pass
+        self._exported = exported
+
+    def alert(self, report: SloReport, dispatcher):
+        """Fire burn-rate alerts for services breaching a rule, and resolve
+        the ones that stopped."""
+        for objective in OBJECTIVES:
+            fired = report.firing(objective)
+            firing = set()
+            for i in np.flatnonzero(fired >= 0):
+                service_id = int(report.service_ids[i])
+                firing.add(service_id)
+                if service_id in self._firing[objective]:
+                    continue
+                rule = report.rules[fired[i]]
+                name = self._names.get(service_id, service_id)
+                dispatcher.fire(service_id, (
+                    f"Service {name} SLO alert: {objective} error budget burning "
+                    f"{report.burn_rates[objective][rule.short][i]:.1f}x over {rule.name} "
+                    f"(target {report.targets[objective][i]:g}%, "
+                    f"{report.budget_remaining[objective][i]:.0%} of the "
+                    f"{format_duration(report.period_seconds)} budget left)"
+                ), kind=f"slo_{objective}")
+            for service_id in self._firing[objective] - firing:
+                name = self._names.get(service_id, service_id)
+                dispatcher.resolve(service_id, f"Service {name} {objective} SLO burn rate back to normal",
+                                   kind=f"slo_{objective}")
+            self._firing[objective] = firing
+
+
+slo_engine = SloEngine()
@@ -0,0 +1,119 @@
+import mmap
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+from .logging_config import logger
+
+# File layout: header, section directory, then each section's array bytes
+# (8-byte aligned). Every section carries its own CRC32.
+_MAGIC = b"PASNAP\x00\x00"
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sHdI")           # magic, version, created_at, sections
+_SECTION = struct.Struct("<32s8sB3QQQI")    # name, dtype, ndim, shape, offset, nbytes, crc32
+_ALIGN = 8
+
+
+class Snapshot:
+    """A loaded snapshot: named arrays backed by a read-only memory map."""
+
+    def __init__(self, created_at: float, arrays: Dict[str, np.ndarray], mm: Optional[mmap.mmap] = None):
+        self.created_at = created_at
+        self.arrays = arrays
+        self._mm = mm   # keeps the arrays' memory mapped
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.arrays
+
+    def section(self, prefix: str) -> Dict[str, np.ndarray]:
+        """Arrays named ``prefix.*``, keyed without the prefix."""
+        start = len(prefix) + 1
+        return {name[start:]: a for name, a in self.arrays.items() if name.startswith(prefix + ".")}
+
+
+def fingerprint(service) -> int:
+    """CRC32 of the service settings a snapshot's state depends on."""
+    fields = (
+        service.url, service.interval_seconds, service.timeout_seconds, service.adaptive,
+        service.min_interval_seconds, service.max_interval_seconds,
+        service.slo_availability_target, service.slo_latency_target, service.slo_latency_threshold_ms,
+    )
+    return zlib.crc32(repr(fields).encode("utf-8"))
+
+
+def write_snapshot(path, arrays: Dict[str, np.ndarray], created_at: float = None):
+    """Write ``arrays`` to ``path`` atomically: a temporary file in the same
+    directory, fsynced, then renamed over the old snapshot."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    created_at = time.time() if created_at is None else created_at
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    offset = _HEADER.size + _SECTION.size * len(arrays)
+    directory, payloads = [], []
+    for name, a in arrays.items():
+        if a.ndim > 3:
+            raise ValueError(f"snapshot section {name} has more than 3 dimensions")
+        offset += -offset % _ALIGN
+        data = a.tobytes()
+        shape = tuple(a.shape) + (0,) * (3 - a.ndim)
+        directory.append(_SECTION.pack(
+            name.encode("utf-8"), a.dtype.str.encode("ascii"), a.ndim, *shape, offset, len(data), zlib.crc32(data),
+        ))
+        payloads.append((offset, data))
+        offset += len(data)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, created_at, len(arrays)))
+            f.write(b"".join(directory))
+            for start, data in payloads:
+                f.write(b"\0" * (start - f.tell()))
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    dir_fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def read_snapshot(path) -> Optional[Snapshot]:
+    """Memory-map a snapshot; None if it is missing, truncated or corrupt."""
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):   # ValueError: empty file
+        return None
+    try:
+        magic, version, created_at, count = _HEADER.unpack_from(mm)
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            raise ValueError(f"not a version {_FORMAT_VERSION} snapshot")
+        arrays = {}
+        for i in range(count):
+            name, dtype, ndim, *rest = _SECTION.unpack_from(mm, _HEADER.size + i * _SECTION.size)
+            name = name.rstrip(b"\0").decode("utf-8")
+            shape, (offset, nbytes, crc) = tuple(rest[:ndim]), rest[3:]
+            if offset + nbytes > len(mm) or zlib.crc32(mm[offset:offset + nbytes]) != crc:
+                raise ValueError(f"section {name} is corrupt")
+            dtype = np.dtype(dtype.rstrip(b"\0").decode("ascii"))
+            arrays[name] = np.frombuffer(
+                mm, dtype=dtype, count=nbytes // dtype.itemsize, offset=offset,
+            ).reshape(shape)
+    except (struct.error, ValueError, TypeError) as exc:
+        logger.warning("snapshot.unreadable", path=str(path), exc=str(exc))
+        mm.close()
+        return None
+    return Snapshot(created_at, arrays, mm)
@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+from typing import BinaryIO, Callable, List, Optional
+
+
+class DiskSpool:
+    """Bounded append-only spool of JSON records in a local file.
+
+    Records are appended one per line and replayed oldest first. Once the
+    file reaches ``max_bytes`` new records are refused rather than evicting
+    older ones, so whatever is replayed is always a gap-free prefix of what
+    was spooled.
+
+    The file stays open for appending. Writes reach the OS at once but are
+    only fsynced every ``sync_every`` records or when ``sync`` is called (the
+    Kafka flusher does so on its interval), so a machine crash can lose the
+    records appended since the last sync.
+    """
+
+    def __init__(self, path: str, max_bytes: int, sync_every: int = 1000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.sync_every = sync_every
+        self._lock = threading.Lock()
+        self._file: Optional[BinaryIO] = None
+        self._unsynced = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._size = os.path.getsize(path) if os.path.exists(path) else 0
+        if self._size:
+            self._truncate_partial_tail()
+
+    def _truncate_partial_tail(self):
+        # a crash mid-append can leave a line without its newline
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end != len(data):
+                f.truncate(end)
+        self._size = os.path.getsize(self.path)
+
+    @property
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def append(self, record: dict) -> bool:
+        """Append a record; returns False if the spool is full."""
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            if self._size + len(line) > self.max_bytes:
+                return False
+            if self._file is None:
+                self._file = open(self.path, "ab")
+            self._file.write(line)
+            self._file.flush()
+            self._size += len(line)
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every:
+                self._sync_locked()
+            return True
+
+    def _sync_locked(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def sync(self):
+        """fsync records appended since the last sync."""
+        with self._lock:
+            self._sync_locked()
+
+    def close(self):
+        with self._lock:
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _read_chunk(self, offset: int, limit: int) -> List[bytes]:
+        lines = []
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                lines.append(line)
+                if len(lines) >= limit:
+                    break
+        return lines
+
+    def _compact(self, offset: int):
+        # drop the first ``offset`` bytes (already delivered); the append
+        # handle would keep writing to the replaced file, so reopen it after
+        self._sync_locked()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        tmp = self.path + ".tmp"
+        with open(self.path, "rb") as src, open(tmp, "wb") as dst:
+            src.seek(offset)
+            while True:
+                block = src.read(1 << 20)
+                if not block:
+                    break
+                dst.write(block)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp, self.path)
+        self._size = os.path.getsize(self.path)
+
+    def replay(self, send_batch: Callable[[List[dict]], int], batch_size: int = 500) -> int:
+        """Replay spooled records in order.
+
+        ``send_batch`` receives up to ``batch_size`` records and returns how
+        many of them, from the front, were delivered. Replay stops at the
+        first batch that is not fully delivered; undelivered records stay
+        spooled. Appends may continue while a replay is running. Only one
+        replay may run at a time. Delivery is at-least-once: delivered records
+        are removed from the file when the replay ends, so a crash mid-replay
+        sends them again. Returns the number of records delivered.
+        """
+        offset = 0
+        delivered = 0
+        try:
+            while True:
+                with self._lock:
+                    if offset >= self._size:
+                        break
+                    chunk = self._read_chunk(offset, batch_size)
+                if not chunk:
+                    break
+                ok = send_batch([json.loads(line) for line in chunk])
+                offset += sum(len(line) for line in chunk[:ok])
+                delivered += ok
+                if ok < len(chunk):
+                    break
+        finally:
+            if offset:
+                with self._lock:
+                    self._compact(offset)
+        return delivered
@@ -0,0 +1,189 @@
+import math
+import threading
+import time
+import zlib
+from typing import Callable, Hashable, Iterable, List, Optional, Tuple
+
+from .logging_config import logger
+from .metrics import SCHEDULER_LAG_SECONDS, SCHEDULER_MISFIRES, SCHEDULER_WHEEL_ENTRIES
+
+
+PHASE_PERIOD = 86400.0
+
+
+def phase_offset(key: Hashable, interval: float) -> float:
+    """Deterministic offset in ``[0, interval)`` that spreads keys evenly.
+
+    The offset is a point in a fixed day-long period taken modulo the
+    interval, so a key's fire times line up across intervals that divide
+    each other (every 60s fire of a key is also one of its 30s fires).
+    """
+    return zlib.crc32(str(key).encode("utf-8")) / 2 ** 32 * PHASE_PERIOD % interval
+
+
+class _Entry:
+    __slots__ = ("key", "interval", "phase_key", "due", "tick", "cancelled")
+
+    def __init__(self, key, interval: float, phase_key, due: float):
+        self.key = key
+        self.interval = interval
+        self.phase_key = phase_key
+        self.due = due
+        self.tick = 0
+        self.cancelled = False
+
+
+class TimingWheel:
+    """Hierarchical timing wheel that fires each key once per interval.
+
+    Level 0 has ``slots`` buckets of one ``tick`` each; every level above
+    covers ``slots`` times the span of the one below and cascades its
+    buckets down as time reaches them, so scheduling and firing are O(1)
+    regardless of how many keys are registered. A key fires at
+    ``phase_offset(key) + n * interval`` (wall clock), which keeps services
+    created together out of lockstep and gives the same phases after a
+    restart. Keys scheduled with the same ``phase_key`` fire on the same
+    ticks instead. Due keys are handed to ``dispatch`` in batches; the delay
+    between a key's planned time and its dispatch is recorded as scheduling
+    lag.
+    """
+
+    def __init__(self, dispatch: Callable[[List[Hashable]], None], tick: float = 1.0, slots: int = 64,
+                 levels: int = 4, batch_size: int = 500, clock: Callable[[], float] = time.time):
+        self.dispatch = dispatch
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.batch_size = batch_size
+        self.clock = clock
+        self._wheels = [[[] for _ in range(slots)] for _ in range(levels)]
+        self._entries: dict = {}
+        self._current = math.ceil(clock() / tick)  # next tick to process
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._entries)
+
+    def _place(self, entry: _Entry):
+        entry.tick = max(math.ceil(entry.due / self.tick), self._current)
+        delta = entry.tick - self._current
+        span = self.slots
+        for level in range(self.levels):
+            if delta < span or level == self.levels - 1:
+                target = min(entry.tick, self._current + span - 1)
+                self._wheels[level][(target // (span // self.slots)) % self.slots].append(entry)
+                return
+            span *= self.slots
+
+    def next_due(self, key: Hashable, interval: float, now: float) -> float:
+        """First phase-aligned fire time of ``key`` strictly after ``now``."""
+        phase = phase_offset(key, interval)
+        return phase + (math.floor((now - phase) / interval) + 1) * interval
+
+    def schedule(self, key: Hashable, interval: float, now: float = None, phase_key: Hashable = None):
+        """Add ``key``, or change its interval or phase key in place.
+
+        ``phase_key`` (default: the key itself) picks the phase.
+        """
+        self.schedule_many([(key, interval, phase_key)], now)
+
+    def schedule_many(self, entries: Iterable[Tuple[Hashable, float, Hashable]], now: float = None):
+        """``schedule`` for many ``(key, interval, phase_key)`` under one lock acquisition."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            for key, interval, phase_key in entries:
+                phase_key = key if phase_key is None else phase_key
+                old = self._entries.get(key)
+                if old is not None:
+                    if old.interval == interval and old.phase_key == phase_key:
+                        continue
+                    old.cancelled = True
+                entry = self._entries[key] = _Entry(key, interval, phase_key, self.next_due(phase_key, interval, now))
+                self._place(entry)
+            SCHEDULER_WHEEL_ENTRIES.set(len(self._entries))
+
+    def remove(self, key: Hashable):
+        self.remove_many([key])
+
+    def remove_many(self, keys: Iterable[Hashable]):
+        with self._lock:
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    entry.cancelled = True
+            SCHEDULER_WHEEL_ENTRIES.set(len(self._entries))
+
+    def _cascade(self, t: int):
+        span = 1
+        due = []
+        for level in range(1, self.levels):
+            span *= self.slots
+            if t % span:
+                break
+            due.append(level)
+        # higher levels first, so their entries can cascade further this tick
+        for level in reversed(due):
+            span = self.slots ** level
+            bucket = self._wheels[level][(t // span) % self.slots]
+            self._wheels[level][(t // span) % self.slots] = []
+            for entry in bucket:
+                if not entry.cancelled:
+                    self._place(entry)
+
+    def advance(self, now: float = None) -> List[Hashable]:
+        """Fire every key due by ``now``; returns the dispatched keys."""
+        now = self.clock() if now is None else now
+        fired = []
+        with self._lock:
+            target = math.floor(now / self.tick)
+            while self._current <= target:
+                t = self._current
+                self._cascade(t)
+                bucket = self._wheels[0][t % self.slots]
+                self._wheels[0][t % self.slots] = []
+                self._current = t + 1
+                for entry in bucket:
+                    if entry.cancelled:
+                        continue
+                    fired.append(entry.key)
+                    SCHEDULER_LAG_SECONDS.observe(max(now - entry.due, 0.0))
+                    # keep the phase; skip whole intervals that were missed
+                    missed = max(math.floor((now - entry.due) / entry.interval), 0)
+                    if missed:
+                        SCHEDULER_MISFIRES.labels(source="wheel").inc(missed)
+                    entry.due += (missed + 1) * entry.interval
+                    self._place(entry)
+        for i in range(0, len(fired), self.batch_size):
+            try:
+                self.dispatch(fired[i:i + self.batch_size])
+            except Exception:
+                logger.exception("scheduler.wheel.dispatch_failed", batch=len(fired[i:i + self.batch_size]))
+        return fired
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self.advance()
+            with self._lock:
+                wait = self._current * self.tick - self.clock()
+            self._stopping.wait(max(wait, 0.0))
+
+    def start(self):
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="timing-wheel", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,124 @@
+"""Probe worker: runs the scheduler and probe pipeline without the API.
+
+    python -m app.worker [--processes N] [--metrics-port PORT]
+
+With several processes the parent supervises one child per shard; child
+``i`` probes the services with ``id % N == i`` (nested inside the
+WORKER_SHARD_INDEX / WORKER_SHARD_COUNT split when several hosts run
+workers). Children write Prometheus metrics to PROMETHEUS_MULTIPROC_DIR and
+the parent serves the aggregate on ``--metrics-port``.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import time
+
+from prometheus_client import start_http_server
+
+from .config import settings
+from .logging_config import configure_logging, logger
+
+RESTART_BACKOFF_SECONDS = 5.0
+
+
+def _wait_for_signal():
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+    stop.wait()
+
+
+def run_shard(shard_index: int, shard_count: int):
+    """Probe one static shard of services until SIGTERM/SIGINT."""
+    from .database import run_migrations
+    from .scheduler import _shutdown, start_scheduler
+
+    settings.WORKER_SHARD_INDEX = shard_index
+    settings.WORKER_SHARD_COUNT = shard_count
+    configure_logging()
+    try:
+        run_migrations()
+    except Exception as exc:
+        logger.warning("worker.db_init_failed", exc=str(exc))
+    start_scheduler()
+    logger.info("worker.started", pid=os.getpid(), shard=shard_index, shards=shard_count)
+    _wait_for_signal()
+    logger.info("worker.stopping", pid=os.getpid(), shard=shard_index)
+    _shutdown()
+
+
+def supervise(processes: int):
+    """Run ``processes`` shard children, restarting any that exit."""
+    from prometheus_client import multiprocess
+
+    ctx = multiprocessing.get_context("spawn")
+    base_index, base_count = settings.WORKER_SHARD_INDEX, settings.WORKER_SHARD_COUNT
+    shard_count = base_count * processes
+    stopping = threading.Event()
+
+    def spawn(i: int):
+        proc = ctx.Process(
+            target=run_shard, args=(base_index + i * base_count, shard_count), name=f"probe-worker-{i}",
+        )
+        proc.start()
+        return proc
+
+    children = {i: spawn(i) for i in range(processes)}
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stopping.set())
+
+    while not stopping.wait(1.0):
+        for i, proc in children.items():
+            if proc.is_alive():
+                continue
+            multiprocess.mark_process_dead(proc.pid)
+            logger.error("worker.child_exited", child=i, pid=proc.pid, exitcode=proc.exitcode)
+            if stopping.wait(RESTART_BACKOFF_SECONDS):
+                break
+            children[i] = spawn(i)
+
+    for proc in children.values():
+        if proc.is_alive():
+            proc.terminate()
+    deadline = time.monotonic() + 30
+    for proc in children.values():
+        proc.join(max(0.0, deadline - time.monotonic()))
+        if proc.is_alive():
+            proc.kill()
+        multiprocess.mark_process_dead(proc.pid)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.worker", description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=settings.WORKER_PROCESSES)
+    parser.add_argument("--metrics-port", type=int, default=settings.WORKER_METRICS_PORT,
+                        help="port for the Prometheus endpoint (0 disables it)")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    if args.processes > 1 and not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # children inherit this and write their metrics there
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="pulseatlas-metrics-")
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        # values left by a previous run would be summed into this one
+        os.makedirs(metrics_dir, exist_ok=True)
+        for name in os.listdir(metrics_dir):
+            if name.endswith(".db"):
+                os.remove(os.path.join(metrics_dir, name))
+    if args.metrics_port:
+        from .metrics import metrics_registry
+
+        start_http_server(args.metrics_port, registry=metrics_registry())
+
+    if args.processes > 1:
+        supervise(args.processes)
+    else:
+        run_shard(settings.WORKER_SHARD_INDEX, settings.WORKER_SHARD_COUNT)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@
 import { useEffect, useState } from 'react'
 import { Plus, Trash2, BarChart3, X } from 'lucide-react'
 import { motion, AnimatePresence } from 'framer-motion'
-import { getServices, createService, deleteService, getServiceMetricsSummary } from '@/lib/api'
+import { createService, deleteService, getServicesSummary, subscribeToChecks } from '@/lib/api'
 
 interface Service {
   id: number
@@ -29,6 +29,14 @@ interface ServiceMetrics {
   last_check_timestamp: string
 }
 
+interface ServiceSummary extends Service {
+  metrics: ServiceMetrics | null
+}
+
+const SUMMARY_PAGE_SIZE = 1000
+// 24h aggregates are reloaded at most this often, and only while checks arrive
+const SUMMARY_REFRESH_DEBOUNCE_MS = 30000
+
 export default function Dashboard() {
   const [services, setServices] = useState<Service[]>([])
   const [metrics, setMetrics] = useState<Record<number, ServiceMetrics>>({})
@@ -48,19 +56,22 @@ export default function Dashboard() {
 
   const fetchServices = async () => {
     try {
-      const data = await getServices()
-      setServices(data)
+      // One request per page of services, metrics included
+      const items: ServiceSummary[] = []
+      let total = 0
+      do {
+        const page = await getServicesSummary({ limit: SUMMARY_PAGE_SIZE, offset: items.length })
+        items.push(...page.items)
+        total = page.total
+        if (page.items.length === 0) break
+      } while (items.length < total)
 
-      // Fetch detailed metrics for each service
-      for (const service of data) {
-        try {
-          const metricsData = await getServiceMetricsSummary(service.id)
-          setMetrics((prev) => ({ ...prev, [service.id]: metricsData }))
-        } catch (error) {
-          // Service might not have any checks yet
-          console.debug(`No metrics for service ${service.id}`)
-        }
+      setServices(items)
+      const byId: Record<number, ServiceMetrics> = {}
+      for (const item of items) {
+        if (item.metrics) byId[item.id] = item.metrics
       }
+      setMetrics(byId)
     } catch (error) {
       console.error('Failed to fetch services:', error)
     } finally {
@@ -70,8 +81,41 @@ export default function Dashboard() {
 
   useEffect(() => {
     fetchServices()
-    const interval = setInterval(fetchServices, 10000) // Refresh every 10s
-    return () => clearInterval(interval)
+
+    let refreshTimer: ReturnType<typeof setTimeout> | null = null
+    const scheduleRefresh = () => {
+      if (refreshTimer) return
+      refreshTimer = setTimeout(() => {
+        refreshTimer = null
+        fetchServices()
+      }, SUMMARY_REFRESH_DEBOUNCE_MS)
+    }
+
+    // Live updates: status and last check time change as soon as a check lands
+    const unsubscribe = subscribeToChecks(
+      (event) => {
+        setMetrics((prev) => {
+          const m = prev[event.service_id]
+          if (!m) return prev
+          return {
+            ...prev,
+            [event.service_id]: {
+              ...m,
+              current_status: event.check.status,
+              last_check_timestamp: event.check.timestamp,
+              checks_count: m.checks_count + 1,
+            },
+          }
+        })
+        scheduleRefresh()
+      },
+      fetchServices, // resync after a dropped connection
+    )
+
+    return () => {
+      unsubscribe()
+      if (refreshTimer) clearTimeout(refreshTimer)
+    }
   }, [])
 
   const handleCreateService = async (e: React.FormEvent) => {
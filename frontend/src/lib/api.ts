@@ -43,6 +43,54 @@ export const getServiceMetricsSummary = async (id: number) => {
   return response.data
 }
 
+export const getServicesSummary = async (params: {
+  status?: string
+  name?: string
+  limit?: number
+  offset?: number
+} = {}) => {
+  const response = await api.get('/services/summary', { params })
+  return response.data
+}
+
+export interface CheckEvent {
+  service_id: number
+  check: {
+    service_id: number
+    timestamp: string
+    status: string
+    response_time_ms: number | null
+    error: string | null
+  }
+  window_minutes: number
+  summary: Record<string, number | null>
+}
+
+// Live check results over Server-Sent Events. EventSource reconnects on its
+// own; onReconnect fires after a reconnect so callers can reload what they missed.
+export const subscribeToChecks = (
+  onCheck: (event: CheckEvent) => void,
+  onReconnect?: () => void,
+  serviceIds?: number[],
+) => {
+  const params = new URLSearchParams()
+  serviceIds?.forEach((id) => params.append('service_id', String(id)))
+  const query = params.toString()
+  const source = new EventSource(`${API_URL}/services/stream${query ? `?${query}` : ''}`)
+  let hadError = false
+  source.addEventListener('check', (e) => onCheck(JSON.parse((e as MessageEvent).data)))
+  source.onerror = () => {
+    hadError = true
+  }
+  source.onopen = () => {
+    if (hadError) {
+      hadError = false
+      onReconnect?.()
+    }
+  }
+  return () => source.close()
+}
+
 export const getMetrics = async () => {
   const response = await api.get('/metrics')
   return response.data
@@ -0,0 +1,168 @@
+"""initial schema with a day-partitioned checks table
+
+Creates services, latency_sketches and checks. On Postgres, checks is
+range-partitioned by day on timestamp (primary key (id, timestamp)) with a
+(service_id, timestamp DESC) index, so retention can drop whole partitions.
+A checks_default partition takes rows no daily partition covers.
+
+Databases previously created with ``Base.metadata.create_all`` are adopted
+in place: existing tables are kept, and an unpartitioned checks table is
+converted. Rows inside the retention window are copied into the new
+partitions, and the old table is dropped.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+import os
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+CHECK_COLUMNS = (
+    "id, service_id, timestamp, status, response_time_ms, error, "
+    "latency_p50_ms, latency_p95_ms, latency_p99_ms, request_rate_rpm, "
+    "error_rate_percent, uptime_percent, throughput_rps, apdex_score"
+)
+
+# frozen copies of the settings of the same name, as of this revision
+CHECKS_RETENTION_DAYS = int(os.environ.get("CHECKS_RETENTION_DAYS", 30))
+CHECKS_PARTITION_PREMAKE_DAYS = int(os.environ.get("CHECKS_PARTITION_PREMAKE_DAYS", 3))
+
+
+def _create_services_and_sketches(existing: set) -> None:
+    if "services" not in existing:
+        op.create_table(
+            "services",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(255), nullable=False),
+            sa.Column("url", sa.Text(), nullable=False),
+            sa.Column("interval_seconds", sa.Integer(), nullable=False),
+            sa.Column("timeout_seconds", sa.Integer(), nullable=False),
+        )
+        op.create_index("ix_services_id", "services", ["id"])
+    if "latency_sketches" not in existing:
+        op.create_table(
+            "latency_sketches",
+            sa.Column("service_id", sa.Integer(), sa.ForeignKey("services.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("bucket_start", sa.DateTime(timezone=True), primary_key=True),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.Column("sketch", sa.LargeBinary(), nullable=False),
+        )
+
+
+def _upgrade_generic(existing: set) -> None:
+    if "checks" not in existing:
+        op.create_table(
+            "checks",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("service_id", sa.Integer(), sa.ForeignKey("services.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("status", sa.String(32), nullable=False),
+            sa.Column("response_time_ms", sa.Float()),
+            sa.Column("error", sa.Text()),
+            sa.Column("latency_p50_ms", sa.Float()),
+            sa.Column("latency_p95_ms", sa.Float()),
+            sa.Column("latency_p99_ms", sa.Float()),
+            sa.Column("request_rate_rpm", sa.Float()),
+            sa.Column("error_rate_percent", sa.Float()),
+            sa.Column("uptime_percent", sa.Float()),
+            sa.Column("throughput_rps", sa.Float()),
+            sa.Column("apdex_score", sa.Float()),
+        )
+    indexes = {ix["name"] for ix in sa.inspect(op.get_bind()).get_indexes("checks")}
+    if "ix_checks_service_id_timestamp" not in indexes:
+        op.create_index("ix_checks_service_id_timestamp", "checks", ["service_id", sa.text("timestamp DESC")])
+
+
+def _create_partitions(start, end) -> None:
+    op.execute("CREATE TABLE checks_default PARTITION OF checks DEFAULT")
+    day = start
+    while day <= end:
+        op.execute(
+            f"CREATE TABLE checks_p{day:%Y%m%d} PARTITION OF checks "
+            f"FOR VALUES FROM ('{day.isoformat()} 00:00:00+00') TO ('{(day + timedelta(days=1)).isoformat()} 00:00:00+00')"
+        )
+        day += timedelta(days=1)
+
+
+def _upgrade_postgres(existing: set) -> None:
+    conn = op.get_bind()
+    legacy = "checks" in existing
+    if legacy:
+        if conn.execute(sa.text(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = 'checks'"
+        )).scalar():
+            return
+        op.execute("ALTER TABLE checks RENAME TO checks_legacy")
+        op.execute("ALTER SEQUENCE IF EXISTS checks_id_seq OWNED BY NONE")
+        op.execute("ALTER INDEX IF EXISTS checks_pkey RENAME TO checks_legacy_pkey")
+        op.execute("DROP INDEX IF EXISTS ix_checks_id")
+    op.execute("CREATE SEQUENCE IF NOT EXISTS checks_id_seq")
+    op.execute("""
+        CREATE TABLE checks (
+            id INTEGER NOT NULL DEFAULT nextval('checks_id_seq'),
+            service_id INTEGER NOT NULL REFERENCES services(id) ON DELETE CASCADE,
+            timestamp TIMESTAMPTZ NOT NULL DEFAULT now(),
+            status VARCHAR(32) NOT NULL,
+            response_time_ms DOUBLE PRECISION,
+            error TEXT,
+            latency_p50_ms DOUBLE PRECISION,
+            latency_p95_ms DOUBLE PRECISION,
+            latency_p99_ms DOUBLE PRECISION,
+            request_rate_rpm DOUBLE PRECISION,
+            error_rate_percent DOUBLE PRECISION,
+            uptime_percent DOUBLE PRECISION,
+            throughput_rps DOUBLE PRECISION,
+            apdex_score DOUBLE PRECISION,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    op.execute("ALTER SEQUENCE checks_id_seq OWNED BY checks.id")
+    op.execute("CREATE INDEX ix_checks_service_id_timestamp ON checks (service_id, timestamp DESC)")
+
+    today = datetime.utcnow().date()
+    first_day = today - timedelta(days=1)
+    cutoff = datetime.utcnow() - timedelta(days=CHECKS_RETENTION_DAYS)
+    if legacy:
+        oldest = conn.execute(sa.text(
+            "SELECT min(timestamp) FROM checks_legacy WHERE timestamp >= :cutoff"
+        ), {"cutoff": cutoff}).scalar()
+        if oldest is not None:
+            first_day = min(oldest.date(), first_day)
+    _create_partitions(first_day, today + timedelta(days=CHECKS_PARTITION_PREMAKE_DAYS))
+
+    if legacy:
+        # NULL timestamps were possible before; they cannot be routed to a partition
+        op.execute(sa.text(
+            f"INSERT INTO checks ({CHECK_COLUMNS}) "
+            f"SELECT {CHECK_COLUMNS.replace('timestamp', 'COALESCE(timestamp, now())')} "
+            f"FROM checks_legacy WHERE COALESCE(timestamp, now()) >= :cutoff"
+        ).bindparams(cutoff=cutoff))
+        op.execute("SELECT setval('checks_id_seq', GREATEST((SELECT max(id) FROM checks_legacy), 1))")
+        op.execute("DROP TABLE checks_legacy")
+
+
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    _create_services_and_sketches(existing)
+    if op.get_bind().dialect.name == "postgresql":
+        _upgrade_postgres(existing)
+    else:
+        _upgrade_generic(existing)
+
+
+def downgrade() -> None:
+    op.drop_table("checks")
+    op.drop_table("latency_sketches")
+    op.drop_index("ix_services_id", table_name="services")
+    op.drop_table("services")
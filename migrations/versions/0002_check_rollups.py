@@ -0,0 +1,223 @@
+"""1-minute and 1-hour check rollups
+
+Replaces latency_sketches with check_rollups_1m / check_rollups_1h. Each
+row holds counts by status, latency sum/min/max, Apdex buckets and a DDSketch
+of OK response times. The rollups are backfilled from the raw checks
+still held in the checks table (1m rollups only for the last
+ROLLUP_MINUTE_RETENTION_DAYS).
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+import math
+import os
+import struct
+from datetime import datetime, timedelta, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 20000
+MINUTE, HOUR = 60, 3600
+# 1m rollups older than this would be deleted by the next retention run
+MINUTE_RETENTION_DAYS = int(os.environ.get("ROLLUP_MINUTE_RETENTION_DAYS", 3))
+SKETCH_RELATIVE_ACCURACY = float(os.environ.get("SKETCH_RELATIVE_ACCURACY", 0.01))
+APDEX_THRESHOLD_MS = 1000
+
+# the tables as of this revision
+checks = sa.table(
+    "checks",
+    sa.column("service_id", sa.Integer()),
+    sa.column("timestamp", sa.DateTime(timezone=True)),
+    sa.column("status", sa.String()),
+    sa.column("response_time_ms", sa.Float()),
+)
+ROLLUP_COLUMNS = (
+    ("service_id", sa.Integer()),
+    ("bucket_start", sa.DateTime(timezone=True)),
+    ("count", sa.Integer()),
+    ("ok_count", sa.Integer()),
+    ("warn_count", sa.Integer()),
+    ("error_count", sa.Integer()),
+    ("down_count", sa.Integer()),
+    ("latency_count", sa.Integer()),
+    ("latency_sum_ms", sa.Float()),
+    ("latency_min_ms", sa.Float()),
+    ("latency_max_ms", sa.Float()),
+    ("apdex_satisfied", sa.Integer()),
+    ("apdex_tolerating", sa.Integer()),
+    ("sketch", sa.LargeBinary()),
+)
+
+
+def _create_rollup_table(name: str) -> None:
+    op.create_table(
+        name,
+        sa.Column("service_id", sa.Integer(), sa.ForeignKey("services.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("bucket_start", sa.DateTime(timezone=True), primary_key=True),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("ok_count", sa.Integer(), nullable=False),
+        sa.Column("warn_count", sa.Integer(), nullable=False),
+        sa.Column("error_count", sa.Integer(), nullable=False),
+        sa.Column("down_count", sa.Integer(), nullable=False),
+        sa.Column("latency_count", sa.Integer(), nullable=False),
+        sa.Column("latency_sum_ms", sa.Float(), nullable=False),
+        sa.Column("latency_min_ms", sa.Float()),
+        sa.Column("latency_max_ms", sa.Float()),
+        sa.Column("apdex_satisfied", sa.Integer(), nullable=False),
+        sa.Column("apdex_tolerating", sa.Integer(), nullable=False),
+        sa.Column("sketch", sa.LargeBinary()),
+    )
+
+
+def _epoch(ts: datetime) -> float:
+    # naive timestamps (e.g. from SQLite) are stored as UTC
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class _Sketch:
+    """Write-only DDSketch in the version 1 serialization of app.sketch."""
+
+    HEADER = struct.Struct("<BdIQQddd")
+    BIN = struct.Struct("<iI")
+    MAX_BINS = 2048
+
+    def __init__(self):
+        gamma = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+        self.log_gamma = math.log(gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        if value == 0:
+            self.zero_count += 1
+        else:
+            i = math.ceil(math.log(value) / self.log_gamma)
+            self.bins[i] = self.bins.get(i, 0) + 1
+            if len(self.bins) > self.MAX_BINS:
+                keys = sorted(self.bins)
+                excess = len(keys) - self.MAX_BINS
+                self.bins[keys[excess]] += sum(self.bins.pop(k) for k in keys[:excess])
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def to_bytes(self) -> bytes:
+        header = self.HEADER.pack(
+            1, SKETCH_RELATIVE_ACCURACY, len(self.bins), self.zero_count, self.count, self.sum,
+            self.min if self.count else 0.0, self.max if self.count else 0.0,
+        )
+        return header + b"".join(self.BIN.pack(i, c) for i, c in self.bins.items())
+
+
+class _Bucket:
+    """Rollup row values of one service and bucket."""
+
+    def __init__(self, service_id: int, bucket_start: float):
+        self.key = (service_id, bucket_start)
+        self.values = dict(
+            service_id=service_id, bucket_start=datetime.fromtimestamp(bucket_start, tz=timezone.utc),
+            count=0, ok_count=0, warn_count=0, error_count=0, down_count=0, latency_count=0,
+            latency_sum_ms=0.0, latency_min_ms=None, latency_max_ms=None, apdex_satisfied=0, apdex_tolerating=0,
+        )
+        self.sketch = _Sketch()
+
+    def add(self, status: str, response_time_ms):
+        v = self.values
+        v["count"] += 1
+        if status in ("ok", "warn", "error", "down"):
+            v[f"{status}_count"] += 1
+        if response_time_ms is None:
+            return
+        v["latency_count"] += 1
+        v["latency_sum_ms"] += response_time_ms
+        for name, pick in (("latency_min_ms", min), ("latency_max_ms", max)):
+            v[name] = response_time_ms if v[name] is None else pick(v[name], response_time_ms)
+        if status == "ok" and response_time_ms >= 0:
+            self.sketch.add(response_time_ms)
+            if response_time_ms <= APDEX_THRESHOLD_MS:
+                v["apdex_satisfied"] += 1
+            elif response_time_ms <= 4 * APDEX_THRESHOLD_MS:
+                v["apdex_tolerating"] += 1
+
+    def row(self) -> dict:
+        return dict(self.values, sketch=self.sketch.to_bytes())
+
+
+def _backfill(conn) -> None:
+    """Roll up the raw checks, 1h buckets for all of them and 1m buckets for
+    the minute retention window.
+
+    Checks are streamed in (service_id, timestamp) order, so each bucket is
+    complete, and written, as soon as the next one starts.
+    """
+    tables = {
+        resolution: sa.table(name, *(sa.column(column, type_) for column, type_ in ROLLUP_COLUMNS))
+        for resolution, name in ((MINUTE, "check_rollups_1m"), (HOUR, "check_rollups_1h"))
+    }
+    pending = {resolution: [] for resolution in tables}
+    current = {}  # resolution -> open _Bucket
+
+    def write(resolution, force=False):
+        rows = pending[resolution]
+        if rows and (force or len(rows) >= BACKFILL_BATCH):
+            conn.execute(tables[resolution].insert(), rows)
+            pending[resolution] = []
+
+    minute_cutoff = (datetime.now(timezone.utc) - timedelta(days=MINUTE_RETENTION_DAYS)).timestamp()
+    result = conn.execution_options(stream_results=True).execute(
+        sa.select(checks.c.service_id, checks.c.timestamp, checks.c.status, checks.c.response_time_ms)
+        .where(checks.c.timestamp.isnot(None))
+        .order_by(checks.c.service_id, checks.c.timestamp)
+    )
+    for service_id, ts, status, response_time_ms in result:
+        epoch = _epoch(ts)
+        for resolution in tables:
+            if resolution == MINUTE and epoch < minute_cutoff:
+                continue
+            key = (service_id, epoch - epoch % resolution)
+            bucket = current.get(resolution)
+            if bucket is None or bucket.key != key:
+                if bucket is not None:
+                    pending[resolution].append(bucket.row())
+                    write(resolution)
+                bucket = current[resolution] = _Bucket(*key)
+            bucket.add(status, response_time_ms)
+    for resolution, bucket in current.items():
+        pending[resolution].append(bucket.row())
+    for resolution in tables:
+        write(resolution, force=True)
+
+
+def upgrade() -> None:
+    _create_rollup_table("check_rollups_1m")
+    _create_rollup_table("check_rollups_1h")
+    _backfill(op.get_bind())
+    op.drop_table("latency_sketches")
+
+
+def downgrade() -> None:
+    op.create_table(
+        "latency_sketches",
+        sa.Column("service_id", sa.Integer(), sa.ForeignKey("services.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("bucket_start", sa.DateTime(timezone=True), primary_key=True),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("sketch", sa.LargeBinary(), nullable=False),
+    )
+    op.drop_table("check_rollups_1h")
+    op.drop_table("check_rollups_1m")
@@ -0,0 +1,39 @@
+"""probe phase timings
+
+Adds checks.phase_timings (DNS/connect/TLS/TTFB/transfer of one probe, packed
+by app.phases) and phase_totals (per-phase sums and counts) to both rollup
+tables. Existing rows keep NULL: no phases were recorded for them.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+NEW_COLUMNS = (
+    ("checks", "phase_timings"),
+    ("check_rollups_1m", "phase_totals"),
+    ("check_rollups_1h", "phase_totals"),
+)
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for table, column in NEW_COLUMNS:
+        # tables adopted from create_all may already have it
+        if column not in {c["name"] for c in inspector.get_columns(table)}:
+            op.add_column(table, sa.Column(column, sa.LargeBinary()))
+
+
+def downgrade() -> None:
+    for table, column in NEW_COLUMNS:
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column(column)
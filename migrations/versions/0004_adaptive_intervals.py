@@ -0,0 +1,41 @@
+"""adaptive probe intervals
+
+Adds the adaptive settings, the priority used by the probe budget and the
+adaptive interval currently in effect to services. Existing services stay
+on their fixed interval.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+NEW_COLUMNS = (
+    sa.Column("adaptive", sa.Boolean(), nullable=False, server_default=sa.false()),
+    sa.Column("min_interval_seconds", sa.Integer()),
+    sa.Column("max_interval_seconds", sa.Integer()),
+    sa.Column("priority", sa.Integer(), nullable=False, server_default="0"),
+    sa.Column("current_interval_seconds", sa.Float()),
+)
+
+
+def upgrade() -> None:
+    existing = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("services")}
+    for column in NEW_COLUMNS:
+        # tables adopted from create_all may already have it
+        if column.name not in existing:
+            op.add_column("services", column)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("services") as batch:
+        for column in reversed(NEW_COLUMNS):
+            batch.drop_column(column.name)
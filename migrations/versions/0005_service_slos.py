@@ -0,0 +1,38 @@
+"""service SLO objectives
+
+Adds the availability and latency objectives the SLO engine computes error
+budgets and burn rates against. Existing services have none.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+NEW_COLUMNS = (
+    sa.Column("slo_availability_target", sa.Float()),
+    sa.Column("slo_latency_threshold_ms", sa.Float()),
+    sa.Column("slo_latency_target", sa.Float()),
+)
+
+
+def upgrade() -> None:
+    existing = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("services")}
+    for column in NEW_COLUMNS:
+        # tables adopted from create_all may already have it
+        if column.name not in existing:
+            op.add_column("services", column)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("services") as batch:
+        for column in reversed(NEW_COLUMNS):
+            batch.drop_column(column.name)
@@ -0,0 +1,433 @@
+"""Synthetic load benchmark for a single PulseAtlas node.
+
+Starts a fleet of stub HTTP targets in a child process, registers services
+through the API, runs the scheduler for a while and writes a JSON report
+(probes/sec, scheduling lag, time per pipeline stage, DB write throughput,
+API latency, memory per service):
+
+    python scripts/benchmark.py --services 5000 --duration 120 --output bench.json
+    python scripts/benchmark.py --services 5000 --compare bench.json
+
+Uses SQLite in a temporary directory unless --database-url points at a
+scratch Postgres, and always the in-memory Redis. Without a reachable Kafka
+broker, check events spool to the temporary directory.
+"""
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+# -- stub fleet (runs in its own process so it does not compete for the GIL)
+
+def _stub_address(i: int) -> str:
+    # one loopback address per stub, so each counts as its own host for the
+    # probe engine's per-host limit (Linux routes all of 127/8 to lo)
+    return f"127.0.{1 + i // 250}.{1 + i % 250}"
+
+
+def _stub_fleet(conn, hosts: int, latency_ms: float, latency_sigma: float, error_rate: float,
+                timeout_rate: float, hang_seconds: float, interval: float, seed: int):
+    rng = random.Random(seed)
+    last_seen = {}
+    jitter = []
+    served = {"ok": 0, "error": 0, "timeout": 0}
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                parts = request_line.split()
+                path = parts[1] if len(parts) > 1 else b"/"
+                now = time.monotonic()
+                previous = last_seen.get(path)
+                last_seen[path] = now
+                if previous is not None:
+                    jitter.append(abs(now - previous - interval))
+
+                roll = rng.random()
+                status = b"200 OK"
+                if roll < timeout_rate:
+                    served["timeout"] += 1
+                    await asyncio.sleep(hang_seconds)
+                else:
+                    await asyncio.sleep(rng.lognormvariate(math.log(latency_ms), latency_sigma) / 1000)
+                    if roll < timeout_rate + error_rate:
+                        served["error"] += 1
+                        status = b"500 Internal Server Error"
+                    else:
+                        served["ok"] += 1
+                writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Type: text/plain\r\nContent-Length: 2\r\n\r\nok")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def main():
+        servers = [await asyncio.start_server(handle, _stub_address(i), 0, backlog=4096) for i in range(hosts)]
+        conn.send(["%s:%d" % server.sockets[0].getsockname()[:2] for server in servers])
+        await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+        conn.send({"served": served, "arrival_jitter_seconds": _percentiles(sorted(jitter))})
+
+    asyncio.run(main())
+
+
+def start_stub_fleet(args):
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe()
+    proc = ctx.Process(
+        target=_stub_fleet, name="stub-fleet", daemon=True,
+        args=(child, args.stub_hosts, args.latency_ms, args.latency_sigma, args.error_rate,
+              args.timeout_rate, args.timeout_seconds + 1.0, max(5, args.interval), args.seed),
+    )
+    proc.start()
+    return proc, parent, parent.recv()
+
+
+# -- measurement helpers
+
+def _percentiles(values) -> dict:
+    if not values:
+        return {f"p{int(q * 100)}": None for q in QUANTILES}
+    return {f"p{int(q * 100)}": round(values[min(len(values) - 1, int(q * len(values)))], 4) for q in QUANTILES}
+
+
+def _histogram_quantiles(before: dict, after: dict) -> dict:
+    """Quantiles from the change in cumulative histogram buckets (as Prometheus' histogram_quantile)."""
+    bounds = sorted(after, key=float)
+    counts = [after[b] - before.get(b, 0.0) for b in bounds]
+    total = counts[-1] if counts else 0
+    result = {}
+    for q in QUANTILES:
+        value = None
+        if total:
+            rank, lower, below = q * total, 0.0, 0.0
+            for bound, count in zip(bounds, counts):
+                upper = float(bound)
+                if count >= rank:
+                    value = upper if math.isinf(upper) else lower + (upper - lower) * (rank - below) / max(count - below, 1e-9)
+                    break
+                lower, below = upper, count
+            if value is not None and math.isinf(value):
+                value = lower
+        result[f"p{int(q * 100)}"] = None if value is None else round(value, 4)
+    return result
+
+
+def _stage_means(before: dict, after: dict) -> dict:
+    means = {}
+    for stage, totals in sorted(after.items()):
+        count = totals.get("count", 0.0) - before.get(stage, {}).get("count", 0.0)
+        if count:
+            means[stage] = round((totals["sum"] - before.get(stage, {}).get("sum", 0.0)) / count * 1000, 3)
+    return means
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # peak rather than current RSS; bytes on macOS, KiB elsewhere
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _snapshot() -> dict:
+    from app.metrics import (
+        CHECKS_TOTAL, CHECK_WRITE_BATCH_SIZE, CHECK_WRITE_FLUSH_SECONDS, PIPELINE_STAGE_SECONDS, SCHEDULER_LAG_SECONDS,
+    )
+
+    def samples(metric):
+        return [s for family in metric.collect() for s in family.samples]
+
+    checks = {}
+    for s in samples(CHECKS_TOTAL):
+        if s.name.endswith("_total"):
+            checks[s.labels["status"]] = checks.get(s.labels["status"], 0.0) + s.value
+    snap = {"time": time.monotonic(), "checks": checks, "lag_buckets": {}}
+    for s in samples(SCHEDULER_LAG_SECONDS):
+        if s.name.endswith("_bucket"):
+            snap["lag_buckets"][s.labels["le"]] = s.value
+    snap["stages"] = {}
+    for s in samples(PIPELINE_STAGE_SECONDS):
+        if s.name.endswith("_sum") or s.name.endswith("_count"):
+            snap["stages"].setdefault(s.labels["stage"], {})[s.name.rsplit("_", 1)[1]] = s.value
+    for name, metric in (("batch", CHECK_WRITE_BATCH_SIZE), ("flush", CHECK_WRITE_FLUSH_SECONDS)):
+        for s in samples(metric):
+            if s.name.endswith("_sum") or s.name.endswith("_count"):
+                snap[f"{name}{s.name[s.name.rindex('_'):]}"] = s.value
+    return snap
+
+
+class ApiSampler(threading.Thread):
+    """Times GET /services and /services/{id}/metrics-summary while probes run."""
+
+    def __init__(self, base_url: str, service_ids: list, pause: float):
+        super().__init__(name="api-sampler", daemon=True)
+        import httpx
+
+        self.client = httpx.Client(base_url=base_url, timeout=60.0)
+        self.service_ids = service_ids
+        self.pause = pause
+        self.latencies = {"/services": [], "/services/{id}/metrics-summary": []}
+        self.errors = 0
+        self._done = threading.Event()
+
+    def run(self):
+        rng = random.Random(0)
+        while not self._done.is_set():
+            for endpoint, path in (
+                ("/services", "/services"),
+                ("/services/{id}/metrics-summary", f"/services/{rng.choice(self.service_ids)}/metrics-summary"),
+            ):
+                started = time.perf_counter()
+                try:
+                    ok = self.client.get(path).status_code == 200
+                except Exception:
+                    ok = False
+                if ok:
+                    self.latencies[endpoint].append(time.perf_counter() - started)
+                else:
+                    self.errors += 1
+            self._done.wait(self.pause)
+
+    def stop(self) -> dict:
+        self._done.set()
+        self.join()
+        self.client.close()
+        report = {"errors": self.errors}
+        for endpoint, values in self.latencies.items():
+            values.sort()
+            report[endpoint] = {"requests": len(values), **{
+                f"{k}_ms": None if v is None else round(v * 1000, 1) for k, v in _percentiles(values).items()
+            }}
+        return report
+
+
+# -- the run
+
+def start_api(port: int):
+    import uvicorn
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="api", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("API server failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def register_services(base_url: str, origins: list, args) -> tuple:
+    import httpx
+
+    def create(i: int) -> int:
+        resp = client.post("/services", json={
+            "name": f"bench-{i}",
+            "url": f"http://{origins[i % len(origins)]}/svc/{i}",
+            "interval_seconds": args.interval,
+            "timeout_seconds": args.timeout_seconds,
+        })
+        resp.raise_for_status()
+        return resp.json()["id"]
+
+    started = time.perf_counter()
+    with httpx.Client(base_url=base_url, timeout=60.0) as client, \
+            ThreadPoolExecutor(max_workers=args.register_concurrency) as pool:
+        ids = list(pool.map(create, range(args.services)))
+    return ids, time.perf_counter() - started
+
+
+def _free_port() -> int:
+    import socket
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="pulseatlas-bench-")
+    os.environ.update({
+        "DATABASE_URL": args.database_url or f"sqlite:///{workdir}/bench.db",
+        "REDIS_IN_MEMORY": "true",
+        "KAFKA_SPOOL_PATH": os.path.join(workdir, "kafka-events.jsonl"),
+        # the harness starts the scheduler itself once services are registered
+        "API_RUN_SCHEDULER": "false",
+    })
+    sys.path.insert(0, str(ROOT))
+    import logging
+
+    from sqlalchemy import func
+
+    from app.database import SessionLocal, engine, run_migrations
+    from app.logging_config import configure_logging
+    from app.models import Check, Service
+    from app.scheduler import start_scheduler, wheel
+
+    configure_logging()
+    logging.getLogger().setLevel(logging.WARNING)
+    # without a broker kafka-python logs every reconnect; the spool absorbs the events
+    logging.getLogger("kafka").setLevel(logging.CRITICAL)
+    run_migrations()
+    db = SessionLocal()
+    try:
+        if db.query(Service.id).first() is not None:
+            raise SystemExit("benchmark needs a scratch database without services")
+    finally:
+        db.close()
+
+    stub, stub_conn, origins = start_stub_fleet(args)
+    port = _free_port()
+    server, api_thread = start_api(port)
+    base_url = f"http://127.0.0.1:{port}"
+
+    service_ids, register_seconds = register_services(base_url, origins, args)
+    rss_before = _rss_bytes()
+    start_scheduler()
+    time.sleep(args.warmup)
+
+    before = _snapshot()
+    sampler = ApiSampler(base_url, service_ids, args.api_pause)
+    sampler.start()
+    time.sleep(args.duration)
+    after = _snapshot()
+    endpoints = sampler.stop()
+    rss_after = _rss_bytes()
+
+    wheel.stop()
+    stub_conn.send("report")
+    fleet = stub_conn.recv()
+    stub.terminate()
+    server.should_exit = True
+    api_thread.join(10)
+
+    elapsed = after["time"] - before["time"]
+    probes = {s: after["checks"].get(s, 0.0) - before["checks"].get(s, 0.0) for s in after["checks"]}
+    rows = after.get("batch_sum", 0.0) - before.get("batch_sum", 0.0)
+    batches = after.get("batch_count", 0.0) - before.get("batch_count", 0.0)
+    flush_seconds = after.get("flush_sum", 0.0) - before.get("flush_sum", 0.0)
+    db = SessionLocal()
+    try:
+        check_rows = db.query(func.count(Check.id)).scalar()
+    finally:
+        db.close()
+
+    return {
+        "benchmark": "pulseatlas-node",
+        "version": 1,
+        "commit": _commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "database": engine.dialect.name,
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "database_url")},
+        "results": {
+            "registration": {
+                "services": len(service_ids),
+                "seconds": round(register_seconds, 3),
+                "per_second": round(len(service_ids) / register_seconds, 1),
+            },
+            "probes": {
+                "per_second": round(sum(probes.values()) / elapsed, 1),
+                "expected_per_second": round(len(service_ids) / max(5, args.interval), 1),
+                "by_status": probes,
+            },
+            "pipeline_stage_mean_ms": _stage_means(before["stages"], after["stages"]),
+            "scheduler_lag_seconds": _histogram_quantiles(before["lag_buckets"], after["lag_buckets"]),
+            "probe_arrival_jitter_seconds": fleet["arrival_jitter_seconds"],
+            "db_writes": {
+                "rows_per_second": round(rows / elapsed, 1),
+                "mean_batch_rows": round(rows / batches, 1) if batches else None,
+                "mean_flush_ms": round(flush_seconds / batches * 1000, 3) if batches else None,
+                "check_rows_total": check_rows,
+            },
+            "endpoints": endpoints,
+            "memory": {
+                "rss_bytes": rss_after,
+                "bytes_per_service": round((rss_after - rss_before) / len(service_ids)),
+            },
+        },
+    }
+
+
+def _flatten(prefix: str, value, out: dict):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(f"{prefix}.{k}" if prefix else k, v, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+    return out
+
+
+def compare(baseline: dict, report: dict):
+    """Print each result next to the baseline's, with the relative change."""
+    old, new = _flatten("", baseline["results"], {}), _flatten("", report["results"], {})
+    print(f"compared with {baseline.get('commit') or 'baseline'}:", file=sys.stderr)
+    for key, value in new.items():
+        if key in old:
+            change = f"{(value - old[key]) / old[key]:+.1%}" if old[key] else "n/a"
+            print(f"  {key}: {old[key]} -> {value} ({change})", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--services", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=60.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=10.0, help="seconds to run before measuring")
+    parser.add_argument("--interval", type=int, default=30, help="service check interval (s)")
+    parser.add_argument("--timeout-seconds", type=int, default=2, help="service probe timeout (s)")
+    parser.add_argument("--stub-hosts", type=int, default=16, help="stub servers (distinct loopback hosts)")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="median stub latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal spread of stub latency")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="fraction of 500 responses")
+    parser.add_argument("--timeout-rate", type=float, default=0.01, help="fraction of requests that hang past the timeout")
+    parser.add_argument("--register-concurrency", type=int, default=8)
+    parser.add_argument("--api-pause", type=float, default=0.2, help="pause between API latency samples (s)")
+    parser.add_argument("--database-url", help="scratch database (default: SQLite in a temp dir)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,13 +8,13 @@ Run locally after DB is available (e.g., with docker-compose):
     python scripts/seed.py
 
 """
-from app.database import SessionLocal, engine
-from app.models import Base, Service
+from app.database import SessionLocal, run_migrations
+from app.models import Service
 
 
 def seed():
     # ensure tables exist
-    Base.metadata.create_all(bind=engine)
+    run_migrations()
     db = SessionLocal()
     try:
         if not db.query(Service).filter(Service.name == "test-api").first():
@@ -0,0 +1,64 @@
+"""Sync the services table with a declarative fleet manifest.
+
+    python scripts/sync_fleet.py fleet.yaml [--dry-run] [--keep-unlisted]
+
+The manifest (YAML or JSON) is a list of services, or a mapping with a
+``services`` list, each with the fields of ``POST /services``:
+
+    services:
+      - name: checkout-api
+        url: https://checkout.example.com/healthz
+        interval_seconds: 30
+      - name: search
+        url: https://search.example.com/ping
+        adaptive: true
+
+Services are matched by name: missing ones are created, changed ones
+updated and, unless --keep-unlisted, services not in the manifest deleted.
+Running schedulers pick the changes up on their next service sync
+(SCHEDULER_SYNC_SECONDS); POST /services/bulk applies a manifest through
+the API and reschedules at once.
+"""
+import argparse
+import sys
+import time
+
+from pydantic import ValidationError
+
+from app.cache import response_cache
+from app.database import SessionLocal, run_migrations
+from app.fleet import apply_fleet, diff_fleet, load_manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("manifest", help="YAML or JSON fleet manifest")
+    parser.add_argument("--dry-run", action="store_true", help="print the changes without applying them")
+    parser.add_argument("--keep-unlisted", action="store_true", help="do not delete services missing from the manifest")
+    parser.add_argument("--batch-size", type=int, help="rows per transaction (default: FLEET_SYNC_BATCH_SIZE)")
+    args = parser.parse_args(argv)
+
+    try:
+        specs = load_manifest(args.manifest)
+    except (OSError, ValueError, ValidationError) as exc:
+        sys.exit(f"invalid manifest {args.manifest}: {exc}")
+
+    run_migrations()
+    started = time.monotonic()
+    db = SessionLocal()
+    try:
+        fleet = diff_fleet(db, specs, prune=not args.keep_unlisted)
+        if not args.dry_run:
+            changed = apply_fleet(db, fleet, args.batch_size)
+            # reaches other replicas when RESPONSE_CACHE_REDIS is on
+            response_cache.invalidate_services([s.id for s in changed] + fleet.deletes, listing=True)
+    finally:
+        db.close()
+    print(
+        f"{'dry run' if args.dry_run else 'applied'}: create {len(fleet.creates)}, update {len(fleet.updates)}, "
+        f"delete {len(fleet.deletes)}, unchanged {fleet.unchanged} ({time.monotonic() - started:.2f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
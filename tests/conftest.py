@@ -0,0 +1,34 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    """A SQLite file with the schema created; a file so threads and aiosqlite see the same data."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(db_engine):
+    return sessionmaker(bind=db_engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def async_session_factory(db_engine):
+    """Async sessions on ``db_engine``'s database, as the API's dependencies hand out."""
+    async_engine = create_async_engine(str(db_engine.url).replace("sqlite:", "sqlite+aiosqlite:", 1))
+    return sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
@@ -0,0 +1,50 @@
+from app import scheduler
+from app.adaptive import IntervalController
+from app.alerts import TokenBucket
+from app.models import Service
+
+
+def _service(**kwargs):
+    values = dict(id=1, name="a", url="http://a", interval_seconds=60, timeout_seconds=10, adaptive=True, priority=0)
+    values.update(kwargs)
+    return Service(**values)
+
+
+def test_interval_snaps_down_on_degradation_and_backs_off_while_healthy():
+    controller = IntervalController(latency_jump_factor=2.0)
+    service = _service(min_interval_seconds=10, max_interval_seconds=200)
+    assert controller.interval(service) == 60
+
+    assert controller.observe(service, "error", 50.0) == 10
+    assert controller.degraded(1)
+    steps = [controller.observe(service, "ok", 100.0) for _ in range(6)]
+    assert steps == [20, 40, 80, 160, 200, None]
+    assert not controller.degraded(1)
+
+    # a response far slower than the latency average counts as degraded too
+    assert controller.observe(service, "ok", 450.0) == 10
+    assert controller.degraded(1)
+
+
+def test_fixed_services_keep_their_interval():
+    controller = IntervalController()
+    service = _service(adaptive=False, interval_seconds=2)
+    assert controller.interval(service) == 5  # SCHEDULER_MIN_INTERVAL_SECONDS
+    assert controller.observe(service, "down", None) is None
+    assert controller.degraded(1)
+
+
+def test_budget_serves_degraded_then_priority_and_coalesced_targets_ride_free(monkeypatch):
+    controller = IntervalController()
+    monkeypatch.setattr(scheduler, "intervals", controller)
+    monkeypatch.setattr(scheduler, "budget", TokenBucket(rate=1e-9, burst=3))
+    services = [
+        _service(id=1, adaptive=False, url="http://low"),
+        _service(id=2, adaptive=False, url="http://high", priority=5),
+        _service(id=3, adaptive=False, url="http://broken"),
+        _service(id=4, adaptive=False, url="http://high", priority=0),
+        _service(id=5, adaptive=False, url="http://mid", priority=1),
+    ]
+    controller.observe(services[2], "down", None)
+    admitted = scheduler._within_budget(services)
+    assert [s.id for s in admitted] == [3, 2, 5, 4]
@@ -0,0 +1,90 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.aggregator import WindowAggregator, EMPTY_METRICS
+from app.config import settings
+from app.models import Check, Service
+
+
+def _reference_metrics(samples, window_minutes):
+    """The original full-scan computation, used as an oracle."""
+    if not samples:
+        return dict(EMPTY_METRICS)
+    response_times = sorted(rt for status, rt in samples if rt is not None and status == "ok")
+
+    def percentile(data, p):
+        if not data:
+            return None
+        return data[min(int(len(data) * p / 100), len(data) - 1)]
+
+    total = len(samples)
+    failed = sum(1 for status, _ in samples if status in ("down", "error", "warn"))
+    satisfied = sum(1 for rt in response_times if rt <= 1000)
+    tolerating = sum(1 for rt in response_times if 1000 < rt <= 4000)
+    rpm = total / window_minutes
+    return {
+        "latency_p50_ms": percentile(response_times, 50),
+        "latency_p95_ms": percentile(response_times, 95),
+        "latency_p99_ms": percentile(response_times, 99),
+        "request_rate_rpm": rpm,
+        "error_rate_percent": failed / total * 100,
+        "uptime_percent": (total - failed) / total * 100,
+        "throughput_rps": rpm / 60,
+        "apdex_score": min((satisfied + tolerating / 2) / len(response_times), 1.0) if response_times else 0,
+    }
+
+
+def test_matches_full_scan_as_samples_expire():
+    rng = random.Random(7)
+    agg = WindowAggregator(window_minutes=1)
+    history = []
+    for i in range(500):
+        ts = 1000.0 + i * 0.5
+        status = rng.choice(["ok", "ok", "ok", "warn", "error", "down"])
+        rt = None if status == "down" else rng.uniform(10, 6000)
+        agg.observe(1, status, rt, ts=ts)
+        history.append((ts, status, rt))
+        window = [(s, r) for t, s, r in history if t >= ts - 60]
+        metrics, expected = agg.metrics(1, now=ts), _reference_metrics(window, 1)
+        for name in ("latency_p50_ms", "latency_p95_ms", "latency_p99_ms"):
+            value = metrics.pop(name)
+            assert value == pytest.approx(expected.pop(name), rel=settings.SKETCH_RELATIVE_ACCURACY)
+        assert metrics == expected
+
+
+def test_unknown_service_returns_empty_metrics():
+    assert WindowAggregator().metrics(42) == EMPTY_METRICS
+
+
+def test_rebuild_from_checks_table(db):
+    db.add(Service(id=1, name="svc", url="http://example.com"))
+    now = datetime.utcnow()
+    db.add_all([
+        Check(service_id=1, status="ok", response_time_ms=100.0, timestamp=now - timedelta(minutes=5)),
+        Check(service_id=1, status="error", response_time_ms=50.0, timestamp=now - timedelta(minutes=1)),
+        Check(service_id=1, status="ok", response_time_ms=900.0, timestamp=now - timedelta(hours=2)),
+    ])
+    db.commit()
+
+    agg = WindowAggregator(window_minutes=60)
+    agg.rebuild(db)
+    metrics = agg.metrics(1)
+    assert metrics["error_rate_percent"] == 50.0
+    assert metrics["latency_p50_ms"] == 100.0
+    assert metrics["request_rate_rpm"] == 2 / 60
+
+
+def test_rebuild_subset_keeps_other_windows(db):
+    db.add_all([Service(id=1, name="a", url="http://a"), Service(id=2, name="b", url="http://b")])
+    now = datetime.utcnow()
+    db.add(Check(service_id=1, status="ok", response_time_ms=100.0, timestamp=now - timedelta(minutes=1)))
+    db.commit()
+
+    agg = WindowAggregator(window_minutes=60)
+    agg.observe(1, "error", 10.0)
+    agg.observe(2, "ok", 20.0)
+    agg.rebuild(db, service_ids=[1])
+    assert agg.metrics(1)["error_rate_percent"] == 0.0
+    assert agg.metrics(2)["latency_p50_ms"] == 20.0
@@ -1,5 +1,7 @@
+import time
+
 import pytest
-from app.alerts import send_slack_alert
+from app.alerts import _retry_after, send_slack_alert
 
 
 def test_send_slack_alert_no_webhook(monkeypatch, caplog):
@@ -7,3 +9,131 @@ def test_send_slack_alert_no_webhook(monkeypatch, caplog):
     monkeypatch.setenv("ALERT_SLACK_WEBHOOK", "")
     # call - should quietly skip
     send_slack_alert("test message", service_id=123)
+
+
+def _dispatcher(monkeypatch, handler, **kwargs):
+    import httpx
+    from app import alerts
+    from app.redis_client import _InMemoryRedis
+
+    redis = _InMemoryRedis()
+    monkeypatch.setattr(alerts, "get_redis", lambda: redis)
+    options = dict(webhook="http://slack.test/hook", coalesce_seconds=0.2, digest_threshold=3,
+                   rate_per_second=100, burst=10)
+    options.update(kwargs)
+    return alerts.AlertDispatcher(transport=httpx.MockTransport(handler), **options)
+
+
+def test_simultaneous_alerts_are_sent_as_one_digest(monkeypatch):
+    import httpx
+
+    posted = []
+
+    def handler(request):
+        posted.append(request.read().decode())
+        return httpx.Response(200)
+
+    dispatcher = _dispatcher(monkeypatch, handler)
+    for service_id in range(200):
+        dispatcher.fire(service_id, f"Service s{service_id} alert: status=down")
+    # repeats while firing are deduplicated
+    dispatcher.fire(7, "Service s7 alert: status=down")
+    dispatcher.stop()
+
+    assert len(posted) == 1
+    assert "200 alerts firing" in posted[0]
+    assert "and 150 more" in posted[0]
+
+
+def test_resolve_notifies_only_firing_services(monkeypatch):
+    import httpx
+
+    posted = []
+
+    def handler(request):
+        posted.append(request.read().decode())
+        return httpx.Response(200)
+
+    dispatcher = _dispatcher(monkeypatch, handler, coalesce_seconds=0)
+    dispatcher.resolve(1, "Service a recovered")
+    dispatcher.fire(1, "Service a alert: status=down")
+    deadline = time.time() + 2
+    while (1, "check") not in dispatcher._firing and time.time() < deadline:
+        time.sleep(0.01)
+    dispatcher.resolve(1, "Service a recovered")
+    dispatcher.resolve(2, "Service b recovered")
+    dispatcher.stop()
+
+    assert len(posted) == 2
+    assert "status=down" in posted[0] and "a recovered" in posted[1]
+    assert dispatcher._firing == {}
+
+
+def test_retries_after_rate_limit(monkeypatch):
+    import httpx
+
+    responses = [httpx.Response(429, headers={"Retry-After": "0.05"}), httpx.Response(200)]
+    calls = []
+
+    def handler(request):
+        calls.append(1)
+        return responses.pop(0)
+
+    dispatcher = _dispatcher(monkeypatch, handler, coalesce_seconds=0)
+    dispatcher.fire(1, "Service a alert: status=down")
+    dispatcher.stop()
+    assert len(calls) == 2
+
+
+def test_token_bucket_paces_bursts():
+    from app.alerts import TokenBucket
+
+    now = [0.0]
+    bucket = TokenBucket(rate=2.0, burst=2, clock=lambda: now[0])
+    assert bucket.take() and bucket.take()
+    assert not bucket.take()
+    assert bucket.delay() == pytest.approx(0.5)
+    now[0] += 0.5
+    assert bucket.take()
+
+
+def test_dedupe_is_one_round_trip_per_batch(monkeypatch):
+    from app import alerts
+    from app.redis_client import _InMemoryRedis
+
+    dispatcher = alerts.AlertDispatcher(webhook="")
+    redis = _InMemoryRedis()
+    executed = []
+
+    def pipeline(transaction=True):
+        executed.append(transaction)
+        return _InMemoryRedis.pipeline(redis, transaction)
+
+    monkeypatch.setattr(redis, "pipeline", pipeline)
+    monkeypatch.setattr(alerts, "get_redis", lambda: redis)
+
+    batch = [alerts.Alert(service_id, f"s{service_id} down") for service_id in range(50)]
+    assert len(dispatcher._admit(batch)) == 50
+    assert dispatcher._admit(batch[:10]) == []   # still within ALERT_DEDUPE_SECONDS
+    resolved = dispatcher._admit([alerts.Alert(1, "s1 recovered", resolved=True)])
+    assert [a.service_id for a in resolved] == [1] and len(executed) == 2
+    assert redis.get(batch[1].dedupe_key) is not None
+
+
+def test_flapping_service_is_not_alerted_again_within_the_dedupe_window(monkeypatch):
+    from app import alerts
+    from app.redis_client import _InMemoryRedis
+
+    dispatcher = alerts.AlertDispatcher(webhook="")
+    monkeypatch.setattr(alerts, "get_redis", lambda redis=_InMemoryRedis(): redis)
+    down, up = alerts.Alert(1, "s1 down"), alerts.Alert(1, "s1 recovered", resolved=True)
+    assert dispatcher._admit([down]) == [down]
+    assert dispatcher._admit([up]) == [up]
+    assert dispatcher._admit([down]) == []   # suppressed, so not firing either
+    assert dispatcher._admit([up]) == []
+
+
+def test_retry_after_falls_back_to_a_second():
+    assert _retry_after("7") == 7.0
+    assert _retry_after("Wed, 21 Oct 2026 07:28:00 GMT") == 1.0
+    assert _retry_after(None) == _retry_after("nan") == 1.0
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+
+from app import cache as cache_module
+from app.cache import ResponseCache, service_scope
+from app.redis_client import _InMemoryRedis
+
+
+def _get(cache, scope, key, compute):
+    async def acompute():
+        return compute()
+    return asyncio.run(cache.aget_or_compute(scope, key, acompute))
+
+
+def test_async_misses_coalesce_onto_one_compute():
+    cache = ResponseCache(max_entries=10, ttl=60, use_redis=False)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"n": len(calls)}
+
+    async def run():
+        first = await asyncio.gather(*(cache.aget_or_compute("s", "k", compute) for _ in range(8)))
+        return first, await cache.aget_or_compute("s", "k", compute)
+
+    results, again = asyncio.run(run())
+    assert len(calls) == 1
+    assert len(set(results)) == 1 and again == results[0]
+
+
+def test_invalidation_is_per_scope():
+    cache = ResponseCache(max_entries=10, ttl=60, use_redis=False)
+    counter = iter(range(100))
+    get = lambda scope: _get(cache, scope, "k", lambda: next(counter))[1]  # noqa: E731
+
+    assert get(service_scope(1)) == b"0"
+    assert get(service_scope(2)) == b"1"
+    cache.invalidate_services([1])
+    assert get(service_scope(1)) == b"2"
+    assert get(service_scope(2)) == b"1"
+
+
+def test_errors_are_not_cached():
+    cache = ResponseCache(max_entries=10, ttl=60, use_redis=False)
+
+    def boom():
+        raise LookupError("missing")
+
+    with pytest.raises(LookupError):
+        _get(cache, "s", "k", boom)
+    assert _get(cache, "s", "k", lambda: 1)[1] == b"1"
+
+
+def test_lru_bound_and_ttl():
+    cache = ResponseCache(max_entries=2, ttl=0.05, use_redis=False)
+    for key in "abc":
+        _get(cache, "s", key, lambda: key)
+    assert len(cache._entries) == 2
+    time.sleep(0.06)
+    assert cache._local_get("s:0:b") is None
+
+
+def test_redis_tier_shares_entries_and_invalidations(monkeypatch):
+    redis = _InMemoryRedis()
+    monkeypatch.setattr(cache_module, "get_redis", lambda: redis)
+    api_a = ResponseCache(max_entries=10, ttl=60, use_redis=True)
+    api_b = ResponseCache(max_entries=10, ttl=60, use_redis=True)
+    writer = ResponseCache(max_entries=10, ttl=60, use_redis=True)
+
+    assert _get(api_a, service_scope(1), "k", lambda: "v1")[1] == b'"v1"'
+    assert _get(api_b, service_scope(1), "k", lambda: "unused")[1] == b'"v1"'
+    writer.invalidate_services([1])
+    assert _get(api_a, service_scope(1), "k", lambda: "v2")[1] == b'"v2"'
+
+
+def test_sub_second_ttl_reaches_redis(monkeypatch):
+    redis = _InMemoryRedis()
+    monkeypatch.setattr(cache_module, "get_redis", lambda: redis)
+    cache = ResponseCache(max_entries=10, ttl=0.05, use_redis=True)
+    _get(cache, "s", "k", lambda: 1)
+    assert redis.get(cache_module.ENTRY_KEY.format("s:0:k")) is not None
+    time.sleep(0.06)
+    assert redis.get(cache_module.ENTRY_KEY.format("s:0:k")) is None
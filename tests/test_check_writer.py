@@ -0,0 +1,68 @@
+import threading
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.check_writer import CheckWriter
+from app.models import Check, Service
+
+
+@pytest.fixture(autouse=True)
+def service(db):
+    db.add(Service(id=1, name="svc", url="http://example.com"))
+    db.commit()
+
+
+def _row(i):
+    return {"service_id": 1, "timestamp": datetime.now(timezone.utc), "status": "ok", "response_time_ms": float(i)}
+
+
+def test_flushes_in_batches_and_drains_on_stop(session_factory, mocker):
+    writer = CheckWriter(session_factory=session_factory, batch_size=10, flush_interval=60)
+    flush = mocker.spy(writer, "flush")
+    for i in range(25):
+        assert writer.submit(_row(i))
+    writer.stop()
+
+    assert [len(call.args[0]) for call in flush.call_args_list] == [10, 10, 5]
+    db = session_factory()
+    assert db.query(Check).count() == 25
+    db.close()
+
+
+def test_submit_drops_when_queue_is_full(session_factory):
+    writer = CheckWriter(session_factory=session_factory, max_queue=1, put_timeout=0.01)
+    writer.start = lambda: None  # no consumer, so the queue stays full
+    assert writer.submit(_row(1))
+    assert not writer.submit(_row(2))
+
+
+def test_rows_without_a_partition_are_dropped_without_orphan_lookup(session_factory, mocker):
+    writer = CheckWriter(session_factory=session_factory)
+    error = IntegrityError("INSERT", {}, Exception('no partition of relation "checks" found for row'))
+    mocker.patch.object(writer, "flush", side_effect=error)
+    drop_orphans = mocker.spy(writer, "_drop_orphans")
+    writer._flush_with_retry([_row(1), _row(2)])
+    assert drop_orphans.call_count == 0
+
+
+def test_failed_orphan_lookup_is_retried_and_committed_rows_are_not(session_factory, mocker):
+    writer = CheckWriter(session_factory=session_factory)
+    mocker.patch("app.check_writer.time.sleep")
+    error = IntegrityError("INSERT", {}, Exception("foreign key violation"))
+    flush = mocker.patch.object(writer, "flush", side_effect=[error, None])
+    mocker.patch.object(writer, "_drop_orphans", side_effect=OperationalError("SELECT", {}, Exception("gone")))
+    observe = mocker.patch("app.check_writer.rollups.observe_rows", side_effect=RuntimeError("boom"))
+    writer._flush_with_retry([_row(1)])
+    assert flush.call_count == 2 and observe.call_count == 1
+
+
+def test_start_replaces_a_dead_writer_thread(session_factory):
+    writer = CheckWriter(session_factory=session_factory)
+    writer._thread = threading.Thread(target=lambda: None)
+    writer._thread.start()
+    writer._thread.join()
+    writer.start()
+    assert writer._thread.is_alive()
+    writer.stop()
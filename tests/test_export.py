@@ -0,0 +1,72 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.export import EXPORT_COLUMNS, export_checks
+from app.main import _recent_checks
+from app.models import Check, Service
+from app.phases import pack_phases
+
+START = datetime(2026, 1, 1)
+
+
+def _export(engine, *args, **kwargs) -> list:
+    async def collect():
+        async_engine = create_async_engine(str(engine.url).replace("sqlite:", "sqlite+aiosqlite:", 1))
+        try:
+            return [chunk async for chunk in export_checks(async_engine, *args, **kwargs)]
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(collect())
+
+
+@pytest.fixture
+def engine(db_engine, db):
+    db.add_all([Service(id=1, name="a", url="http://a"), Service(id=2, name="b", url="http://b")])
+    # pairs of checks share a timestamp so the id breaks ties
+    db.add_all([
+        Check(id=i + 1, service_id=1, status="ok", response_time_ms=float(i), timestamp=START + timedelta(seconds=i // 2))
+        for i in range(25)
+    ])
+    db.add(Check(id=100, service_id=2, status="down", timestamp=START))
+    db.get(Check, 1).phase_timings = pack_phases({"dns": 1.5, "ttfb": 20.25})
+    db.commit()
+    return db_engine
+
+
+def test_keyset_pages_cover_history_once(engine, db):
+    seen, before = [], (None, None)
+    while True:
+        page = _recent_checks(db, 1, 4, *before).all()
+        if not page:
+            break
+        seen.extend(c.id for c in page)
+        before = (page[-1].timestamp, page[-1].id)
+    assert seen == list(range(25, 0, -1))
+
+
+def test_ndjson_and_csv_stream_in_chunks(engine):
+    chunks = _export(engine, 1, "ndjson", chunk_size=10)
+    assert len(chunks) == 3
+    rows = [json.loads(line) for chunk in chunks for line in chunk.decode().splitlines()]
+    assert [r["id"] for r in rows] == list(range(1, 26))
+    assert set(rows[0]) == set(EXPORT_COLUMNS)
+    assert (rows[0]["dns_ms"], rows[0]["tls_ms"], rows[0]["ttfb_ms"]) == (1.5, None, 20.25)
+
+    body = b"".join(_export(engine, 1, "csv", since=START + timedelta(seconds=10), chunk_size=10)).decode()
+    records = list(csv.DictReader(io.StringIO(body)))
+    assert [int(r["id"]) for r in records] == list(range(21, 26))
+
+
+def test_parquet_export_round_trips(engine):
+    pq = pytest.importorskip("pyarrow.parquet")
+    body = b"".join(_export(engine, 1, "parquet", chunk_size=10))
+    table = pq.read_table(io.BytesIO(body))
+    assert table.num_rows == 25
+    assert pq.ParquetFile(io.BytesIO(body)).num_row_groups == 3
+    assert table.column("id").to_pylist() == list(range(1, 26))
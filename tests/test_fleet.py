@@ -0,0 +1,80 @@
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from app import main, scheduler
+from app.cache import response_cache
+from app.fleet import apply_fleet, diff_fleet, load_manifest, parse_manifest
+from app.models import Service
+
+
+@pytest.fixture
+def db(db):
+    db.add_all([
+        Service(name="keep", url="http://keep/"),
+        Service(name="change", url="http://change/", interval_seconds=60),
+        Service(name="drop", url="http://drop/"),
+    ])
+    db.commit()
+    return db
+
+
+def _manifest(count: int = 0):
+    return parse_manifest({"services": [
+        {"name": "keep", "url": "http://keep/"},
+        {"name": "change", "url": "http://change/", "interval_seconds": 30},
+    ] + [{"name": f"new-{i}", "url": f"http://new-{i}/"} for i in range(count)]})
+
+
+def test_diff_and_apply_in_batches(db):
+    fleet = diff_fleet(db, _manifest(5), prune=True)
+    assert (len(fleet.creates), len(fleet.updates), fleet.unchanged) == (5, 1, 1)
+    assert fleet.deletes == [3]
+    changed = apply_fleet(db, fleet, batch_size=2)
+    assert sorted(s.name for s in changed) == ["change"] + [f"new-{i}" for i in range(5)]
+    assert db.query(Service).filter(Service.name == "change").one().interval_seconds == 30
+    assert db.query(Service).count() == 7
+    again = diff_fleet(db, _manifest(5), prune=True)
+    assert (again.creates, again.updates, again.deletes, again.unchanged) == ([], [], [], 7)
+
+
+def test_manifest_files_and_duplicate_names(tmp_path):
+    path = tmp_path / "fleet.yaml"
+    path.write_text("services:\n  - name: a\n    url: http://a\n    adaptive: true\n")
+    [spec] = load_manifest(path)
+    assert spec.adaptive and str(spec.url) == "http://a/"
+    with pytest.raises(ValidationError, match="duplicate service names: a"):
+        parse_manifest([{"name": "a", "url": "http://a"}, {"name": "a", "url": "http://b"}])
+
+
+def test_bulk_endpoint_updates_the_wheel_once(async_session_factory, monkeypatch):
+    async def get_db():
+        async with async_session_factory() as session:
+            yield session
+
+    batches = []
+    monkeypatch.setattr(scheduler.wheel, "schedule_many", lambda entries, now=None: batches.append(list(entries)))
+    monkeypatch.setattr(main.settings, "API_RUN_SCHEDULER", True)
+    response_cache.clear()
+    startup = list(main.app.router.on_startup)
+    main.app.router.on_startup.clear()
+    main.app.dependency_overrides[main.get_async_db] = get_db
+    main.app.dependency_overrides[main.get_read_db] = get_db
+    try:
+        client = TestClient(main.app)
+        services = [{"name": f"svc-{i}", "url": f"http://svc-{i}"} for i in range(50)]
+        preview = client.post("/services/bulk", json={"services": services, "dry_run": True}).json()
+        assert preview["created"] == 50 and client.get("/services").json() == []
+        result = client.post("/services/bulk", json={"services": services}).json()
+        assert (result["created"], result["dry_run"]) == (50, False)
+        assert len(batches) == 1 and len(batches[0]) == 50
+        assert len(client.get("/services").json()) == 50
+
+        result = client.post("/services/bulk", json={"services": services[:10], "prune": True}).json()
+        assert (result["created"], result["unchanged"], result["deleted"]) == (0, 10, 40)
+        assert len(client.get("/services").json()) == 10
+        duplicate = client.post("/services/bulk", json={"services": services[:1] * 2})
+        assert duplicate.status_code == 422
+    finally:
+        main.app.dependency_overrides.clear()
+        main.app.router.on_startup.extend(startup)
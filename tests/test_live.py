@@ -0,0 +1,72 @@
+import asyncio
+import json
+import threading
+
+from app.live import BroadcastHub
+
+
+def _event(payload: str) -> dict:
+    assert payload.startswith("event: check\ndata: ")
+    return json.loads(payload.split("data: ", 1)[1])
+
+
+def test_fans_out_events_published_from_other_threads():
+    hub = BroadcastHub(max_buffer=16, redis_fanout=False)
+    assert not hub.active   # nothing is serialized without clients
+
+    async def scenario():
+        everything = hub.subscribe()
+        only_two = hub.subscribe({2})
+        publisher = threading.Thread(target=lambda: [hub.publish(sid, {"n": sid}) for sid in (1, 2, 3)])
+        publisher.start()
+        publisher.join()
+        got_all = [_event(await everything.get(1.0))["n"] for _ in range(3)]
+        got_two = _event(await only_two.get(1.0))["n"]
+        assert await only_two.get(0.05) == ""
+        hub.unsubscribe(everything)
+        hub.unsubscribe(only_two)
+        return got_all, got_two
+
+    assert asyncio.run(scenario()) == ([1, 2, 3], 2)
+
+
+def test_drops_slow_consumers_without_blocking_others():
+    hub = BroadcastHub(max_buffer=4, redis_fanout=False)
+
+    async def scenario():
+        slow = hub.subscribe()
+        fast = hub.subscribe()
+        received = []
+        for i in range(10):
+            hub.publish(1, {"n": i})
+            await asyncio.sleep(0)
+            received.append(_event(await fast.get(1.0))["n"])
+        return slow, received
+
+    slow, received = asyncio.run(scenario())
+    assert received == list(range(10))
+    assert slow.dropped
+    assert hub._subs and all(slow not in subs for subs in hub._subs.values())
+
+
+def test_redis_fanout_is_off_with_the_in_memory_redis(monkeypatch):
+    from app import live
+    from app.redis_client import _InMemoryRedis
+
+    warnings = []
+    monkeypatch.setattr(live, "get_redis", lambda redis=_InMemoryRedis(): redis)
+    monkeypatch.setattr(live.logger, "warning", lambda event, **kw: warnings.append(event))
+    hub = BroadcastHub(max_buffer=16, redis_fanout=True)
+    assert not hub.active
+
+    async def scenario():
+        sub = hub.subscribe()
+        hub.publish(1, {"n": 1})
+        hub.publish(2, {"n": 2})
+        got = [_event(await sub.get(1.0))["n"] for _ in range(2)]
+        hub.unsubscribe(sub)
+        return got
+
+    assert asyncio.run(scenario()) == [1, 2]
+    assert hub._listener is None
+    assert warnings == ["live.redis_fanout_disabled"]
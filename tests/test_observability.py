@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app import main
+from app.cache import response_cache
+from app.config import settings
+from app.metrics import time_stage
+from app.models import Service
+from app.observability import format_collapsed, sample_stacks
+
+
+@pytest.fixture
+def client(db, async_session_factory):
+    async def get_db():
+        async with async_session_factory() as session:
+            yield session
+
+    db.add(Service(id=1, name="svc-1", url="http://svc-1"))
+    db.commit()
+    response_cache.clear()
+
+    startup = list(main.app.router.on_startup)
+    main.app.router.on_startup.clear()
+    main.app.dependency_overrides[main.get_read_db] = get_db
+    main.app.dependency_overrides[main.get_async_db] = get_db
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+    main.app.router.on_startup.extend(startup)
+
+
+def _requests(route: str, status: str) -> float:
+    return REGISTRY.get_sample_value(
+        "pulseatlas_api_request_seconds_count", {"method": "GET", "route": route, "status": status},
+    ) or 0.0
+
+
+def test_api_latency_is_labelled_by_route_template(client):
+    before = _requests("/services/{service_id}/checks", "200")
+    unmatched = _requests("unmatched", "404")
+    client.get("/services/1/checks")
+    client.get("/no/such/path")
+    assert _requests("/services/{service_id}/checks", "200") == before + 1
+    assert _requests("unmatched", "404") == unmatched + 1
+
+
+def test_time_stage_observes_the_block():
+    labels = {"stage": "test_stage"}
+    before = REGISTRY.get_sample_value("pulseatlas_pipeline_stage_seconds_count", labels) or 0.0
+    with time_stage("test_stage"):
+        pass
+    assert REGISTRY.get_sample_value("pulseatlas_pipeline_stage_seconds_count", labels) == before + 1
+
+
+def test_profiler_endpoint_is_gated(client, monkeypatch):
+    assert client.get("/admin/profile", params={"seconds": 0.01}).status_code == 404
+    monkeypatch.setattr(settings, "PROFILER_ENABLED", True)
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    assert client.get("/admin/profile", params={"seconds": 0.01}).status_code == 403
+    resp = client.get("/admin/profile", params={"seconds": 0.05, "interval_ms": 5},
+                      headers={"X-Admin-Token": "secret"})
+    assert resp.status_code == 200
+    assert resp.text.strip()
+
+
+def test_sample_stacks_sees_other_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=stop.wait, name="sleepy-worker")
+    worker.start()
+    try:
+        counts = sample_stacks(0.05, 0.005)
+    finally:
+        stop.set()
+        worker.join()
+    text = format_collapsed(counts)
+    line = next(line for line in text.splitlines() if line.startswith("sleepy-worker;"))
+    assert "threading.wait" in line
+    assert int(line.rsplit(" ", 1)[1]) >= 1
@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+
+from app.models import Service
+from app.phases import PhaseTotals, pack_phases, unpack_phases
+from app.rollups import HOUR, RollupStore
+
+
+def test_pack_round_trips_to_the_microsecond():
+    packed = pack_phases({"dns": 1.2345, "connect": 0.0, "ttfb": 250.5, "transfer": 3.0004})
+    assert len(packed) == 21
+    assert unpack_phases(packed) == {"dns": 1.234, "connect": 0.0, "tls": None, "ttfb": 250.5, "transfer": 3.0}
+    assert pack_phases(None) is None and unpack_phases(None) is None
+
+
+def test_rollups_average_each_phase_over_checks_that_had_it(db):
+    db.add(Service(id=1, name="a", url="http://a"))
+    db.commit()
+
+    base = 1_700_000_000 - 1_700_000_000 % HOUR
+    store = RollupStore()
+    store.observe(1, "ok", 60.0, ts=base + 10, phases_ms={"dns": 4.0, "connect": 2.0, "ttfb": 40.0, "transfer": 1.0})
+    store.flush(db)
+    # reused connection: no dns/connect; merged with the flushed row in a later bucket write
+    store.observe(1, "ok", 30.0, ts=base + 20, phases_ms={"ttfb": 20.0, "transfer": 3.0})
+    store.observe(1, "down", None, ts=base + 30)
+    store.flush(db)
+
+    stats = store.query(db, [1], datetime.fromtimestamp(base, tz=timezone.utc))
+    assert stats.phase_totals.means_ms() == {"dns": 4.0, "connect": 2.0, "tls": None, "ttfb": 30.0, "transfer": 2.0}
+    assert PhaseTotals.from_bytes(stats.phase_totals.to_bytes()).counts == [1, 1, 0, 2, 2]
+    assert store.new_stats().phase_totals.means_ms() is None
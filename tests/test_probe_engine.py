@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from app.probe_engine import ProbeEngine, _OriginPools, classify_status
+
+
+class _StatusHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        code = int(self.path.strip("/") or 200)
+        self.send_response(code)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+class _SlowHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+    requests = 0
+    active = 0
+    peak = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.requests += 1
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        time.sleep(0.2)
+        with cls.lock:
+            cls.active -= 1
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StatusHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture
+def engine():
+    e = ProbeEngine(max_concurrency=4, max_per_host=2)
+    yield e
+    e.stop()
+
+
+def test_classify_status():
+    assert classify_status(200) == "ok"
+    assert classify_status(404) == "warn"
+    assert classify_status(503) == "error"
+
+
+def test_probe_classifies_responses(stub_server, engine):
+    results = [engine.submit(f"{stub_server}/{code}", 2) for code in (200, 404, 500)]
+    assert [f.result().status for f in results] == ["ok", "warn", "error"]
+    assert all(f.result().response_time_ms >= 0 for f in results)
+
+
+def test_probe_reports_phase_timings(stub_server, engine):
+    first = engine.probe(f"{stub_server}/200", 2)
+    assert set(first.phases) == {"dns", "connect", "ttfb", "transfer"}
+    assert all(ms >= 0 for ms in first.phases.values())
+    assert sum(first.phases.values()) <= first.response_time_ms
+    # the kept-alive connection is reused, so there is nothing to resolve or connect
+    assert set(engine.probe(f"{stub_server}/200", 2).phases) == {"ttfb", "transfer"}
+
+
+def test_probe_unreachable_host_is_down(engine):
+    result = engine.probe("http://127.0.0.1:1/", 1)
+    assert result.status == "down"
+    assert result.response_time_ms is None
+    assert result.error
+
+
+def test_identical_targets_share_one_probe_and_hosts_get_at_most_max_per_host():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # a different port on the same host counts against the same limit
+    other = ThreadingHTTPServer(("127.0.0.1", 0), _SlowHandler)
+    threading.Thread(target=other.serve_forever, daemon=True).start()
+    engine = ProbeEngine(max_concurrency=50, max_per_host=3)
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        same = [engine.submit(f"{base}/health", 2) for _ in range(5)]
+        assert all(f is same[0] for f in same)
+        assert engine.submit(f"{base}/health", 3) is not same[0]
+        spread = [engine.submit(f"{base}/p{i}", 2) for i in range(6)]
+        spread += [engine.submit(f"http://127.0.0.1:{other.server_address[1]}/p{i}", 2) for i in range(6)]
+        assert all(f.result().status == "ok" for f in same + spread)
+        assert _SlowHandler.requests == 2 + 12
+        assert _SlowHandler.peak <= 3
+        assert len(engine._host_sems) == 0   # idle hosts don't keep a semaphore
+        # finished probes are not reused
+        assert engine.submit(f"{base}/health", 2) is not same[0]
+    finally:
+        engine.stop()
+        server.shutdown()
+        other.shutdown()
+
+
+def test_idle_origin_pools_are_closed(stub_server):
+    now = [0.0]
+    pools = _OriginPools(ProbeEngine()._transport, idle_expiry=60, clock=lambda: now[0])
+    # the same server under a second origin
+    other = stub_server.replace("127.0.0.1", "localhost")
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=pools) as client:
+            await client.get(f"{stub_server}/200")
+            now[0] += 30
+            await client.get(f"{other}/200")
+            assert len(pools._pools) == 2
+            now[0] += 45   # the first origin is now idle past the expiry
+            await client.get(f"{other}/200")
+            return [host for _, host, _ in pools._pools]
+
+    assert asyncio.run(scenario()) == ["localhost"]
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import redis_client
+from app.redis_client import _InMemoryRedis
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(redis_client, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_expired_keys_are_freed_without_being_read(clock):
+    redis = _InMemoryRedis()
+    for i in range(1000):
+        redis.set(f"dedupe:{i}", "1", nx=True, ex=300)
+    redis.set("kept", "1")
+    assert not redis.set("dedupe:7", "1", nx=True, ex=300)
+    assert redis.incr("dedupe:8") == 2   # keeps its TTL
+    clock[0] += 301
+    redis.set("other", "1")
+    assert len(redis) == 2 and redis.mget(["kept", "dedupe:8"]) == ["1", None]
+    # rewriting a key's TTL leaves stale heap entries, which get compacted
+    for _ in range(1000):
+        redis.set("lease", "node", ex=15)
+        clock[0] += 1
+    assert len(redis._expiry) < 200 and redis.get("lease") == "node"
+
+
+def test_least_recently_used_keys_are_evicted_past_max_bytes(clock):
+    redis = _InMemoryRedis(max_bytes=2000)
+    for i in range(10):
+        redis.set(f"k{i}", "x" * 100)
+        redis.get("k0")   # keep k0 recently used
+    assert redis.used_bytes <= 2000
+    assert redis.get("k0") is not None and redis.get("k1") is None and redis.get("k9") is not None
+    redis.zadd("nodes", {"a": 1, "b": 2})
+    redis.zremrangebyscore("nodes", "-inf", 2)
+    assert "nodes" not in redis._data and redis.used_bytes == sum(redis._sizes.values())
+
+
+def test_pipeline_runs_queued_commands_together(clock):
+    redis = _InMemoryRedis()
+    redis.mset({"a": "1", "b": "2"})
+    with redis.pipeline(transaction=False) as pipe:
+        pipe.set("a", "x", nx=True, ex=10).incr("b").delete("a").mget("a", "b")
+        assert len(pipe) == 4
+        assert pipe.execute() == [False, 3, 1, [None, "3"]]
+        pipe.set("a", "x").incr("a").incr("b")
+        results = pipe.execute(raise_on_error=False)
+    assert results[0] is True and isinstance(results[1], ValueError) and results[2] == 4
+    assert redis.pipeline().execute() == []
@@ -0,0 +1,22 @@
+from datetime import datetime, timedelta
+
+from app.config import settings
+from app.models import Check, Service
+from app.retention import run_retention
+
+
+def test_unpartitioned_retention_deletes_expired_checks(db_engine, db):
+    db.add(Service(id=1, name="svc", url="http://example.com"))
+    now = datetime.utcnow()
+    db.add_all([
+        Check(service_id=1, status="ok", timestamp=now),
+        Check(service_id=1, status="ok", timestamp=now - timedelta(days=settings.CHECKS_RETENTION_DAYS + 1)),
+        Check(service_id=1, status="ok", timestamp=now - timedelta(days=settings.CHECKS_RETENTION_DAYS + 30)),
+    ])
+    db.commit()
+
+    summary = run_retention(db_engine)
+
+    assert summary["deleted_checks"] == 2
+    assert summary["dropped"] == []
+    assert db.query(Check).count() == 1
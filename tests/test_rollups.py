@@ -0,0 +1,47 @@
+import random
+from datetime import datetime, timezone
+
+from app.models import Service
+from app.rollups import HOUR, MINUTE, RollupStore
+
+
+def _dt(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+def test_query_matches_raw_counts_for_any_window(db):
+    db.add_all([Service(id=1, name="a", url="http://a"), Service(id=2, name="b", url="http://b")])
+    db.commit()
+
+    rng = random.Random(3)
+    store = RollupStore()
+    base = 1_700_000_000 - 1_700_000_000 % HOUR
+    raw = []
+    for i in range(600):
+        ts = base + rng.uniform(0, 5 * HOUR)
+        service_id = rng.choice([1, 2])
+        status = rng.choice(["ok", "ok", "warn", "down"])
+        rt = None if status == "down" else rng.uniform(5, 3000)
+        store.observe(service_id, status, rt, ts=ts)
+        raw.append((service_id, ts, status, rt))
+        if i == 300:
+            store.flush(db)
+    store.flush(db)
+    # an unflushed delta is merged into queries too
+    store.observe(1, "ok", 10.0, ts=base + 30)
+    raw.append((1, base + 30, "ok", 10.0))
+
+    for since, until in [(base + 17 * MINUTE, base + 4 * HOUR + 5 * MINUTE), (base, None), (base + 50 * MINUTE, base + 55 * MINUTE)]:
+        stats = store.query(db, [1], _dt(since), _dt(until) if until else None)
+        expected = [r for r in raw if r[0] == 1 and since <= r[1] and (until is None or r[1] < until)]
+        assert stats.count == len(expected)
+        assert stats.down_count == sum(1 for r in expected if r[2] == "down")
+        assert stats.latency_count == sum(1 for r in expected if r[3] is not None)
+
+    both = store.query(db, [1, 2], _dt(base))
+    assert both.count == len(raw)
+    assert both.uptime_percent == sum(1 for r in raw if r[2] == "ok") / len(raw) * 100
+
+    series = store.series(db, 2, HOUR, _dt(base))
+    assert [b for b, _ in series] == [_dt(base + h * HOUR) for h in range(5)]
+    assert sum(s.count for _, s in series) == sum(1 for r in raw if r[0] == 2)
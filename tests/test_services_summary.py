@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import main
+from app.cache import response_cache
+from app.models import Base, Check, Service
+from app.rollups import rollups
+
+
+@pytest.fixture
+def client(db, async_session_factory):
+    async def get_db():
+        async with async_session_factory() as session:
+            yield session
+
+    now = datetime.utcnow()
+    db.add_all([Service(id=i, name=f"svc-{i}", url=f"http://svc-{i}") for i in range(1, 6)])
+    rows = [
+        dict(service_id=1, status="ok", response_time_ms=100.0, timestamp=now - timedelta(minutes=2)),
+        dict(service_id=1, status="down", response_time_ms=None, timestamp=now - timedelta(minutes=1)),
+        dict(service_id=2, status="ok", response_time_ms=200.0, timestamp=now - timedelta(minutes=1)),
+        dict(service_id=3, status="error", response_time_ms=50.0, timestamp=now - timedelta(minutes=3)),
+    ]
+    db.add_all([Check(**row) for row in rows])
+    db.commit()
+    rollups.observe_rows(rows)
+    rollups.flush(db)
+    response_cache.clear()
+
+    startup = list(main.app.router.on_startup)
+    main.app.router.on_startup.clear()
+    main.app.dependency_overrides[main.get_read_db] = get_db
+    main.app.dependency_overrides[main.get_async_db] = get_db
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+    main.app.router.on_startup.extend(startup)
+
+
+def test_summary_matches_per_service_endpoint(client):
+    page = client.get("/services/summary").json()
+    assert page["total"] == 5
+    by_id = {item["id"]: item for item in page["items"]}
+    for service_id in (1, 2, 3):
+        single = client.get(f"/services/{service_id}/metrics-summary").json()
+        assert by_id[service_id]["metrics"] == single
+    assert by_id[1]["metrics"]["current_status"] == "down"
+    assert by_id[4]["metrics"] is None
+
+
+def test_summary_filters_and_paginates(client):
+    assert [i["id"] for i in client.get("/services/summary", params={"status": "ok"}).json()["items"]] == [2]
+    assert [i["id"] for i in client.get("/services/summary", params={"status": "unknown"}).json()["items"]] == [4, 5]
+    page = client.get("/services/summary", params={"limit": 2, "offset": 2}).json()
+    assert page["total"] == 5
+    assert [i["id"] for i in page["items"]] == [3, 4]
+    assert client.get("/services/summary", params={"name": "SVC-5"}).json()["total"] == 1
+
+
+def test_read_endpoints_return_etags_and_304(client):
+    first = client.get("/services/1/checks")
+    etag = first.headers["etag"]
+    assert len(first.json()) == 2
+    assert client.get("/services/1/checks", headers={"If-None-Match": etag}).status_code == 304
+
+    # after an invalidation the body is recomputed; unchanged content keeps its ETag
+    response_cache.invalidate_services([1])
+    assert client.get("/services/1/checks", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/services/1/metrics-summary").headers["etag"]
+    assert client.get("/services/2/checks").headers["etag"] != etag
+
+
+def test_reads_go_to_the_replica_and_writes_to_the_primary(tmp_path):
+    factories = {}
+    for name in ("primary", "replica"):
+        path = tmp_path / f"{name}.db"
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(bind=engine)
+        engine.dispose()
+        factories[name] = sessionmaker(bind=create_async_engine(f"sqlite+aiosqlite:///{path}"),
+                                       class_=AsyncSession, expire_on_commit=False)
+
+    def override(name):
+        async def get_db():
+            async with factories[name]() as db:
+                yield db
+        return get_db
+
+    response_cache.clear()
+    startup = list(main.app.router.on_startup)
+    main.app.router.on_startup.clear()
+    main.app.dependency_overrides[main.get_async_db] = override("primary")
+    main.app.dependency_overrides[main.get_read_db] = override("replica")
+    try:
+        client = TestClient(main.app)
+        created = client.post("/services", json={"name": "svc", "url": "http://svc"})
+        assert created.status_code == 200
+        # the replica has not caught up with the write
+        assert client.get("/services").json() == []
+        main.app.dependency_overrides[main.get_read_db] = override("primary")
+        response_cache.clear()
+        assert [s["name"] for s in client.get("/services").json()] == ["svc"]
+    finally:
+        main.app.dependency_overrides.clear()
+        main.app.router.on_startup.extend(startup)
@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import redis_client
+from app.redis_client import _InMemoryRedis
+from app.sharding import HashRing, ShardCoordinator
+
+SHARDS = 64
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(redis_client, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def _node(redis, name):
+    return ShardCoordinator(redis, node_id=name, shards=SHARDS, node_ttl=15, lease_ttl=15)
+
+
+def _tick_all(nodes, clock):
+    for node in nodes:
+        node.tick(now=clock[0])
+    _assert_disjoint(nodes)
+
+
+def _assert_disjoint(nodes):
+    for shard in range(SHARDS):
+        assert sum(node.owns_shard(shard) for node in nodes) <= 1, shard
+
+
+def _owned(nodes):
+    return {shard for shard in range(SHARDS) for node in nodes if node.owns_shard(shard)}
+
+
+def test_ring_only_moves_keys_of_the_new_node():
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b", "c", "d"])
+    moved = [k for k in range(1000) if before.owner(k) != after.owner(k)]
+    assert all(after.owner(k) == "d" for k in moved)
+    assert 100 < len(moved) < 400
+
+
+def test_nodes_split_all_shards_without_overlap(clock):
+    redis = _InMemoryRedis()
+    nodes = [_node(redis, name) for name in ("a", "b", "c")]
+    # the first round only sees the nodes that already heartbeated
+    _tick_all(nodes, clock)
+    _tick_all(nodes, clock)
+    _tick_all(nodes, clock)
+    assert _owned(nodes) == set(range(SHARDS))
+    assert all(node.owns(service_id) for node in nodes for service_id in range(1000) if node.owns_shard(service_id % SHARDS))
+
+
+def test_rebalances_when_a_node_joins_and_when_one_dies(clock):
+    redis = _InMemoryRedis()
+    a, b = _node(redis, "a"), _node(redis, "b")
+    for _ in range(2):
+        _tick_all([a, b], clock)
+    assert _owned([a, b]) == set(range(SHARDS))
+
+    c = _node(redis, "c")
+    for _ in range(3):
+        clock[0] += 5
+        _tick_all([a, b, c], clock)
+    assert _owned([a, b, c]) == set(range(SHARDS))
+    assert c._owned
+
+    # c stops heartbeating; its leases and membership expire
+    for _ in range(4):
+        clock[0] += 5
+        _tick_all([a, b], clock)
+    assert _owned([a, b]) == set(range(SHARDS))
+
+
+def test_leave_hands_shards_over_immediately(clock):
+    redis = _InMemoryRedis()
+    a, b = _node(redis, "a"), _node(redis, "b")
+    for _ in range(2):
+        _tick_all([a, b], clock)
+    a.leave()
+    b.tick(now=clock[0])
+    assert _owned([b]) == set(range(SHARDS))
+
+
+def test_on_acquire_reports_new_shards(clock):
+    redis = _InMemoryRedis()
+    acquired = []
+    node = ShardCoordinator(redis, node_id="a", shards=SHARDS, on_acquire=acquired.append)
+    node.tick(now=clock[0])
+    node.tick(now=clock[0])
+    assert acquired == [set(range(SHARDS))]
+
+
+def test_tick_pipelines_lease_commands(clock, mocker):
+    redis = _InMemoryRedis()
+    node = _node(redis, "a")
+    node.tick(now=clock[0])
+    pipeline = mocker.spy(redis, "pipeline")
+    node.tick(now=clock[0])
+    assert pipeline.call_count == 2 and len(node._owned) == SHARDS
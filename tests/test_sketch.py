@@ -0,0 +1,54 @@
+import random
+
+from app.sketch import DDSketch
+
+
+def _exact(values, q):
+    data = sorted(values)
+    return data[min(int(len(data) * q), len(data) - 1)]
+
+
+def test_quantiles_within_relative_accuracy():
+    rng = random.Random(1)
+    values = [rng.lognormvariate(5, 1) for _ in range(20000)]
+    sketch = DDSketch(relative_accuracy=0.01)
+    for v in values:
+        sketch.add(v)
+    for q in (0.5, 0.95, 0.99):
+        assert abs(sketch.quantile(q) - _exact(values, q)) <= 0.01 * _exact(values, q)
+
+
+def test_merge_equals_single_sketch_and_roundtrips():
+    a, b, whole = DDSketch(), DDSketch(), DDSketch()
+    for i in range(1, 1001):
+        (a if i % 2 else b).add(float(i))
+        whole.add(float(i))
+    a.merge(b)
+    restored = DDSketch.from_bytes(a.to_bytes())
+    assert restored.bins == whole.bins
+    assert restored.count == 1000
+    assert restored.quantile(0.99) == whole.quantile(0.99)
+
+
+def test_collapse_keeps_bin_count_bounded():
+    sketch = DDSketch(max_bins=32)
+    for i in range(1, 10000):
+        sketch.add(float(i))
+    assert len(sketch.bins) <= 32
+    assert sketch.count == 9999
+
+
+def test_remove_undoes_add_even_after_a_collapse():
+    sketch, kept = DDSketch(max_bins=32), DDSketch(max_bins=32)
+    for i in range(1, 10000):
+        sketch.add(float(i))
+        if i > 5000:
+            kept.add(float(i))
+    for i in range(1, 5001):
+        sketch.remove(float(i))
+    assert sketch.count == kept.count == 4999
+    assert sum(sketch.bins.values()) == 4999
+    assert abs(sketch.quantile(0.5) - 7500) <= 0.01 * 7500
+    for i in range(5001, 10000):
+        sketch.remove(float(i))
+    assert sketch.count == 0 and sketch.bins == {} and sketch.quantile(0.5) is None
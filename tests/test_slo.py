@@ -0,0 +1,130 @@
+import math
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.models import Service
+from app.rollups import RollupStore
+from app.slo import SloEngine, parse_burn_rules
+
+NOW = 1_800_000_000.0  # on an hour boundary
+
+
+def _service(service_id, availability=99.0, latency=None, threshold=None):
+    return SimpleNamespace(
+        id=service_id, name=f"svc-{service_id}", slo_availability_target=availability,
+        slo_latency_target=latency, slo_latency_threshold_ms=threshold,
+    )
+
+
+class _Dispatcher:
+    def __init__(self):
+        self.fired, self.resolved = [], []
+
+    def fire(self, service_id, message, kind="check"):
+        self.fired.append((service_id, kind, message))
+
+    def resolve(self, service_id, message, kind="check"):
+        self.resolved.append((service_id, kind))
+
+
+def test_parse_burn_rules():
+    rules = parse_burn_rules("1h/5m:14.4, 3d/6h:1")
+    assert [(r.long, r.short, r.factor, r.name) for r in rules] == [(3600, 300, 14.4, "1h/5m"), (259200, 21600, 1.0, "3d/6h")]
+    with pytest.raises(ValueError):
+        parse_burn_rules("1h:14.4")
+
+
+def test_budgets_and_burn_rates_for_the_fleet():
+    engine = SloEngine(parse_burn_rules("1h/5m:14.4,6h/30m:6"), period_days=1, capacity=2)
+    engine.track([_service(1), _service(2, latency=90.0, threshold=200.0), _service(3), _service(4, availability=None)])
+    # one check a minute for the last hour; service 1 failing for the last 5 minutes
+    for minute in range(60):
+        ts = NOW - 3600 + 60 * minute + 30
+        engine.observe(1, "down" if minute >= 55 else "ok", 50.0, ts)
+        engine.observe(2, "ok", 300.0 if minute % 2 else 100.0, ts)
+        engine.observe(4, "down", None, ts)
+    report = engine.evaluate(NOW - 1)   # in the minute of the last check
+
+    assert sorted(report.service_ids) == [1, 2, 3]
+    one, two, three = (report.position(i) for i in (1, 2, 3))
+    availability = report.burn_rates["availability"]
+    assert availability[300][one] == pytest.approx(100.0)       # all bad over 5m, 1% allowed
+    assert availability[3600][one] == pytest.approx(5 / 60 / 0.01)
+    assert report.budget_remaining["availability"][one] == pytest.approx(1 - 5 / 60 / 0.01)
+    assert report.budget_remaining["availability"][two] == 1.0
+    assert report.burn_rates["latency"][3600][two] == pytest.approx(0.5 / 0.1)
+    assert math.isnan(report.budget_remaining["availability"][three])   # no checks yet
+    assert list(report.service_ids[report.worst_first()]) == [1, 2, 3]
+    # 8.3x over 1h misses the fast rule, but 6h (one hour of data) and 30m both burn over 6x
+    assert report.service(one)["objectives"][0]["alerting"] == "6h/30m"
+    assert report.service(two)["objectives"][1]["alerting"] is None
+
+    dispatcher = _Dispatcher()
+    for minute in range(60, 120):
+        engine.observe(1, "down", None, NOW + 60 * (minute - 60))
+    engine.alert(engine.evaluate(NOW + 3599), dispatcher)
+    assert [(sid, kind) for sid, kind, _ in dispatcher.fired] == [(1, "slo_availability")]
+    assert "burning 100.0x over 1h/5m" in dispatcher.fired[0][2]
+    engine.alert(engine.evaluate(NOW + 3599), dispatcher)
+    assert len(dispatcher.fired) == 1
+    engine.remove([1])
+    engine.alert(engine.evaluate(NOW + 3599), dispatcher)
+    assert dispatcher.resolved == []
+    assert 1 not in engine.evaluate(NOW + 3599).service_ids
+
+
+def test_rebuild_from_rollups(db):
+    db.add(Service(id=1, name="a", url="http://a", slo_availability_target=99.0,
+                   slo_latency_target=95.0, slo_latency_threshold_ms=100.0))
+    db.commit()
+    store = RollupStore()
+    now = datetime.now(timezone.utc).timestamp()
+    for i in range(20):
+        store.observe(1, "error" if i < 2 else "ok", 500.0 if i < 5 else 10.0, ts=now - 600 + i)
+    store.flush(db)
+
+    engine = SloEngine(parse_burn_rules("1h/5m:14.4"), period_days=1)
+    engine.rebuild(db, db.query(Service).all())
+    report = engine.evaluate(now)
+    assert report.burn_rates["availability"][3600][0] == pytest.approx(2 / 20 / 0.01)
+    assert report.burn_rates["latency"][3600][0] == pytest.approx(5 / 20 / 0.05, rel=0.01)
+
+
+def test_api_reads_slos_from_the_rollups(db, session_factory, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import main
+
+    db.add_all([
+        Service(id=1, name="a", url="http://a", slo_availability_target=99.0),
+        Service(id=2, name="b", url="http://b", slo_availability_target=99.9),
+        Service(id=3, name="c", url="http://c"),
+    ])
+    db.commit()
+    store = RollupStore()
+    now = datetime.now(timezone.utc).timestamp()
+    for i in range(10):
+        store.observe(1, "ok", 10.0, ts=now - 120 + i)
+        store.observe(2, "down" if i == 0 else "ok", 10.0, ts=now - 120 + i)
+    store.flush(db)
+
+    monkeypatch.setattr(main, "slo_engine", SloEngine(parse_burn_rules("1h/5m:14.4"), period_days=1))
+    monkeypatch.setattr(main, "SessionFactory", session_factory)
+    startup = list(main.app.router.on_startup)
+    main.app.router.on_startup.clear()
+    try:
+        client = TestClient(main.app)
+        assert client.get("/services/slo").status_code == 503
+        main._refresh_slo_report()   # what the refresh thread does without a scheduler
+        page = client.get("/services/slo").json()
+        assert page["total"] == 2
+        assert [item["service_id"] for item in page["items"]] == [2, 1]
+        [objective] = page["items"][0]["objectives"]
+        assert objective["burn_rates"]["5m"] == pytest.approx(100.0)
+        assert objective["alerting"] == "1h/5m"
+        assert client.get("/services/1/slo").json()["objectives"][0]["budget_remaining"] == 1.0
+        assert client.get("/services/3/slo").status_code == 404
+    finally:
+        main.app.router.on_startup.extend(startup)
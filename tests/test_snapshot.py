@@ -0,0 +1,129 @@
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app import scheduler
+from app.adaptive import IntervalController
+from app.aggregator import WindowAggregator
+from app.models import Check, Service
+from app.slo import SloEngine, parse_burn_rules
+from app.snapshot import fingerprint, read_snapshot, write_snapshot
+
+
+def test_sections_round_trip_and_corruption_is_detected(tmp_path):
+    path = tmp_path / "state.bin"
+    counts = np.arange(24, dtype=np.uint16).reshape(2, 4, 3)
+    write_snapshot(path, {"slo.counts": counts, "agg.id": np.array([3, 1]), "agg.rt": np.empty(0)}, created_at=12.5)
+    snapshot = read_snapshot(path)
+    assert snapshot.created_at == 12.5
+    assert (snapshot["slo.counts"] == counts).all() and snapshot["slo.counts"].dtype == np.uint16
+    assert sorted(snapshot.section("agg")) == ["id", "rt"] and snapshot["agg.rt"].shape == (0,)
+
+    data = bytearray(path.read_bytes())
+    data[-40] ^= 0xFF   # inside the last section
+    path.write_bytes(bytes(data))
+    assert read_snapshot(path) is None
+    path.write_bytes(b"")
+    assert read_snapshot(path) is None
+    assert read_snapshot(tmp_path / "missing.bin") is None
+    assert [p.name for p in tmp_path.iterdir()] == ["state.bin"]   # no temporary files left behind
+
+
+def test_probe_state_survives_a_snapshot(tmp_path):
+    now = time.time()
+    aggregator = WindowAggregator(window_minutes=60)
+    for i in range(30):
+        aggregator.observe(1, "down" if i % 10 == 0 else "ok", 100.0 + i, ts=now - 60 * (30 - i))
+    aggregator.observe(2, "down", None, ts=now - 10)
+    service = _service(1, adaptive=True)
+    intervals = IntervalController()
+    intervals.observe(service, "ok", 100.0)
+    intervals.observe(service, "error", None)
+    slos = SloEngine(parse_burn_rules("1h/5m:14.4"), period_days=1)
+    slos.track([service])
+    for i in range(10):
+        slos.observe(1, "down" if i < 2 else "ok", 50.0, ts=now - 60 * i)
+
+    path = tmp_path / "state.bin"
+    write_snapshot(path, {
+        **{f"agg.{k}": a for k, a in aggregator.snapshot().items()},
+        **{f"adaptive.{k}": a for k, a in intervals.snapshot().items()},
+        **{f"slo.{k}": a for k, a in slos.snapshot().items()},
+    })
+    snapshot = read_snapshot(path)
+
+    restored = WindowAggregator(window_minutes=60)
+    assert restored.restore(snapshot.section("agg"), [1, 2], recent={2: [(now - 5, "ok", 80.0)]}) == {1, 2}
+    assert restored.metrics(1, now) == aggregator.metrics(1, now)
+    assert restored.metrics(2, now)["uptime_percent"] == 50.0
+    assert WindowAggregator(window_minutes=5).restore(snapshot.section("agg"), [1]) == set()
+
+    restored_intervals = IntervalController()
+    restored_intervals.restore(snapshot.section("adaptive"), [1])
+    assert restored_intervals.degraded(1)
+    assert restored_intervals.interval(service) == intervals.interval(service)
+
+    restored_slos = SloEngine(parse_burn_rules("1h/5m:14.4"), period_days=1)
+    restored_slos.track([service])
+    assert restored_slos.restore(snapshot.section("slo"), [1]) == {1}
+    before, after = slos.evaluate(now), restored_slos.evaluate(now)
+    assert after.budget_remaining["availability"][0] == before.budget_remaining["availability"][0]
+    assert after.budget_remaining["availability"][0] == pytest.approx(1 - 0.2 / 0.01)
+    other_layout = SloEngine(parse_burn_rules("6h/30m:6"), period_days=1)
+    other_layout.track([service])
+    assert other_layout.restore(snapshot.section("slo"), [1]) == set()
+
+
+def _service(service_id, **overrides):
+    values = dict(
+        id=service_id, name=f"svc-{service_id}", url=f"http://svc-{service_id}/", interval_seconds=60,
+        timeout_seconds=10, adaptive=False, min_interval_seconds=None, max_interval_seconds=None,
+        current_interval_seconds=None, slo_availability_target=99.0, slo_latency_target=None,
+        slo_latency_threshold_ms=None,
+    )
+    values.update(overrides)
+    return Service(**values)
+
+
+@pytest.fixture
+def warm_start(tmp_path, db, monkeypatch):
+    """A fresh scheduler state restoring from a snapshot in ``tmp_path``."""
+    monkeypatch.setattr(scheduler.settings, "SNAPSHOT_PATH", str(tmp_path / "state-{shard}.bin"))
+    monkeypatch.setattr(scheduler, "aggregator", WindowAggregator(window_minutes=60))
+    monkeypatch.setattr(scheduler, "intervals", IntervalController())
+    monkeypatch.setattr(scheduler, "slo_engine", SloEngine(parse_burn_rules("1h/5m:14.4"), period_days=1))
+    monkeypatch.setattr(scheduler, "_fingerprints", {})
+    return db
+
+
+def test_restart_restores_unchanged_services_and_tops_up(warm_start, monkeypatch):
+    db = warm_start
+    now = time.time()
+    services = [_service(1), _service(2)]
+    db.add_all(services)
+    db.commit()
+    for service in services:
+        scheduler._fingerprints[service.id] = fingerprint(service)
+        scheduler.slo_engine.track([service])
+        scheduler.aggregator.observe(service.id, "ok", 100.0, ts=now - 120)
+        scheduler.slo_engine.observe(service.id, "ok", 100.0, ts=now - 120)
+    scheduler._save_snapshot()
+
+    # a check written after the snapshot, and service 2 edited meanwhile
+    db.add(Check(service_id=1, timestamp=datetime.utcnow() + timedelta(seconds=1), status="down"))
+    db.query(Service).filter(Service.id == 2).update({Service.url: "http://moved/"})
+    db.commit()
+    # the restarted process
+    monkeypatch.setattr(scheduler, "aggregator", WindowAggregator(window_minutes=60))
+    monkeypatch.setattr(scheduler, "slo_engine", SloEngine(parse_burn_rules("1h/5m:14.4"), period_days=1))
+    windows, slos = scheduler._restore_snapshot(db, db.query(Service).order_by(Service.id).all())
+    assert (windows, slos) == ({1}, {1})
+    assert scheduler.aggregator.metrics(1)["uptime_percent"] == 50.0
+    assert scheduler.aggregator.metrics(2)["uptime_percent"] is None
+    report = scheduler.slo_engine.evaluate()
+    assert report.budget_remaining["availability"][report.position(1)] == pytest.approx(1 - 0.5 / 0.01)
+
+    monkeypatch.setattr(scheduler.settings, "SNAPSHOT_MAX_AGE_SECONDS", -1)
+    assert scheduler._restore_snapshot(db, db.query(Service).all()) == (set(), set())
@@ -0,0 +1,92 @@
+import os
+
+from app import kafka_producer
+from app.kafka_producer import SimpleKafkaProducer
+from app.spool import DiskSpool
+
+
+def test_replays_in_order_and_keeps_undelivered(tmp_path):
+    spool = DiskSpool(str(tmp_path / "events.jsonl"), max_bytes=1 << 20)
+    for i in range(10):
+        assert spool.append({"n": i})
+
+    seen = []
+
+    def send_first_three(records):
+        seen.extend(r["n"] for r in records[:3])
+        return 3
+
+    assert spool.replay(send_first_three, batch_size=4) == 3
+    assert seen == [0, 1, 2]
+
+    seen.clear()
+    assert spool.replay(lambda records: seen.extend(r["n"] for r in records) or len(records), batch_size=4) == 7
+    assert seen == list(range(3, 10))
+    assert spool.empty
+
+
+def test_syncs_in_batches_and_appends_after_compaction(tmp_path, mocker):
+    fsync = mocker.spy(os, "fsync")
+    spool = DiskSpool(str(tmp_path / "events.jsonl"), max_bytes=1 << 20, sync_every=4)
+    for i in range(6):
+        spool.append({"n": i})
+    assert fsync.call_count == 1
+    spool.sync()
+    spool.sync()   # nothing new to sync
+    assert fsync.call_count == 2
+
+    assert spool.replay(lambda records: 1, batch_size=2) == 1
+    spool.append({"n": 6})
+    spool.close()
+    lines = (tmp_path / "events.jsonl").read_bytes().splitlines()
+    assert lines[0] == b'{"n":1}' and lines[-2:] == [b'{"n":5}', b'{"n":6}']
+
+
+def test_refuses_appends_when_full(tmp_path):
+    spool = DiskSpool(str(tmp_path / "events.jsonl"), max_bytes=40)
+    assert spool.append({"n": 1})
+    assert spool.append({"n": 2})
+    assert not spool.append({"n": "x" * 40})
+
+
+def test_truncates_partial_tail_on_open(tmp_path):
+    path = tmp_path / "events.jsonl"
+    path.write_bytes(b'{"n":1}\n{"n":2}\n{"n":')
+    spool = DiskSpool(str(path), max_bytes=1 << 20)
+
+    records = []
+    spool.replay(lambda batch: records.extend(batch) or len(batch))
+    assert records == [{"n": 1}, {"n": 2}]
+
+
+def test_producer_spools_while_kafka_is_unreachable(tmp_path, monkeypatch):
+    def unreachable(**kwargs):
+        raise ConnectionError("no brokers")
+
+    monkeypatch.setattr(kafka_producer, "KafkaProducer", unreachable)
+    producer = SimpleKafkaProducer(spool_path=str(tmp_path / "events.jsonl"), flush_interval=60)
+    try:
+        producer.publish("health_checks", {"service_id": 1})
+        producer.publish("health_checks", {"service_id": 2})
+    finally:
+        producer.close(timeout=1)
+
+    records = []
+    producer.spool.replay(lambda batch: records.extend(batch) or len(batch))
+    assert [r["message"]["service_id"] for r in records] == [1, 2]
+    assert {r["topic"] for r in records} == {"health_checks"}
+
+
+def test_each_shard_spools_to_its_own_file_and_adopts_orphans(tmp_path, monkeypatch):
+    monkeypatch.setattr(kafka_producer.settings, "WORKER_SHARD_INDEX", 1)
+    monkeypatch.setattr(kafka_producer.settings, "WORKER_SHARD_COUNT", 2)
+    for shard in (2, 3):   # left by a run with four worker processes
+        DiskSpool(str(tmp_path / f"events-{shard}.jsonl"), max_bytes=1 << 20).append({"shard": shard})
+    producer = SimpleKafkaProducer(spool_path=str(tmp_path / "events-{shard}.jsonl"))
+    assert producer.spool.path == str(tmp_path / "events-1.jsonl")
+
+    sent = []
+    monkeypatch.setattr(producer, "_send_batch", lambda batch: sent.extend(batch) or len(batch))
+    assert producer.replay_orphan_spools()
+    assert sent == [{"shard": 3}]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["events-2.jsonl"]
@@ -0,0 +1,91 @@
+import random
+
+from app.timing_wheel import TimingWheel, phase_offset
+
+
+class _Recorder:
+    def __init__(self):
+        self.fired = []  # (time, key)
+        self.batches = []
+        self.now = 0.0
+
+    def __call__(self, keys):
+        self.batches.append(len(keys))
+        self.fired.extend((self.now, key) for key in keys)
+
+
+def _run(wheel, recorder, start, end, step=1.0):
+    t = start
+    while t <= end:
+        recorder.now = t
+        wheel.advance(t)
+        t += step
+
+
+def test_fires_on_phase_every_interval():
+    rec = _Recorder()
+    wheel = TimingWheel(rec, tick=1.0, slots=8, levels=3, clock=lambda: 0.0)
+    for key, interval in ((1, 5), (2, 30), (3, 700)):
+        wheel.schedule(key, interval, now=0.0)
+    _run(wheel, rec, 0.0, 3000.0)
+
+    for key, interval in ((1, 5), (2, 30), (3, 700)):
+        times = [t for t, k in rec.fired if k == key]
+        assert len(times) == 3000 // interval or len(times) == 3000 // interval + 1
+        assert all(b - a == interval for a, b in zip(times, times[1:]))
+        # fires on the first tick at or after its phase-aligned due time
+        assert 0 <= times[0] - phase_offset(key, interval) < 1.0
+
+
+def test_jitter_spreads_services_created_together():
+    rec = _Recorder()
+    wheel = TimingWheel(rec, tick=1.0, clock=lambda: 0.0)
+    for key in range(6000):
+        wheel.schedule(key, 60, now=0.0)
+    _run(wheel, rec, 0.0, 60.0)
+    per_second = {}
+    for t, _ in rec.fired:
+        per_second[t] = per_second.get(t, 0) + 1
+    assert sum(per_second.values()) == 6000
+    assert max(per_second.values()) < 200
+
+
+def test_interval_change_and_remove():
+    rec = _Recorder()
+    wheel = TimingWheel(rec, tick=1.0, slots=4, levels=3, clock=lambda: 0.0)
+    wheel.schedule("a", 100, now=0.0)
+    wheel.schedule("b", 10, now=0.0)
+    wheel.schedule("a", 10, now=0.0)
+    wheel.remove("b")
+    _run(wheel, rec, 0.0, 100.0)
+    assert {k for _, k in rec.fired} == {"a"}
+    assert len(rec.fired) == 10
+    assert len(wheel) == 1
+
+
+def test_catches_up_after_a_stall_without_double_firing():
+    rec = _Recorder()
+    wheel = TimingWheel(rec, tick=0.5, slots=16, levels=2, batch_size=7, clock=lambda: 0.0)
+    keys = random.Random(1).sample(range(10**6), 50)
+    for key in keys:
+        wheel.schedule(key, 10, now=0.0)
+    rec.now = 95.0
+    wheel.advance(95.0)
+    # every key fires once for the stall, then resumes on its phase
+    assert sorted(k for _, k in rec.fired) == sorted(keys)
+    assert max(rec.batches) == 7
+    rec.fired.clear()
+    _run(wheel, rec, 95.5, 105.0, step=0.5)
+    assert sorted(k for _, k in rec.fired) == sorted(keys)
+
+
+def test_shared_phase_key_fires_together_across_intervals():
+    rec = _Recorder()
+    wheel = TimingWheel(rec, tick=1.0, slots=8, levels=3, clock=lambda: 0.0)
+    wheel.schedule(1, 30, now=0.0, phase_key="http://a/health")
+    wheel.schedule(2, 60, now=0.0, phase_key="http://a/health")
+    wheel.schedule(3, 60, now=0.0)
+    _run(wheel, rec, 0.0, 600.0)
+    times = {key: {t for t, k in rec.fired if k == key} for key in (1, 2, 3)}
+    assert len(times[2]) == 10 and times[2] <= times[1]
+    assert not times[3] <= times[1]
@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from prometheus_client import generate_latest, multiprocess
+
+from app import scheduler
+from app.config import settings
+from app.metrics import metrics_registry
+from app.models import Service
+from app.timing_wheel import TimingWheel
+
+
+@pytest.fixture
+def session_factory(session_factory, monkeypatch):
+    monkeypatch.setattr(scheduler, "SessionLocal", session_factory)
+    monkeypatch.setattr(scheduler, "wheel", TimingWheel(lambda ids: None))
+    return session_factory
+
+
+def test_sync_schedules_only_the_local_shard(session_factory, monkeypatch):
+    monkeypatch.setattr(settings, "WORKER_SHARD_INDEX", 1)
+    monkeypatch.setattr(settings, "WORKER_SHARD_COUNT", 2)
+    db = session_factory()
+    db.add_all([Service(id=i, name=f"s{i}", url=f"http://s{i}") for i in range(1, 7)])
+    db.commit()
+
+    scheduler._sync_services()
+    assert sorted(scheduler.wheel.keys()) == [1, 3, 5]
+
+    # services created and deleted through the API show up on the next sync
+    db.add(Service(id=7, name="s7", url="http://s7"))
+    db.query(Service).filter(Service.id == 3).delete()
+    db.commit()
+    db.close()
+    scheduler._sync_services()
+    assert sorted(scheduler.wheel.keys()) == [1, 5, 7]
+
+    scheduler.add_service_job(Service(id=8, interval_seconds=60))
+    assert 8 not in scheduler.wheel
+
+
+def test_metrics_aggregate_across_processes(tmp_path, monkeypatch):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    script = (
+        "from app.metrics import CHECK_WRITE_QUEUE_DEPTH, observe_check\n"
+        "observe_check('svc', 'ok', 0.1)\n"
+        "CHECK_WRITE_QUEUE_DEPTH.set(3)\n"
+    )
+    pids = []
+    for _ in range(2):
+        proc = subprocess.Popen([sys.executable, "-c", script], env=env, cwd=os.getcwd())
+        assert proc.wait() == 0
+        pids.append(proc.pid)
+
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    text = generate_latest(metrics_registry()).decode()
+    assert 'health_checks_total{service="svc",status="ok"} 2.0' in text
+    assert "pulseatlas_check_write_queue_depth 6.0" in text
+
+    # the worker supervisor marks exited children dead, dropping their live gauges
+    multiprocess.mark_process_dead(pids[0], str(tmp_path))
+    text = generate_latest(metrics_registry()).decode()
+    assert "pulseatlas_check_write_queue_depth 3.0" in text
+    assert 'health_checks_total{service="svc",status="ok"} 2.0' in text
+
+
+def test_shutdown_runs_once(monkeypatch, mocker):
+    for name in ("wheel", "scheduler", "probe_engine", "_record_executor", "check_writer", "alert_dispatcher", "producer"):
+        monkeypatch.setattr(scheduler, name, mocker.Mock())
+    save = mocker.patch.object(scheduler, "_save_snapshot")
+    mocker.patch.object(scheduler, "_flush_rollups")
+    monkeypatch.setattr(scheduler, "_stopped", False)
+    scheduler._shutdown()
+    scheduler._shutdown()   # the atexit hook after app.worker's own call
+    assert scheduler.scheduler.shutdown.call_count == 1 and save.call_count == 1